@@ -3,6 +3,7 @@ Django settings for core project.
 """
 
 import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -79,6 +80,21 @@ DATABASES = {
     }
 }
 
+# Caches
+# https://docs.djangoproject.com/en/4.2/ref/settings/#caches
+# 'reference' is the shared tier of the reference data cache (surge/cache.py)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reference': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REFERENCE_CACHE_URL', os.environ.get('REDIS_URL', 'redis://localhost:6379/1')),
+        'KEY_PREFIX': 'rcdeploy',
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -138,11 +154,120 @@ CELERY_TIMEZONE = TIME_ZONE
 
 # IFRC API Configuration
 IFRC_API_URL = 'https://goadmin.ifrc.org/api/v2/surge_alert/'
+IFRC_EVENT_API_URL = 'https://goadmin.ifrc.org/api/v2/event/'
+
+# Page fetching: 'sequential' follows the 'next' links one page at a time,
+# 'parallel' works out every page URL from the record count and downloads
+# up to IFRC_FETCH_CONCURRENCY pages at once
+IFRC_FETCH_MODE = os.environ.get('IFRC_FETCH_MODE', 'sequential')
+IFRC_PAGE_SIZE = int(os.environ.get('IFRC_PAGE_SIZE', '50'))
+IFRC_FETCH_CONCURRENCY = int(os.environ.get('IFRC_FETCH_CONCURRENCY', '4'))
+
+# Number of downloaded pages allowed to wait for the database writer before
+# the downloader blocks (see surge/pipeline.py)
+IFRC_PIPELINE_DEPTH = int(os.environ.get('IFRC_PIPELINE_DEPTH', '2'))
+
+# Sync execution: 'local' processes every page inside the sync task, 'fanout'
+# dispatches one Celery subtask per IFRC_FANOUT_PAGES_PER_TASK pages so a
+# full resync is spread over all workers
+IFRC_EXECUTION_MODE = os.environ.get('IFRC_EXECUTION_MODE', 'local')
+IFRC_FANOUT_PAGES_PER_TASK = int(os.environ.get('IFRC_FANOUT_PAGES_PER_TASK', '1'))
+
+# Singleton lock held in Redis (CELERY_BROKER_URL) while a sync task runs.
+# The lease is renewed by a heartbeat and expires if the holder dies; a second
+# run waits up to IFRC_SYNC_LOCK_WAIT for the lock and otherwise exits early.
+# A fan-out run hands the lock to its subtasks with a lease that also covers
+# IFRC_FANOUT_LOCK_LEASE_PER_PAGE for every page still queued
+IFRC_SYNC_LOCK_LEASE = 120  # seconds
+IFRC_SYNC_LOCK_WAIT = 0  # seconds
+IFRC_FANOUT_LOCK_LEASE_PER_PAGE = 10  # seconds
+
+# Shared HTTP client used for all upstream requests (see surge/client.py)
+IFRC_HTTP_CONNECT_TIMEOUT = 5  # seconds
+IFRC_HTTP_READ_TIMEOUT = 30  # seconds
+IFRC_HTTP_MAX_RETRIES = 3
+IFRC_HTTP_BACKOFF_FACTOR = 0.5  # seconds, doubled on every retry
+IFRC_HTTP_BACKOFF_MAX = 30  # seconds
+IFRC_HTTP_POOL_SIZE = 10
+IFRC_CIRCUIT_FAILURE_THRESHOLD = 5
+IFRC_CIRCUIT_RESET_TIMEOUT = 60  # seconds
+
+# Event IDs the API answers with 404 are not requested again for this long;
+# they are remembered in the shared 'reference' cache so every worker skips them
+IFRC_EVENT_NOT_FOUND_TTL = 60 * 60 * 24  # seconds
+
+# Delta sync: only request records newer than the stored cursor (minus an
+# overlap window), with a full reconciliation sync on a slower cadence. The
+# API has no modification timestamp, so delta runs only see new records and
+# edits to existing ones wait for the next full sync: keep the full sync
+# interval short. Point IFRC_SYNC_CURSORS at a modification field and its
+# filter if the API gains one.
+IFRC_DELTA_SYNC = os.environ.get('IFRC_DELTA_SYNC', 'True') == 'True'
+IFRC_DELTA_OVERLAP = timedelta(hours=2)
+IFRC_FULL_SYNC_INTERVAL = timedelta(hours=int(os.environ.get('IFRC_FULL_SYNC_INTERVAL_HOURS', '3')))
+IFRC_SYNC_CURSORS = {
+    'surge_alerts': {'field': 'created_at', 'filter': 'created_at__gte'},
+    'events': {'field': 'created_at', 'filter': 'created_at__gte'},
+}
+
+# Raw page archive (see surge/archive.py): every fetched API page is stored
+# gzip-compressed under IFRC_ARCHIVE_DIR and indexed in ArchivedPage, so the
+# tables can be rebuilt offline with the replay_ingest command. Pages older
+# than IFRC_ARCHIVE_RETENTION are pruned at the end of each run
+IFRC_ARCHIVE_PAGES = os.environ.get('IFRC_ARCHIVE_PAGES', 'True') == 'True'
+IFRC_ARCHIVE_DIR = os.environ.get('IFRC_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive'))
+IFRC_ARCHIVE_RETENTION = timedelta(days=30)
+
+# Conditional requests (see surge/conditional.py): the ETag and Last-Modified
+# validators of every fetched page are stored in PageValidator and sent back
+# on the next run, and pages the API answers with 304 Not Modified are not
+# processed again. Validators unused for IFRC_VALIDATOR_RETENTION are pruned
+IFRC_CONDITIONAL_REQUESTS = os.environ.get('IFRC_CONDITIONAL_REQUESTS', 'True') == 'True'
+IFRC_VALIDATOR_RETENTION = timedelta(days=7)
+
+# Reference data cache (see surge/cache.py): entries kept per model and key
+# field in each process's LRU, their lifetime in the shared 'reference'
+# cache, and how often a read-only lookup checks whether they were
+# invalidated (ingestion checks on every lookup)
+REFERENCE_CACHE_SIZE = 5000
+REFERENCE_CACHE_TIMEOUT = 60 * 60  # seconds
+REFERENCE_CACHE_VERSION_CHECK = 5  # seconds
+
+# Materialised "alerts for me" feed (see users/feed.py): alerts created longer
+# ago than this are left out of the feeds and pruned from them
+ALERT_FEED_MAX_AGE = timedelta(days=180)
+
+# Alert notifications (see users/notifications.py): off unless enabled, and
+# only sent on the channels given a backend, since a notification is never
+# sent twice. Then the notifications sent per Celery task, the rate limit of
+# those tasks on each worker and the retries of a failed batch, RETRY_DELAY
+# seconds apart and doubling. The file backend writes JSON lines to
+# NOTIFICATION_FILE_PATH, or to stdout if it is '-'
+NOTIFICATIONS_ENABLED = os.environ.get('NOTIFICATIONS_ENABLED', 'False') == 'True'
+NOTIFICATION_BACKENDS = {
+    'email': os.environ.get('NOTIFICATION_EMAIL_BACKEND', ''),
+    'sms': os.environ.get('NOTIFICATION_SMS_BACKEND', ''),
+}
+NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', '100'))
+NOTIFICATION_RATE_LIMIT = os.environ.get('NOTIFICATION_RATE_LIMIT', '10/s')
+NOTIFICATION_MAX_RETRIES = 3
+NOTIFICATION_RETRY_DELAY = 30  # seconds
+NOTIFICATION_FILE_PATH = os.environ.get('NOTIFICATION_FILE_PATH', os.path.join(BASE_DIR, 'logs', 'notifications.jsonl'))
+# HTTP gateway of users.notifications.HttpSmsBackend
+SMS_GATEWAY_URL = os.environ.get('SMS_GATEWAY_URL', '')
+SMS_GATEWAY_TOKEN = os.environ.get('SMS_GATEWAY_TOKEN', '')
 
 # Logging Configuration
 LOGS_DIR = os.path.join(BASE_DIR, 'logs')
 os.makedirs(LOGS_DIR, exist_ok=True)
 
+# 'queue' hands the surge logger's records to a listener thread that does the
+# formatting and file I/O off the ingest thread (see surge/log.py), 'sync'
+# writes them on the calling thread
+SURGE_LOG_MODE = os.environ.get('SURGE_LOG_MODE', 'queue')
+# Only one in this many per-record debug lines is logged during ingestion
+SURGE_LOG_SAMPLE_EVERY = int(os.environ.get('SURGE_LOG_SAMPLE_EVERY', '100'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -208,6 +333,10 @@ LOGGING = {
             'backupCount': 10,
             'formatter': 'detailed',
         },
+        'surge_queue': {
+            '()': 'surge.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.surge_file', 'cfg://handlers.file_error'],
+        },
         'mail_admins': {
             'level': 'ERROR',
             'filters': ['require_debug_false'],
@@ -237,7 +366,7 @@ LOGGING = {
             'propagate': False,
         },
         'surge': {
-            'handlers': ['console', 'surge_file', 'file_error'],
+            'handlers': ['surge_queue'] if SURGE_LOG_MODE == 'queue' else ['console', 'surge_file', 'file_error'],
             'level': 'DEBUG',
             'propagate': False,
         },
@@ -2,13 +2,15 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from .models import ScheduledTask
+from .scheduler import next_run_time
 
 @admin.register(ScheduledTask)
 class ScheduledTaskAdmin(admin.ModelAdmin):
-    list_display = ('name', 'task', 'schedule_display', 'enabled', 'last_run_at', 'total_run_count', 'run_now_button')
+    list_display = ('name', 'task', 'schedule_display', 'enabled', 'last_run_at', 'next_run_display', 'total_run_count', 'run_now_button')
     list_filter = ('enabled', 'task', 'schedule_type')
     search_fields = ('name', 'task')
-    readonly_fields = ('last_run_at', 'total_run_count', 'date_created', 'date_changed')
+    readonly_fields = ('last_run_at', 'next_run_display', 'total_run_count', 'adaptive_interval', 'last_change_count',
+                       'date_created', 'date_changed')
     fieldsets = (
         (None, {
             'fields': ('name', 'task', 'enabled')
@@ -27,8 +29,15 @@ class ScheduledTaskAdmin(admin.ModelAdmin):
             'classes': ('collapse',),
             'description': 'Set the crontab schedule for this task. Only used if Schedule Type is "Crontab".'
         }),
+        ('Adaptive Schedule', {
+            'fields': ('adaptive_min_interval', 'adaptive_max_interval', 'adaptive_interval', 'last_change_count'),
+            'classes': ('collapse',),
+            'description': 'Runs again after the minimum interval when the last run found changes, and doubles the '
+                           'interval up to the maximum when it found none. The interval fields above set the '
+                           'starting interval. Only used if Schedule Type is "Adaptive".'
+        }),
         ('Run Information', {
-            'fields': ('last_run_at', 'total_run_count'),
+            'fields': ('last_run_at', 'next_run_display', 'total_run_count'),
             'classes': ('collapse',),
             'description': 'Information about when this task was last run.'
         }),
@@ -53,10 +62,24 @@ class ScheduledTaskAdmin(admin.ModelAdmin):
             return ", ".join(parts) if parts else "No interval set"
         elif obj.schedule_type == 'crontab':
             return f"{obj.crontab_minute} {obj.crontab_hour} {obj.crontab_day_of_month} {obj.crontab_month_of_year} {obj.crontab_day_of_week}"
+        elif obj.schedule_type == 'adaptive':
+            return (f"Adaptive, every {obj.current_adaptive_interval()} second(s) "
+                    f"({obj.adaptive_min_interval}-{obj.adaptive_max_interval})")
         return "Unknown schedule type"
 
     schedule_display.short_description = "Schedule"
 
+    def next_run_display(self, obj):
+        """
+        Show when the scheduler will run the task next.
+        """
+        if obj.pk is None:
+            return "-"
+        next_run = next_run_time(obj)
+        return next_run if next_run else "Disabled"
+
+    next_run_display.short_description = "Next Run"
+
     def run_now_button(self, obj):
         """
         Generate a button to manually run the task.
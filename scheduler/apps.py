@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SchedulerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scheduler'
+
+    def ready(self):
+        # Connect the task_postrun handler that drives adaptive schedules
+        from . import signals  # noqa: F401
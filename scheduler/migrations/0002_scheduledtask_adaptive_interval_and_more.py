@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:06
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='adaptive_interval',
+            field=models.IntegerField(blank=True, help_text='Current interval in seconds, computed from the outcome of the last run', null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='adaptive_max_interval',
+            field=models.IntegerField(default=21600, help_text='Longest interval in seconds the schedule backs off to when nothing changes', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='adaptive_min_interval',
+            field=models.IntegerField(default=300, help_text='Shortest interval in seconds, used while runs keep finding changes', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='last_change_count',
+            field=models.IntegerField(blank=True, help_text='Records created, updated or deleted by the last run', null=True),
+        ),
+        migrations.AlterField(
+            model_name='scheduledtask',
+            name='schedule_type',
+            field=models.CharField(choices=[('interval', 'Interval'), ('crontab', 'Crontab'), ('adaptive', 'Adaptive')], default='interval', max_length=20),
+        ),
+    ]
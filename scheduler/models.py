@@ -1,3 +1,4 @@
+from datetime import timedelta
 from django.db import models
 from django.core.validators import MinValueValidator
 
@@ -12,8 +13,12 @@ class ScheduledTask(models.Model):
     SCHEDULE_TYPE_CHOICES = [
         ('interval', 'Interval'),
         ('crontab', 'Crontab'),
+        ('adaptive', 'Adaptive'),
     ]
 
+    # Factor the adaptive interval grows by after a run that found no changes
+    ADAPTIVE_BACKOFF_FACTOR = 2
+
     name = models.CharField(max_length=255, unique=True)
     task = models.CharField(max_length=255, choices=TASK_CHOICES)
     enabled = models.BooleanField(default=True)
@@ -70,6 +75,26 @@ class ScheduledTask(models.Model):
         help_text="Crontab month of year (1-12, jan,feb,mar,apr,may,jun,jul,aug,sep,oct,nov,dec)"
     )
 
+    # Adaptive schedule fields
+    adaptive_min_interval = models.IntegerField(
+        default=5 * 60,
+        validators=[MinValueValidator(1)],
+        help_text="Shortest interval in seconds, used while runs keep finding changes"
+    )
+    adaptive_max_interval = models.IntegerField(
+        default=6 * 60 * 60,
+        validators=[MinValueValidator(1)],
+        help_text="Longest interval in seconds the schedule backs off to when nothing changes"
+    )
+    adaptive_interval = models.IntegerField(
+        null=True, blank=True,
+        help_text="Current interval in seconds, computed from the outcome of the last run"
+    )
+    last_change_count = models.IntegerField(
+        null=True, blank=True,
+        help_text="Records created, updated or deleted by the last run"
+    )
+
     # Last run information
     last_run_at = models.DateTimeField(null=True, blank=True)
     total_run_count = models.PositiveIntegerField(default=0)
@@ -81,6 +106,45 @@ class ScheduledTask(models.Model):
     def __str__(self):
         return self.name
 
+    def current_adaptive_interval(self):
+        """
+        Return the interval in seconds of an adaptive schedule, clamped to
+        the configured bounds. Before the first recorded outcome the
+        interval fields are used as a starting point, or the minimum.
+        """
+        interval = self.adaptive_interval or self.interval_total_seconds() or self.adaptive_min_interval
+        return max(self.adaptive_min_interval, min(interval, self.adaptive_max_interval))
+
+    def interval_total_seconds(self):
+        """
+        Return the sum of the interval fields in seconds, 0 if none is set.
+        """
+        return int(timedelta(
+            days=self.interval_days or 0,
+            hours=self.interval_hours or 0,
+            minutes=self.interval_minutes or 0,
+            seconds=self.interval_seconds or 0,
+        ).total_seconds())
+
+    def record_changes(self, changes):
+        """
+        Adjust the adaptive interval to the outcome of a run.
+
+        A run that found changes drops the interval to the minimum, so an
+        active emergency is polled closely. A run that found none multiplies
+        it by ADAPTIVE_BACKOFF_FACTOR, up to the maximum.
+
+        Args:
+            changes: Number of records the run created, updated or deleted
+        """
+        if changes > 0:
+            interval = self.adaptive_min_interval
+        else:
+            interval = self.current_adaptive_interval() * self.ADAPTIVE_BACKOFF_FACTOR
+        self.adaptive_interval = max(self.adaptive_min_interval, min(interval, self.adaptive_max_interval))
+        self.last_change_count = changes
+        self.save(update_fields=['adaptive_interval', 'last_change_count'])
+
     class Meta:
         verbose_name = "Scheduled Task"
         verbose_name_plural = "Scheduled Tasks"
@@ -36,38 +36,9 @@ class DatabaseScheduleEntry(ScheduleEntry):
     
     def _make_schedule(self):
         """
-        Create a celery.schedules.schedule or celery.schedules.crontab
-        based on the task's schedule_type.
+        Create the Celery schedule of the wrapped task.
         """
-        if self.task.schedule_type == 'interval':
-            # Calculate the total seconds for the interval
-            interval_seconds = 0
-            if self.task.interval_seconds:
-                interval_seconds += self.task.interval_seconds
-            if self.task.interval_minutes:
-                interval_seconds += self.task.interval_minutes * 60
-            if self.task.interval_hours:
-                interval_seconds += self.task.interval_hours * 60 * 60
-            if self.task.interval_days:
-                interval_seconds += self.task.interval_days * 24 * 60 * 60
-            
-            # Default to 1 hour if no interval is set
-            if interval_seconds == 0:
-                interval_seconds = 60 * 60
-            
-            return schedule(timedelta(seconds=interval_seconds))
-        
-        elif self.task.schedule_type == 'crontab':
-            return crontab(
-                minute=self.task.crontab_minute or '*',
-                hour=self.task.crontab_hour or '*',
-                day_of_week=self.task.crontab_day_of_week or '*',
-                day_of_month=self.task.crontab_day_of_month or '*',
-                month_of_year=self.task.crontab_month_of_year or '*'
-            )
-        
-        # Default to hourly schedule
-        return schedule(timedelta(hours=1))
+        return make_schedule(self.task)
     
     def is_due(self):
         """
@@ -92,6 +63,51 @@ class DatabaseScheduleEntry(ScheduleEntry):
         return self.__class__(self.task)
 
 
+def make_schedule(task):
+    """
+    Create a celery.schedules.schedule or celery.schedules.crontab
+    based on the task's schedule_type.
+
+    Adaptive schedules are plain interval schedules using the interval
+    computed from the outcome of the last run (see
+    ScheduledTask.record_changes). The scheduler re-reads the tasks every
+    sync_every seconds, which picks up the new interval.
+    """
+    if task.schedule_type == 'interval':
+        # Default to 1 hour if no interval is set
+        interval_seconds = task.interval_total_seconds() or 60 * 60
+        return schedule(timedelta(seconds=interval_seconds))
+
+    elif task.schedule_type == 'crontab':
+        return crontab(
+            minute=task.crontab_minute or '*',
+            hour=task.crontab_hour or '*',
+            day_of_week=task.crontab_day_of_week or '*',
+            day_of_month=task.crontab_day_of_month or '*',
+            month_of_year=task.crontab_month_of_year or '*'
+        )
+
+    elif task.schedule_type == 'adaptive':
+        return schedule(timedelta(seconds=task.current_adaptive_interval()))
+
+    # Default to hourly schedule
+    return schedule(timedelta(hours=1))
+
+
+def next_run_time(task):
+    """
+    Return when a task is due next, or None if it is disabled.
+    A task that never ran is due now.
+    """
+    if not task.enabled:
+        return None
+    now = timezone.now()
+    if task.last_run_at is None:
+        return now
+    remaining = make_schedule(task).remaining_estimate(task.last_run_at)
+    return now + max(remaining, timedelta(0))
+
+
 class DatabaseScheduler(Scheduler):
     """
     Scheduler that uses the database for configuration.
@@ -0,0 +1,44 @@
+"""
+Signal handlers for the scheduler app.
+
+Adaptive schedules learn from the result of every run: once a scheduled task
+finishes on a worker, the number of records it changed shortens or lengthens
+the interval until its next run (see ScheduledTask.record_changes).
+"""
+import logging
+from celery.signals import task_postrun
+from .models import ScheduledTask
+
+logger = logging.getLogger(__name__)
+
+
+def changes_in_result(result):
+    """
+    Return the number of records a sync task created, updated or deleted,
+    or None if its result does not say, e.g. for skipped, failed or fan-out
+    runs. A sync that failed part way catches the error and reports
+    succeeded=False, so Celery still records it as a success.
+    """
+    if not isinstance(result, dict) or result.get('skipped') or 'dispatched' in result:
+        return None
+    if result.get('succeeded') is False:
+        return None
+    if 'created' not in result and 'updated' not in result:
+        return None
+    return (result.get('created') or 0) + (result.get('updated') or 0) + (result.get('deleted') or 0)
+
+
+@task_postrun.connect
+def record_adaptive_outcome(sender=None, task=None, retval=None, state=None, **kwargs):
+    """
+    Adjust the adaptive schedules of a task once it has run on a worker.
+    """
+    if state != 'SUCCESS' or task is None:
+        return
+    changes = changes_in_result(retval)
+    if changes is None:
+        return
+    for scheduled_task in ScheduledTask.objects.filter(task=task.name, schedule_type='adaptive', enabled=True):
+        scheduled_task.record_changes(changes)
+        logger.info("Run of %s found %s changes, next run in %s seconds",
+                    scheduled_task.name, changes, scheduled_task.adaptive_interval)
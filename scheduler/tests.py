@@ -1,3 +1,65 @@
+from datetime import timedelta
+from types import SimpleNamespace
+from celery.signals import task_postrun
 from django.test import TestCase
+from django.utils import timezone
+from .models import ScheduledTask
+from .scheduler import make_schedule, next_run_time
 
-# Create your tests here.
+
+class AdaptiveScheduleTests(TestCase):
+    """
+    Tests for the adaptive schedule type.
+    """
+
+    def setUp(self):
+        self.task = ScheduledTask.objects.create(
+            name='Fetch Surge Alerts',
+            task='surge.tasks.fetch_surge_alerts',
+            schedule_type='adaptive',
+            interval_hours=1,
+            adaptive_min_interval=300,
+            adaptive_max_interval=4 * 60 * 60,
+        )
+
+    def finish_run(self, result, state='SUCCESS'):
+        task_postrun.send(sender=None, task=SimpleNamespace(name=self.task.task), retval=result, state=state)
+        self.task.refresh_from_db()
+
+    def test_backs_off_while_nothing_changes(self):
+        self.assertEqual(self.task.current_adaptive_interval(), 3600)
+        intervals = []
+        for _ in range(4):
+            self.finish_run({'created': 0, 'updated': 0, 'unchanged': 300, 'deleted': 0})
+            intervals.append(self.task.adaptive_interval)
+        self.assertEqual(intervals, [7200, 14400, 14400, 14400])
+
+    def test_changes_shorten_the_interval_to_the_minimum(self):
+        self.finish_run({'created': 0, 'updated': 0, 'unchanged': 300})
+        self.finish_run({'created': 2, 'updated': 1, 'unchanged': 297})
+        self.assertEqual(self.task.adaptive_interval, 300)
+        self.assertEqual(self.task.last_change_count, 3)
+        self.assertEqual(make_schedule(self.task).run_every, timedelta(seconds=300))
+
+    def test_runs_without_counts_leave_the_interval_alone(self):
+        self.finish_run({'created': 0, 'updated': 0, 'full': False, 'skipped': True})
+        self.finish_run({'dispatched': 4, 'created': 0, 'updated': 0})
+        self.finish_run(None, state='FAILURE')
+        self.assertIsNone(self.task.adaptive_interval)
+
+    def test_failed_syncs_leave_the_interval_alone(self):
+        self.finish_run({'created': 0, 'updated': 0, 'unchanged': 300, 'succeeded': True})
+        self.assertEqual(self.task.adaptive_interval, 7200)
+        self.finish_run({'created': 0, 'updated': 0, 'unchanged': 0, 'succeeded': False})
+        self.assertEqual(self.task.adaptive_interval, 7200)
+
+    def test_next_run_follows_the_last_run(self):
+        self.assertAlmostEqual(next_run_time(self.task), timezone.now(), delta=timedelta(seconds=5))
+
+        self.task.last_run_at = timezone.now()
+        self.task.record_changes(0)
+        self.assertAlmostEqual(next_run_time(self.task), self.task.last_run_at + timedelta(hours=2),
+                               delta=timedelta(seconds=5))
+
+        self.task.enabled = False
+        self.assertIsNone(next_run_time(self.task))
@@ -17,9 +17,19 @@ def run_task(request, task_id):
     if task.task == 'surge.tasks.fetch_surge_alerts':
         try:
             result = fetch_surge_alerts()
+            if result.get('skipped'):
+                messages.warning(request, f'Task "{task.name}" is already running, try again once it has finished.')
+                return HttpResponseRedirect(reverse('admin:scheduler_scheduledtask_changelist'))
+            if 'dispatched' in result:
+                messages.success(
+                    request,
+                    f'Dispatched task "{task.name}" as {result["dispatched"]} page subtasks to the Celery workers.'
+                )
+                return HttpResponseRedirect(reverse('admin:scheduler_scheduledtask_changelist'))
             messages.success(
                 request, 
-                f'Successfully ran task "{task.name}". Created: {result["created"]}, Updated: {result["updated"]}'
+                f'Successfully ran task "{task.name}". Created: {result["created"]}, Updated: {result["updated"]}, '
+                f'Unchanged: {result["unchanged"]}'
             )
         except Exception as e:
             messages.error(request, f'Error running task "{task.name}": {str(e)}')
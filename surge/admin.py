@@ -1,8 +1,11 @@
 """
 Admin configuration for the surge app.
 """
-from django.contrib import admin
-from .models import Country, MolnixTag, SurgeAlert, DisasterType, Event
+from django.contrib import admin, messages
+from django.http import HttpResponseRedirect
+from django.urls import reverse
+from users.matching import candidate_matrix
+from .models import Country, MolnixTag, SurgeAlert, DisasterType, Event, IngestRun
 
 
 @admin.register(Country)
@@ -27,10 +30,10 @@ class MolnixTagInline(admin.TabularInline):
 @admin.register(SurgeAlert)
 class SurgeAlertAdmin(admin.ModelAdmin):
     list_display = ('api_id', 'message', 'country', 'event_display', 'molnix_status_display', 'created_at', 'last_updated')
-    list_filter = ('molnix_status_display', 'atype_display', 'category_display', 'country', 'event')
+    list_filter = ('molnix_status_display', 'atype_display', 'category_display', ('deleted_at', admin.EmptyFieldListFilter), 'country', 'event')
     search_fields = ('message', 'operation')
     date_hierarchy = 'created_at'
-    readonly_fields = ('last_updated',)
+    readonly_fields = ('last_updated', 'deleted_at')
     fieldsets = (
         ('Basic Information', {
             'fields': ('api_id', 'message', 'country', 'event', 'operation')
@@ -40,7 +43,7 @@ class SurgeAlertAdmin(admin.ModelAdmin):
                       'category', 'category_display')
         }),
         ('Dates', {
-            'fields': ('created_at', 'opens', 'closes', 'start', 'end', 'last_updated')
+            'fields': ('created_at', 'opens', 'closes', 'start', 'end', 'last_updated', 'deleted_at')
         }),
         ('Flags', {
             'fields': ('deployment_needed', 'is_private')
@@ -51,6 +54,23 @@ class SurgeAlertAdmin(admin.ModelAdmin):
     )
     inlines = [MolnixTagInline]
     exclude = ('molnix_tags',)
+    actions = ['rank_candidates']
+
+    @admin.action(description="Rank candidate users")
+    def rank_candidates(self, request, queryset):
+        """
+        Open the candidate roster of a single alert, or summarise the best
+        candidates of several, scoring them all against the shared
+        CandidateMatrix.
+        """
+        if queryset.count() == 1:
+            return HttpResponseRedirect(reverse('users:alert_candidates', args=[queryset.get().pk]))
+
+        matrix = candidate_matrix.get()
+        for alert in queryset.select_related('country').prefetch_related('molnix_tags'):
+            candidates = matrix.rank(alert, limit=3)
+            names = ", ".join(candidate.username for candidate in candidates) or "none"
+            self.message_user(request, f"Alert {alert.api_id}: best candidates {names}", messages.INFO)
 
     def event_display(self, obj):
         if obj.event:
@@ -84,10 +104,10 @@ class SurgeAlertInline(admin.TabularInline):
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
     list_display = ('name', 'api_id', 'dtype', 'ifrc_severity_level_display', 'glide', 'active_deployments', 'created_at', 'last_updated')
-    list_filter = ('ifrc_severity_level_display', 'dtype', 'active_deployments')
+    list_filter = ('ifrc_severity_level_display', 'dtype', 'active_deployments', ('deleted_at', admin.EmptyFieldListFilter))
     search_fields = ('name', 'summary', 'glide')
     date_hierarchy = 'created_at'
-    readonly_fields = ('last_updated',)
+    readonly_fields = ('last_updated', 'deleted_at')
     fieldsets = (
         ('Basic Information', {
             'fields': ('api_id', 'name', 'summary', 'dtype')
@@ -96,7 +116,7 @@ class EventAdmin(admin.ModelAdmin):
             'fields': ('ifrc_severity_level', 'ifrc_severity_level_display', 'glide', 'active_deployments')
         }),
         ('Dates', {
-            'fields': ('disaster_start_date', 'created_at', 'last_updated')
+            'fields': ('disaster_start_date', 'created_at', 'last_updated', 'deleted_at')
         }),
         ('Other', {
             'fields': ('translation_module_original_language',)
@@ -104,3 +124,54 @@ class EventAdmin(admin.ModelAdmin):
     )
     inlines = [CountryInline, SurgeAlertInline]
     exclude = ('countries',)
+
+
+@admin.register(IngestRun)
+class IngestRunAdmin(admin.ModelAdmin):
+    list_display = ('task', 'started_at', 'status', 'full', 'duration_display', 'pages', 'pages_not_modified',
+                    'created', 'updated', 'unchanged', 'failed', 'query_count', 'latency_p95', 'peak_rss_display')
+    list_filter = ('task', 'status', 'full')
+    date_hierarchy = 'started_at'
+    readonly_fields = [field.name for field in IngestRun._meta.fields]
+    change_list_template = 'admin/surge/ingestrun/change_list.html'
+
+    # Number of most recent runs per task shown on the chart
+    chart_runs = 200
+
+    def has_add_permission(self, request):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        """
+        Add the duration, query count and row counts of the most recent runs
+        of each task to the change list, for the chart above the table.
+        """
+        chart = {}
+        for task in IngestRun.objects.values_list('task', flat=True).distinct().order_by('task'):
+            runs = IngestRun.objects.filter(task=task, finished_at__isnull=False).order_by('-started_at')[:self.chart_runs]
+            chart[task] = [
+                {
+                    'started_at': run.started_at.isoformat(),
+                    'duration': run.duration,
+                    'queries': run.query_count,
+                    'rows': run.created + run.updated,
+                    'status': run.status,
+                }
+                for run in reversed(runs)
+            ]
+        extra_context = {**(extra_context or {}), 'ingest_chart': chart}
+        return super().changelist_view(request, extra_context=extra_context)
+
+    def duration_display(self, obj):
+        if obj.duration is None:
+            return "-"
+        return f"{obj.duration:.1f}s"
+    duration_display.short_description = "Duration"
+    duration_display.admin_order_field = 'duration'
+
+    def peak_rss_display(self, obj):
+        if obj.peak_rss is None:
+            return "-"
+        return f"{obj.peak_rss / (1024 * 1024):.1f} MB"
+    peak_rss_display.short_description = "Peak RSS growth"
+    peak_rss_display.admin_order_field = 'peak_rss'
@@ -0,0 +1,160 @@
+"""
+Compressed archive of the raw API pages fetched by the sync tasks.
+
+Every page is written gzip-compressed to settings.IFRC_ARCHIVE_DIR, one
+directory per sync (a "batch"), and indexed in the ArchivedPage table by
+resource, run and page number. The replay_ingest command feeds archived
+pages back through the processing stage without touching the network.
+Pages older than settings.IFRC_ARCHIVE_RETENTION are pruned at the end of
+each run.
+"""
+import gzip
+import json
+import logging
+import os
+from django.conf import settings
+from django.utils import timezone
+from .models import ArchivedPage
+
+logger = logging.getLogger(__name__)
+
+
+class PageArchive:
+    """
+    Archives the pages of one sync of a resource.
+
+    Usage:
+        archive = PageArchive('surge_alerts', full=True, run=recorder.run)
+        pipeline = PagePipeline(archive.wrap(iter_pages(url)))
+        try:
+            for page_number, page_url, data in pipeline:
+                ...
+        finally:
+            archive.save()
+
+    wrap() writes the files as the pages pass through, so with PagePipeline
+    the compression happens on the download thread. The index rows are
+    written by save() on the calling thread. When settings.IFRC_ARCHIVE_PAGES
+    is off the archive does nothing.
+    """
+
+    def __init__(self, resource, full=False, run=None, batch=None):
+        self.resource = resource
+        self.full = bool(full)
+        self.run_id = getattr(run, 'pk', run)
+        self.enabled = settings.IFRC_ARCHIVE_PAGES
+        self.batch = batch or new_batch(resource, self.run_id)
+        self.entries = []
+
+    def wrap(self, pages):
+        """
+        Yield the (page_number, page_url, data) tuples of a page iterator
+        unchanged, archiving each page on the way.
+        """
+        for page_number, page_url, data in pages:
+            self.add(page_number, page_url, data)
+            yield page_number, page_url, data
+
+    def add(self, page_number, page_url, data):
+        """
+        Write one page to the archive. Failures are logged, never raised, so
+        a full disk cannot stop a sync.
+        """
+        if not self.enabled or data.get('_not_modified'):
+            return
+        path = os.path.join(self.batch, f"{page_number:06d}.json.gz")
+        try:
+            payload = json.dumps(data, separators=(',', ':')).encode('utf-8')
+            full_path = os.path.join(settings.IFRC_ARCHIVE_DIR, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with gzip.open(full_path, 'wb', compresslevel=6) as f:
+                f.write(payload)
+            compressed_size = os.path.getsize(full_path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Could not archive page %s of %s: %s", page_number, self.resource, e)
+            return
+
+        self.entries.append(ArchivedPage(
+            resource=self.resource,
+            batch=self.batch,
+            run_id=self.run_id,
+            page=page_number,
+            url=page_url[:1000],
+            path=path,
+            full=self.full,
+            records=len(data.get('results') or []),
+            size=len(payload),
+            compressed_size=compressed_size,
+        ))
+
+    def save(self):
+        """
+        Index the pages archived so far and prune expired pages.
+        """
+        if not self.entries:
+            return
+        ArchivedPage.objects.bulk_create(self.entries, ignore_conflicts=True)
+        size = sum(entry.size for entry in self.entries)
+        compressed = sum(entry.compressed_size for entry in self.entries)
+        logger.info("Archived %s pages of %s in %s (%s bytes, %s compressed)",
+                    len(self.entries), self.resource, self.batch, size, compressed)
+        self.entries = []
+        prune_archive()
+
+
+def new_batch(resource, run_id=None):
+    """
+    Return a new archive directory name for a sync of a resource.
+    """
+    stamp = timezone.now().strftime('%Y%m%d-%H%M%S-%f')
+    return os.path.join(resource, f"{stamp}-{run_id}" if run_id else stamp)
+
+
+def load_page(path):
+    """
+    Read an archived page back.
+
+    Args:
+        path: The ArchivedPage path, relative to IFRC_ARCHIVE_DIR
+
+    Returns:
+        The page data as returned by the API
+    """
+    with gzip.open(os.path.join(settings.IFRC_ARCHIVE_DIR, path), 'rb') as f:
+        return json.loads(f.read())
+
+
+def prune_archive(now=None):
+    """
+    Delete the archived pages older than settings.IFRC_ARCHIVE_RETENTION,
+    both the files and their index rows.
+
+    Returns:
+        The number of pages deleted
+    """
+    cutoff = (now or timezone.now()) - settings.IFRC_ARCHIVE_RETENTION
+    expired = ArchivedPage.objects.filter(fetched_at__lt=cutoff)
+    paths = list(expired.values_list('path', flat=True))
+    if not paths:
+        return 0
+
+    directories = set()
+    for path in paths:
+        full_path = os.path.join(settings.IFRC_ARCHIVE_DIR, path)
+        directories.add(os.path.dirname(full_path))
+        try:
+            os.remove(full_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Could not delete archived page %s: %s", path, e)
+    for directory in directories:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            # Not empty: pages of the batch are still within the retention period
+            pass
+
+    deleted, _ = expired.delete()
+    logger.info("Pruned %s archived pages older than %s", deleted, cutoff)
+    return deleted
@@ -0,0 +1,246 @@
+"""
+Two-tier cache for the reference tables looked up during ingestion.
+
+Countries, disaster types, molnix tags and events are small and change
+rarely, but ingestion and the views look them up by api_id over and over.
+ReferenceCache keeps the model instances in a per-process LRU in front of
+the shared 'reference' cache (Redis, see CACHES), and loads what neither
+tier has from the database in one query.
+
+Invalidation is versioned: every model has a version number in the shared
+cache, which is part of every cache key. invalidate(model) bumps it, so the
+copies held by every process stop being used. Read-only lookups, such as
+the views, re-read the version at most every
+settings.REFERENCE_CACHE_VERSION_CHECK seconds, so they can see an entry
+invalidated by another process for up to that long. Lookups on the
+ingestion write path pass fresh=True to re-read the version on every call,
+so a row is never compared against or linked to a stale copy.
+
+Writes to the cache and invalidations are deferred until the surrounding
+transaction commits, so rows from a transaction that is rolled back never
+reach the cache.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from .models import Country, DisasterType, Event, MolnixTag
+
+logger = logging.getLogger(__name__)
+
+# Seconds the shared tier is bypassed after it could not be reached
+SHARED_RETRY_AFTER = 30
+
+_registry = []
+_shared_down_until = 0.0
+
+
+def shared_cache(func, default=None):
+    """
+    Call func with the shared cache, returning default if it cannot be reached.
+    """
+    global _shared_down_until
+    if time.monotonic() < _shared_down_until:
+        return default
+    try:
+        return func(caches['reference'])
+    except Exception as e:
+        logger.warning("Reference cache unavailable, using the database only for %ss: %s", SHARED_RETRY_AFTER, e)
+        _shared_down_until = time.monotonic() + SHARED_RETRY_AFTER
+        return default
+
+
+class ReferenceCache:
+    """
+    Caches the instances of a model keyed by one of its fields.
+
+    Usage:
+        country_cache = ReferenceCache(Country)
+        country = country_cache.get(api_id)
+        countries = country_cache.get_many(api_ids)
+
+    Lookups try the process-local LRU, then the shared cache, then the
+    database. Keys that are not in the database are not cached. When the
+    key field is not unique the row with the lowest pk wins. Pass
+    fresh=True to check the version in the shared cache first, instead of
+    trusting the last check for settings.REFERENCE_CACHE_VERSION_CHECK.
+    """
+
+    def __init__(self, model, field='api_id', size=None, timeout=None):
+        self.model = model
+        self.field = field
+        self.size = size
+        self.timeout = timeout
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.version = None
+        self.version_checked = 0.0
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        _registry.append(self)
+
+    @property
+    def name(self):
+        return f"{self.model._meta.label_lower}.{self.field}"
+
+    def key(self, value):
+        return f"ref:{self.name}:{value}"
+
+    def get(self, value, fresh=False):
+        """
+        Return the instance whose key field equals value, or None.
+        """
+        return self.get_many([value], fresh=fresh).get(value)
+
+    def get_many(self, values, fresh=False):
+        """
+        Return a dict mapping each value found to its instance.
+        """
+        values = [value for value in dict.fromkeys(values) if value is not None]
+        if not values:
+            return {}
+        version = self.current_version(fresh)
+
+        found = {}
+        with self.lock:
+            for value in values:
+                entry = self.local.get(value)
+                if entry is not None and entry[0] == version:
+                    self.local.move_to_end(value)
+                    found[value] = entry[1]
+            self.local_hits += len(found)
+
+        missing = [value for value in values if value not in found]
+        if missing:
+            keys = {self.key(value): value for value in missing}
+            shared = shared_cache(lambda c: c.get_many(list(keys), version=version), {})
+            shared = {keys[key]: obj for key, obj in shared.items()}
+            self.store_local(shared, version)
+            found.update(shared)
+            missing = [value for value in missing if value not in shared]
+            with self.lock:
+                self.shared_hits += len(shared)
+
+        if missing:
+            loaded = {}
+            for obj in self.model.objects.filter(**{f'{self.field}__in': missing}).order_by('pk'):
+                loaded.setdefault(getattr(obj, self.field), obj)
+            self.set_many(loaded.values(), version)
+            found.update(loaded)
+            with self.lock:
+                self.misses += len(missing)
+
+        return found
+
+    def set_many(self, objs, version=None):
+        """
+        Put freshly read or written instances in both tiers once the current
+        transaction commits.
+
+        Args:
+            objs: Model instances
+            version: The version the instances were read under, or None to
+                store them under the version current at commit time
+        """
+        objs = {getattr(obj, self.field): obj for obj in objs if getattr(obj, self.field) is not None}
+        if objs:
+            transaction.on_commit(lambda: self.store(objs, version))
+
+    def store(self, objs, version=None):
+        version = version if version is not None else self.current_version()
+        self.store_local(objs, version)
+        timeout = self.timeout or settings.REFERENCE_CACHE_TIMEOUT
+        shared_cache(lambda c: c.set_many({self.key(value): obj for value, obj in objs.items()},
+                                          timeout=timeout, version=version))
+
+    def store_local(self, objs, version):
+        size = self.size or settings.REFERENCE_CACHE_SIZE
+        with self.lock:
+            for value, obj in objs.items():
+                self.local[value] = (version, obj)
+                self.local.move_to_end(value)
+            while len(self.local) > size:
+                self.local.popitem(last=False)
+
+    def current_version(self, fresh=False):
+        """
+        Return the model's version, re-reading it from the shared cache when
+        fresh is set or the last check is older than
+        settings.REFERENCE_CACHE_VERSION_CHECK.
+        """
+        now = time.monotonic()
+        if fresh or self.version is None or now - self.version_checked >= settings.REFERENCE_CACHE_VERSION_CHECK:
+            version = shared_cache(lambda c: c.get_or_set(version_key(self.model), 1, timeout=None))
+            self.version = version if version is not None else (self.version or 1)
+            self.version_checked = now
+        return self.version
+
+    def clear(self, version=None):
+        with self.lock:
+            self.local.clear()
+            self.version = version
+            self.version_checked = time.monotonic()
+
+    def stats(self):
+        """
+        Return the hit and miss counters of this cache.
+        """
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.local_hits + self.shared_hits) / lookups, 4) if lookups else None,
+            'size': len(self.local),
+        }
+
+
+def version_key(model):
+    return f"ref:{model._meta.label_lower}:version"
+
+
+def invalidate(model):
+    """
+    Drop every cached instance of a model, in all processes, once the
+    current transaction commits.
+    Call it after rows of the model were changed or deleted.
+    """
+    transaction.on_commit(lambda: bump_version(model))
+
+
+def bump_version(model):
+    def bump(c):
+        key = version_key(model)
+        if c.add(key, 2, timeout=None):
+            return 2
+        return c.incr(key)
+
+    version = shared_cache(bump)
+    for reference_cache in _registry:
+        if reference_cache.model is model:
+            reference_cache.clear(version)
+
+
+def cache_stats():
+    """
+    Return the counters of every reference cache, keyed by model and field.
+    """
+    return {reference_cache.name: reference_cache.stats() for reference_cache in _registry}
+
+
+def clear_local():
+    """
+    Empty the process-local tier of every reference cache.
+    """
+    for reference_cache in _registry:
+        reference_cache.clear()
+
+
+country_cache = ReferenceCache(Country)
+disaster_type_cache = ReferenceCache(DisasterType)
+molnix_tag_cache = ReferenceCache(MolnixTag)
+event_cache = ReferenceCache(Event)
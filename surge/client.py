@@ -0,0 +1,279 @@
+"""
+Shared HTTP client for calls to the IFRC API and other upstream data sources.
+
+All outbound requests go through one pooled requests.Session so connections
+are kept alive between calls. Failed requests are retried with exponential
+backoff and jitter, and a circuit breaker stops sending requests for a while
+once the upstream keeps failing. Each host has its own circuit breaker, so an
+unreachable data source does not stop requests to the others.
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Status codes that are worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    Raised when a request is refused because the circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker that opens after a number of consecutive failures.
+
+    While open, requests are refused straight away. Once `reset_timeout`
+    seconds have passed a single trial request is let through: if it
+    succeeds the circuit closes again, otherwise it stays open.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        """
+        Raise CircuitOpenError if requests should not be sent right now.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                logger.info("Circuit breaker half-open, letting a trial request through")
+                self.state = self.HALF_OPEN
+                return
+            raise CircuitOpenError(f"Circuit breaker is {self.state}, refusing request")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuit breaker closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Circuit breaker opened after %s consecutive failures", self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class ClientStats:
+    """
+    Thread-safe request, retry and latency counters for a client.
+    """
+
+    def __init__(self, max_samples=10000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=max_samples)
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+        self.bytes_received = 0
+
+    def record_request(self, latency, size):
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += size
+            self._latencies.append(latency)
+
+    def increment(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def recent_latencies(self, count):
+        """
+        Return the latencies of the last `count` requests, or of as many as
+        are still kept.
+        """
+        with self._lock:
+            return list(self._latencies)[-count:] if count > 0 else []
+
+    def snapshot(self):
+        """
+        Return the counters and latency percentiles (in seconds) as a dict.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'bytes_received': self.bytes_received,
+                'latency_p50': percentile(latencies, 50),
+                'latency_p95': percentile(latencies, 95),
+                'latency_p99': percentile(latencies, 99),
+                'latency_max': latencies[-1] if latencies else None,
+            }
+
+
+class HttpClient:
+    """
+    Pooled HTTP client with timeouts, retries and a circuit breaker per host.
+
+    Args:
+        timeout: Per-request timeout in seconds, or a (connect, read) tuple
+        max_retries: Number of retries after the first attempt
+        backoff_factor: Base delay in seconds, doubled on every retry
+        backoff_max: Upper bound for a single backoff delay in seconds
+        pool_size: Number of keep-alive connections kept per host
+        failure_threshold: Consecutive failures of a host before its circuit opens
+        reset_timeout: Seconds before an open circuit lets a trial request through
+    """
+
+    def __init__(self, timeout=(5, 30), max_retries=3, backoff_factor=0.5, backoff_max=30,
+                 pool_size=10, failure_threshold=5, reset_timeout=60):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers = {}
+        self._breakers_lock = threading.Lock()
+        self.stats = ClientStats()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def breaker(self, url):
+        """
+        Return the circuit breaker of the host of a URL.
+        """
+        host = urlsplit(url).netloc.lower()
+        with self._breakers_lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self.breakers[host]
+
+    def get(self, url, **kwargs):
+        """
+        Send a GET request, retrying connection errors, timeouts and
+        retryable status codes. Returns the last response; callers are
+        expected to call raise_for_status() as usual.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker of the host is open
+            requests.RequestException: If every attempt failed to get a response
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        breaker = self.breaker(url)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                breaker.before_request()
+            except CircuitOpenError:
+                self.stats.increment('rejected')
+                raise
+
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                breaker.record_failure()
+                if attempt >= self.max_retries:
+                    self.stats.increment('failures')
+                    raise
+                logger.warning("Request to %s failed (%s), retrying", url, e)
+                self.backoff(attempt)
+                continue
+            except Exception:
+                # Not retried, but still counted so a failed trial request
+                # does not leave the breaker half-open
+                breaker.record_failure()
+                self.stats.increment('failures')
+                raise
+
+            latency = time.perf_counter() - started
+            self.stats.record_request(latency, len(response.content) if not kwargs.get('stream') else 0)
+
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return response
+
+            breaker.record_failure()
+            if attempt >= self.max_retries:
+                self.stats.increment('failures')
+                return response
+            logger.warning("Request to %s returned %s, retrying", url, response.status_code)
+            self.backoff(attempt, response.headers.get('Retry-After'))
+
+    def get_json(self, url, **kwargs):
+        """
+        Send a GET request and return the decoded JSON body.
+        """
+        response = self.get(url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Sleep before the next retry, using exponential backoff with full
+        jitter or the server's Retry-After header when it sends one.
+        """
+        self.stats.increment('retries')
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = random.uniform(0, self.backoff_factor * (2 ** attempt))
+        time.sleep(min(delay, self.backoff_max))
+
+
+def percentile(sorted_values, pct):
+    """
+    Return the nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process-wide client, creating it from settings on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient(
+                    timeout=(settings.IFRC_HTTP_CONNECT_TIMEOUT, settings.IFRC_HTTP_READ_TIMEOUT),
+                    max_retries=settings.IFRC_HTTP_MAX_RETRIES,
+                    backoff_factor=settings.IFRC_HTTP_BACKOFF_FACTOR,
+                    backoff_max=settings.IFRC_HTTP_BACKOFF_MAX,
+                    pool_size=max(settings.IFRC_HTTP_POOL_SIZE, settings.IFRC_FETCH_CONCURRENCY),
+                    failure_threshold=settings.IFRC_CIRCUIT_FAILURE_THRESHOLD,
+                    reset_timeout=settings.IFRC_CIRCUIT_RESET_TIMEOUT,
+                )
+    return _client
@@ -0,0 +1,163 @@
+"""
+Conditional requests for the pages of the IFRC API.
+
+The ETag and Last-Modified headers returned with every page are stored in
+the PageValidator table and sent back as If-None-Match / If-Modified-Since
+the next time the same page URL is requested. When the API answers
+304 Not Modified the page is neither downloaded nor processed again: the
+sync tasks get a stand-in page built from the stored record count, next
+link and record IDs, so pagination and the deletion reconciliation of full
+syncs keep working.
+
+A page's validators are only stored once the page was written without
+errors, so a page that failed is downloaded in full on the next run.
+"""
+import logging
+import threading
+from django.conf import settings
+from django.utils import timezone
+from .models import PageValidator
+
+logger = logging.getLogger(__name__)
+
+
+class PageValidators:
+    """
+    The stored validators of the pages of one resource.
+
+    Usage:
+        validators = PageValidators('surge_alerts')
+        for page_number, page_url, data in iter_pages(url, validators=validators):
+            if data.get('_not_modified'):
+                continue
+            ...  # write the page
+            validators.processed(page_url)
+        validators.save()
+
+    headers(), not_modified() and received() are called by the download
+    threads; processed() and save() by the thread that writes the pages.
+    When settings.IFRC_CONDITIONAL_REQUESTS is off no headers are sent and
+    nothing is stored.
+
+    Args:
+        resource: The resource name, e.g. 'surge_alerts'
+        urls: Only load the validators of these URLs, instead of every
+            validator of the resource
+    """
+
+    def __init__(self, resource, urls=None):
+        self.resource = resource
+        self.enabled = settings.IFRC_CONDITIONAL_REQUESTS
+        self.lock = threading.Lock()
+        self.known = {}
+        self.received_pages = {}
+        self.processed_pages = []
+        self.used = []
+        self.pages_not_modified = 0
+        self.bytes_avoided = 0
+
+        if self.enabled:
+            validators = PageValidator.objects.filter(resource=resource)
+            if urls is not None:
+                validators = validators.filter(url__in=list(urls))
+            self.known = {validator.url: validator for validator in validators}
+
+    def headers(self, url):
+        """
+        Return the conditional request headers for a page URL.
+        """
+        validator = self.known.get(url)
+        if validator is None:
+            return {}
+        headers = {}
+        if validator.etag:
+            headers['If-None-Match'] = validator.etag
+        if validator.last_modified:
+            headers['If-Modified-Since'] = validator.last_modified
+        return headers
+
+    def not_modified(self, url):
+        """
+        Return the stand-in page data for a page the API answered with 304.
+
+        The stand-in has the stored 'count' and 'next' values, no results,
+        '_not_modified' set and the IDs of the page's records in '_ids'.
+        """
+        validator = self.known[url]
+        with self.lock:
+            self.pages_not_modified += 1
+            self.bytes_avoided += validator.size
+            self.used.append(validator.pk)
+        return {
+            'count': validator.count,
+            'next': validator.next_url,
+            'results': [],
+            '_not_modified': True,
+            '_ids': list(validator.record_ids),
+        }
+
+    def received(self, url, response, data):
+        """
+        Remember the validators of a page that was downloaded in full.
+        They are stored once processed() is called for the page.
+        """
+        if not self.enabled:
+            return
+        etag = response.headers.get('ETag', '')
+        last_modified = response.headers.get('Last-Modified', '')
+        if not etag and not last_modified:
+            return
+        results = data.get('results') or []
+        validator = PageValidator(
+            resource=self.resource,
+            url=url[:1000],
+            etag=etag[:255],
+            last_modified=last_modified[:100],
+            count=data.get('count'),
+            next_url=(data.get('next') or '')[:1000] or None,
+            record_ids=[item['id'] for item in results if item and isinstance(item.get('id'), int)],
+            size=len(response.content),
+        )
+        with self.lock:
+            self.received_pages[url] = validator
+
+    def processed(self, url):
+        """
+        Mark a downloaded page as written, so its validators are stored.
+        """
+        with self.lock:
+            validator = self.received_pages.pop(url, None)
+        if validator is not None:
+            self.processed_pages.append(validator)
+
+    def save(self):
+        """
+        Store the validators of the pages processed so far, touch the ones
+        that were used and prune the stale ones.
+        """
+        if not self.enabled:
+            return
+        now = timezone.now()
+        if self.processed_pages:
+            for validator in self.processed_pages:
+                validator.checked_at = now
+            PageValidator.objects.bulk_create(
+                self.processed_pages,
+                update_conflicts=True,
+                unique_fields=['url'],
+                update_fields=['resource', 'etag', 'last_modified', 'count', 'next_url', 'record_ids', 'size', 'checked_at'],
+            )
+            self.processed_pages = []
+        if self.used:
+            PageValidator.objects.filter(pk__in=self.used).update(checked_at=now)
+            self.used = []
+        pruned, _ = PageValidator.objects.filter(checked_at__lt=now - settings.IFRC_VALIDATOR_RETENTION).delete()
+        if pruned:
+            logger.info("Pruned %s page validators unused since %s", pruned, now - settings.IFRC_VALIDATOR_RETENTION)
+
+    def stats(self):
+        """
+        Return the number of pages the API answered with 304 and the bytes
+        that were not downloaded because of it.
+        """
+        return {'pages_not_modified': self.pages_not_modified, 'bytes_avoided': self.bytes_avoided}
@@ -0,0 +1,258 @@
+"""
+Local stand-in for the IFRC API, used by the tests and the ingestion benchmark.
+
+Serves synthetic surge_alert and event pages with limit/offset pagination and
+'next' links, in the same shape as the real API. Records are generated on the
+fly from their ID, so large data sets do not need to be held in memory.
+Response latency and server errors can be injected. Responses carry an ETag
+and requests sending a matching If-None-Match are answered with 304.
+
+Usage:
+    with FakeIfrcApi(alerts=10000, latency=0.05) as api:
+        with override_settings(IFRC_API_URL=api.alert_url, IFRC_EVENT_API_URL=api.event_url):
+            fetch_surge_alerts(full=True)
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qsl, urlencode
+from django.utils.dateparse import parse_datetime
+
+# Records are created one minute apart from this point in time
+BASE_TIME = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+COUNTRY_COUNT = 50
+TAG_COUNT = 20
+DISASTER_TYPES = ['Flood', 'Earthquake', 'Cyclone', 'Epidemic', 'Drought', 'Population Movement']
+
+
+class FakeIfrcApi:
+    """
+    A threaded HTTP server serving synthetic IFRC API data.
+
+    Args:
+        alerts: Number of surge alerts served
+        events: Number of events served, defaults to one per ten alerts
+        latency: Seconds to wait before answering each request
+        error_rate: Fraction of requests answered with a 503
+        seed: Seed for the error injection, so runs are repeatable
+    """
+
+    def __init__(self, alerts=1000, events=None, latency=0.0, error_rate=0.0, seed=0):
+        self.alerts = alerts
+        self.events = events if events is not None else max(alerts // 10, 1)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeIfrcHandler)
+        self.server.daemon_threads = True
+        self.server.api = self
+        threading.Thread(target=self.server.serve_forever, name='fake-ifrc-api', daemon=True).start()
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server.server_port}/api/v2/'
+
+    @property
+    def alert_url(self):
+        return f'{self.base_url}surge_alert/'
+
+    @property
+    def event_url(self):
+        return f'{self.base_url}event/'
+
+    def request_started(self):
+        with self.random_lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def request_finished(self):
+        with self.random_lock:
+            self.in_flight -= 1
+
+    def should_fail(self):
+        with self.random_lock:
+            self.requests += 1
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.errors += 1
+                return True
+        return False
+
+    def alert(self, alert_id):
+        """
+        Return the synthetic surge alert with the given ID.
+        """
+        return {
+            'id': alert_id,
+            'country': country(alert_id % COUNTRY_COUNT + 1),
+            'event': alert_id % self.events + 1,
+            'deployment_needed': alert_id % 3 == 0,
+            'is_private': False,
+            'created_at': created_at(alert_id),
+            'opens': created_at(alert_id),
+            'closes': created_at(alert_id + 60 * 24 * 14),
+            'atype': alert_id % 4,
+            'atype_display': f'Type {alert_id % 4}',
+            'category': alert_id % 3,
+            'category_display': f'Category {alert_id % 3}',
+            'molnix_id': alert_id,
+            'molnix_status': 1,
+            'molnix_status_display': 'Open',
+            'molnix_tags': [tag(alert_id % TAG_COUNT + 1), tag((alert_id * 7) % TAG_COUNT + 1)],
+            'message': f'Surge alert {alert_id}',
+            'operation': f'Operation {alert_id % self.events + 1}',
+            'translation_module_original_language': 'en',
+        }
+
+    def event(self, event_id):
+        """
+        Return the synthetic event with the given ID.
+        """
+        return {
+            'id': event_id,
+            'name': f'Event {event_id}',
+            'summary': f'Summary of event {event_id}',
+            'dtype': {'id': event_id % len(DISASTER_TYPES) + 1, 'name': DISASTER_TYPES[event_id % len(DISASTER_TYPES)]},
+            'countries': [country(event_id % COUNTRY_COUNT + 1)],
+            'ifrc_severity_level': event_id % 3,
+            'ifrc_severity_level_display': ['Yellow', 'Orange', 'Red'][event_id % 3],
+            'glide': f'FL-{event_id:06d}',
+            'disaster_start_date': created_at(event_id),
+            'created_at': created_at(event_id),
+            'active_deployments': event_id % 5,
+        }
+
+
+class FakeIfrcHandler(BaseHTTPRequestHandler):
+    """
+    Answers list and detail requests for the surge_alert and event endpoints.
+    """
+
+    def do_GET(self):
+        api = self.server.api
+        api.request_started()
+        try:
+            self.answer(api)
+        finally:
+            api.request_finished()
+
+    def answer(self, api):
+        if api.latency:
+            time.sleep(api.latency)
+        if api.should_fail():
+            return self.send_json(503, {'detail': 'Injected error'})
+
+        parts = urlparse(self.path)
+        query = dict(parse_qsl(parts.query))
+
+        detail = re.fullmatch(r'/api/v2/event/(\d+)/', parts.path)
+        if detail:
+            event_id = int(detail.group(1))
+            if not 1 <= event_id <= api.events:
+                return self.send_json(404, {'detail': 'Not found.'})
+            return self.send_json(200, api.event(event_id))
+
+        if parts.path == '/api/v2/surge_alert/':
+            return self.send_page(parts, query, api.alerts, api.alert)
+        if parts.path == '/api/v2/event/':
+            return self.send_page(parts, query, api.events, api.event)
+        return self.send_json(404, {'detail': 'Not found.'})
+
+    def send_page(self, parts, query, total, build):
+        limit = int(query.get('limit', 50))
+        offset = int(query.get('offset', 0))
+
+        # Records are ordered by ID, and created_at grows with the ID
+        first_id = 1
+        if query.get('created_at__gte'):
+            since = parse_datetime(query['created_at__gte'])
+            first_id = max(1, int((since - BASE_TIME) / timedelta(minutes=1)))
+        count = max(total - first_id + 1, 0)
+
+        start = first_id + offset
+        results = [build(record_id) for record_id in range(start, min(start + limit, total + 1))]
+
+        next_url = None
+        if offset + limit < count:
+            next_query = {**query, 'limit': limit, 'offset': offset + limit}
+            next_url = f'http://{self.headers["Host"]}{parts.path}?{urlencode(next_query)}'
+
+        self.send_json(200, {'count': count, 'next': next_url, 'previous': None, 'results': results})
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        etag = f'"{hashlib.md5(payload).hexdigest()}"'
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            with self.server.api.random_lock:
+                self.server.api.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        if status == 200:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def created_at(record_id):
+    return (BASE_TIME + timedelta(minutes=record_id)).isoformat()
+
+
+def country(country_id):
+    return {
+        'id': country_id,
+        'iso': f'{chr(65 + country_id // 26 % 26)}{chr(65 + country_id % 26)}',
+        'iso3': f'X{chr(65 + country_id // 26 % 26)}{chr(65 + country_id % 26)}',
+        'name': f'Country {country_id}',
+        'society_name': f'Red Cross Society of Country {country_id}',
+        'region': country_id % 5,
+        'independent': True,
+        'is_deprecated': False,
+    }
+
+
+def tag(tag_id):
+    return {
+        'id': tag_id,
+        'molnix_id': 1000 + tag_id,
+        'name': f'TAG-{tag_id}',
+        'description': f'Tag {tag_id}',
+        'color': '#cccccc',
+        'tag_type': 'regular',
+        'groups': [],
+    }
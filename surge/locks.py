@@ -0,0 +1,177 @@
+"""
+Distributed singleton lock for the sync tasks.
+
+The lock lives in Redis (the Celery broker) under a lease, so a worker that
+dies while holding it cannot block the next runs for longer than
+settings.IFRC_SYNC_LOCK_LEASE. A heartbeat thread keeps renewing the lease
+while the holder is alive.
+"""
+import logging
+import threading
+import time
+import redis
+from redis.exceptions import LockError
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_redis = None
+
+
+def get_redis():
+    """
+    Return the process-wide Redis connection used for locks.
+    """
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    return _redis
+
+
+class SyncLock:
+    """
+    Lease-based lock that makes sure only one run of a sync task is active.
+
+    Usage:
+        lock = SyncLock('fetch_surge_alerts')
+        if not lock.acquire():
+            return  # another run holds the lock
+        try:
+            with lock.heartbeat():
+                ...
+        finally:
+            lock.release()
+
+    A lock can be handed over to another process by passing its token and
+    lease; the Celery fan-out mode uses this to renew the lock from the page
+    subtasks and release it from the last chord callback.
+    If Redis cannot be reached the lock is treated as acquired, so a missing
+    broker in development does not stop the tasks from running.
+    """
+
+    def __init__(self, name, lease=None, token=None, acquired_at=None):
+        self.name = name
+        self.key = f"surge:lock:{name}"
+        self.lease = lease or settings.IFRC_SYNC_LOCK_LEASE
+        self.lock = None
+        self.token = token
+        self.acquired_at = acquired_at
+        self.wait_seconds = 0.0
+        self.hold_seconds = None
+
+        try:
+            self.lock = get_redis().lock(self.key, timeout=self.lease, thread_local=False)
+            if token:
+                self.lock.local.token = token.encode()
+        except redis.RedisError as e:
+            logger.warning("Lock backend unavailable for %s, running without a lock: %s", self.key, e)
+
+    def acquire(self, wait=None):
+        """
+        Try to take the lock, waiting up to `wait` seconds
+        (settings.IFRC_SYNC_LOCK_WAIT by default).
+
+        Returns:
+            True if the lock was taken, False if another run holds it
+        """
+        wait = settings.IFRC_SYNC_LOCK_WAIT if wait is None else wait
+        started = time.monotonic()
+        acquired = True
+        if self.lock is not None:
+            try:
+                acquired = self.lock.acquire(blocking=wait > 0, blocking_timeout=wait or None)
+            except redis.RedisError as e:
+                logger.warning("Lock backend unavailable for %s, running without a lock: %s", self.key, e)
+                self.lock = None
+        self.wait_seconds = time.monotonic() - started
+
+        if not acquired:
+            logger.warning("Lock %s is held by another run, gave up after %.3fs", self.key, self.wait_seconds)
+            return False
+
+        self.acquired_at = time.time()
+        if self.lock is not None:
+            self.token = self.lock.local.token.decode()
+        logger.info("Acquired lock %s after waiting %.3fs", self.key, self.wait_seconds)
+        return True
+
+    def extend(self):
+        """
+        Renew the lease. Returns False if the lock has been lost.
+        """
+        if self.lock is None:
+            return True
+        try:
+            return self.lock.extend(self.lease, replace_ttl=True)
+        except (LockError, redis.RedisError) as e:
+            logger.error("Lost lock %s: %s", self.key, e)
+            return False
+
+    def release(self):
+        """
+        Release the lock and log how long it was held.
+        """
+        if self.acquired_at is not None:
+            self.hold_seconds = time.time() - self.acquired_at
+        if self.lock is not None:
+            try:
+                self.lock.release()
+            except (LockError, redis.RedisError) as e:
+                logger.warning("Could not release lock %s, it expired or was taken over: %s", self.key, e)
+        logger.info("Released lock %s after holding it for %.3fs", self.key, self.hold_seconds or 0)
+
+    def heartbeat(self):
+        """
+        Return a context manager that renews the lease in a background thread.
+        """
+        return _Heartbeat(self)
+
+    def handover(self, lease=None):
+        """
+        Return the JSON-serialisable state needed to rebuild the lock in
+        another process, first renewing it for `lease` seconds if given.
+        """
+        if lease is not None:
+            self.lease = lease
+            self.extend()
+        return [self.name, self.token, self.acquired_at, self.lease]
+
+    @classmethod
+    def from_handover(cls, state):
+        name, token, acquired_at, lease = state
+        return cls(name, lease=lease, token=token, acquired_at=acquired_at)
+
+    def timings(self):
+        """
+        Return the lock wait and hold times in seconds.
+        """
+        return {
+            'wait': round(self.wait_seconds, 3),
+            'hold': round(self.hold_seconds, 3) if self.hold_seconds is not None else None,
+        }
+
+
+class _Heartbeat:
+    """
+    Renews a lock's lease every third of the lease while the block runs.
+    """
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.run, name=f'lock-heartbeat-{self.lock.name}', daemon=True)
+        self.thread.start()
+        return self.lock
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        return False
+
+    def run(self):
+        while not self.stopped.wait(self.lock.lease / 3):
+            if not self.lock.extend():
+                return
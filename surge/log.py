@@ -0,0 +1,100 @@
+"""
+Low-overhead logging for the ingestion hot path.
+
+QueueListenerHandler hands log records to a background thread, which does
+the formatting and file I/O, so the ingest thread only pays for putting the
+record on a queue. DebugSampler lets per-record debug lines through for one
+record in every settings.SURGE_LOG_SAMPLE_EVERY.
+"""
+import atexit
+import copy
+import logging
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+from django.conf import settings
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Logging handler that forwards records to other handlers on a listener thread.
+
+    Configure it in LOGGING with the handlers to forward to, referenced with
+    cfg:// so they are built first:
+
+        'surge_queue': {
+            '()': 'surge.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.surge_file', 'cfg://handlers.file_error'],
+        },
+
+    Records are not formatted on the calling thread: the message arguments
+    are merged by the target handlers on the listener thread. The listener is
+    restarted in forked children (e.g. Celery prefork workers), since threads
+    do not survive a fork.
+    """
+
+    def __init__(self, handlers, respect_handler_level=True):
+        # Index the list so dictConfig resolves the cfg:// references
+        self.targets = [handlers[i] for i in range(len(handlers))]
+        self.respect_handler_level = respect_handler_level
+        self.enqueue_seconds = 0.0
+        super().__init__(queue.SimpleQueue())
+        self.listener = None
+        self.start()
+        atexit.register(self.stop)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.restart)
+
+    def start(self):
+        self.listener = QueueListener(self.queue, *self.targets, respect_handler_level=self.respect_handler_level)
+        self.listener.start()
+
+    def stop(self):
+        """
+        Flush the queue and stop the listener thread.
+        """
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def restart(self):
+        self.queue = queue.SimpleQueue()
+        self.start()
+
+    def prepare(self, record):
+        # The records stay in this process, so there is no need to format
+        # them to make them picklable; copy them so the listener thread
+        # sees the record as it was when it was logged
+        return copy.copy(record)
+
+    def enqueue(self, record):
+        started = time.perf_counter()
+        super().enqueue(record)
+        self.enqueue_seconds += time.perf_counter() - started
+
+
+class DebugSampler:
+    """
+    Decides whether a per-record debug line should be logged.
+
+    Usage:
+        sample = DebugSampler(logger)
+        if sample():
+            logger.debug("Processing record %s", record_id)
+
+    Returns False without counting when the logger is not enabled for DEBUG,
+    so the check costs next to nothing in production.
+    """
+
+    def __init__(self, logger, every=None):
+        self.logger = logger
+        self.every = every
+        self.count = 0
+
+    def __call__(self):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return False
+        every = self.every or settings.SURGE_LOG_SAMPLE_EVERY
+        self.count += 1
+        return every <= 1 or self.count % every == 1
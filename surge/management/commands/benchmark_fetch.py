@@ -0,0 +1,61 @@
+"""
+Management command to benchmark page fetching from the IFRC API.
+Downloads the pages of an endpoint in sequential and parallel mode without
+writing anything to the database, and reports how long each mode took.
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from surge.pagination import iter_pages
+
+RESOURCE_URLS = {
+    'surge_alerts': 'IFRC_API_URL',
+    'events': 'IFRC_EVENT_API_URL',
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark sequential against parallel page fetching from the IFRC API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resource', choices=sorted(RESOURCE_URLS), default='surge_alerts',
+                            help='Endpoint to fetch')
+        parser.add_argument('--page-size', type=int, default=settings.IFRC_PAGE_SIZE,
+                            help='Number of records per page')
+        parser.add_argument('--concurrency', type=int, default=settings.IFRC_FETCH_CONCURRENCY,
+                            help='Number of parallel downloads in parallel mode')
+        parser.add_argument('--max-pages', type=int, default=None,
+                            help='Stop after this many pages')
+        parser.add_argument('--mode', choices=['sequential', 'parallel'], action='append',
+                            help='Mode to benchmark, can be repeated (default: both)')
+
+    def handle(self, *args, **options):
+        url = getattr(settings, RESOURCE_URLS[options['resource']])
+        modes = options['mode'] or ['sequential', 'parallel']
+
+        self.stdout.write(
+            f"Benchmarking {url} with page size {options['page_size']} "
+            f"and concurrency {options['concurrency']}"
+        )
+
+        timings = {}
+        for mode in modes:
+            pages = 0
+            records = 0
+            started = time.perf_counter()
+            for page_number, page_url, data in iter_pages(url, mode=mode, page_size=options['page_size'],
+                                                          concurrency=options['concurrency']):
+                pages = page_number
+                records += len(data.get('results', []))
+                if options['max_pages'] and page_number >= options['max_pages']:
+                    break
+            elapsed = time.perf_counter() - started
+            timings[mode] = elapsed
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{mode}: {pages} pages, {records} records in {elapsed:.2f}s "
+                f"({pages / elapsed if elapsed else 0:.1f} pages/s, {records / elapsed if elapsed else 0:.0f} records/s)"
+            ))
+
+        if len(timings) == 2 and timings['parallel']:
+            self.stdout.write(f"Speed-up: {timings['sequential'] / timings['parallel']:.1f}x")
@@ -0,0 +1,174 @@
+"""
+Management command to benchmark the full surge alert ingestion.
+Starts a local stand-in for the IFRC API (surge/fake_api.py), runs
+fetch_surge_alerts against it and reports wall time, records per second,
+SQL queries per record and peak memory. Results can be written as JSON so
+runs can be compared.
+
+Later runs are answered with 304 Not Modified for the pages that did not
+change, unless --no-conditional is given to measure the processing of
+unchanged records instead.
+
+With --compare-logging the last run is repeated with logging disabled, and
+the difference is reported as the share of the sync time spent on logging.
+It implies --no-conditional, so the compared runs process every record
+instead of skipping the unchanged pages.
+
+The records are written to the configured database, so run it against a
+development or throwaway database only.
+"""
+import json
+import logging
+import time
+import tracemalloc
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from surge.cache import cache_stats
+from surge.fake_api import FakeIfrcApi
+from surge.log import QueueListenerHandler
+from surge.tasks import fetch_surge_alerts
+from surge.telemetry import QueryCounter
+
+
+class Command(BaseCommand):
+    help = 'Benchmark fetch_surge_alerts against a local stand-in for the IFRC API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alerts', type=int, default=1000,
+                            help='Number of surge alerts served, e.g. 1000, 10000 or 100000')
+        parser.add_argument('--events', type=int, default=None,
+                            help='Number of events served (default: one per ten alerts)')
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='Seconds of latency added to every API response')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Fraction of API requests answered with a 503')
+        parser.add_argument('--runs', type=int, default=2,
+                            help='Number of consecutive runs; the later ones measure re-syncing unchanged data')
+        parser.add_argument('--page-size', type=int, default=None, help='Records per page')
+        parser.add_argument('--fetch-mode', choices=['sequential', 'parallel'], default=None,
+                            help='Page fetching mode (default: IFRC_FETCH_MODE)')
+        parser.add_argument('--no-conditional', action='store_true',
+                            help='Download every page in full, without conditional requests')
+        parser.add_argument('--compare-logging', action='store_true',
+                            help='Repeat the last run with logging disabled to measure what logging costs '
+                                 '(implies --no-conditional)')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        fetch_settings = {}
+        if options['page_size']:
+            fetch_settings['IFRC_PAGE_SIZE'] = options['page_size']
+        if options['fetch_mode']:
+            fetch_settings['IFRC_FETCH_MODE'] = options['fetch_mode']
+        if options['no_conditional'] or options['compare_logging']:
+            fetch_settings['IFRC_CONDITIONAL_REQUESTS'] = False
+
+        results = {
+            'alerts': options['alerts'],
+            'latency': options['latency'],
+            'error_rate': options['error_rate'],
+            'settings': fetch_settings,
+            'runs': [],
+        }
+
+        with FakeIfrcApi(alerts=options['alerts'], events=options['events'], latency=options['latency'],
+                         error_rate=options['error_rate']) as api:
+            results['events'] = api.events
+            self.stdout.write(f"Serving {api.alerts} alerts and {api.events} events at {api.base_url}")
+
+            with override_settings(IFRC_API_URL=api.alert_url, IFRC_EVENT_API_URL=api.event_url, **fetch_settings):
+                for run in range(1, options['runs'] + 1):
+                    requests_before = api.requests
+                    run_result = self.measure_run()
+                    run_result['run'] = run
+                    run_result['api_requests'] = api.requests - requests_before
+                    results['runs'].append(run_result)
+
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Run {run}: {run_result['records']} records in {run_result['wall_seconds']:.2f}s "
+                        f"({run_result['records_per_second']:.0f} records/s), "
+                        f"{run_result['queries_per_record']:.2f} queries/record, "
+                        f"peak memory {run_result['peak_memory_mb']:.1f} MB. "
+                        f"Created: {run_result['created']}, Updated: {run_result['updated']}, "
+                        f"Unchanged: {run_result['unchanged']}, "
+                        f"Not modified: {run_result['pages_not_modified']} pages"
+                    ))
+
+                if options['compare_logging'] and results['runs']:
+                    results['logging'] = self.measure_logging(results['runs'][-1])
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Logging cost {results['logging']['seconds']:.2f}s "
+                        f"({results['logging']['share']:.1%} of the sync time)"
+                    ))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        else:
+            self.stdout.write(json.dumps(results, indent=2))
+
+    def measure_logging(self, logged_run):
+        """
+        Repeat a run with logging disabled and compare it with the logged run.
+
+        Args:
+            logged_run: The measurements of the last run, taken with logging on
+
+        Returns:
+            dict: The wall time of both runs and the time and share spent logging
+        """
+        logging.disable(logging.CRITICAL)
+        try:
+            silent_run = self.measure_run()
+        finally:
+            logging.disable(logging.NOTSET)
+
+        cost = max(logged_run['wall_seconds'] - silent_run['wall_seconds'], 0)
+        return {
+            'mode': settings.SURGE_LOG_MODE,
+            'logged_seconds': logged_run['wall_seconds'],
+            'silent_seconds': silent_run['wall_seconds'],
+            'seconds': round(cost, 3),
+            'share': round(cost / logged_run['wall_seconds'], 4) if logged_run['wall_seconds'] else 0,
+            'enqueue_seconds': logged_run.get('log_enqueue_seconds'),
+        }
+
+    def measure_run(self):
+        """
+        Run one full sync and return its measurements.
+        """
+        queue_handlers = [h for h in logging.getLogger('surge').handlers if isinstance(h, QueueListenerHandler)]
+        enqueue_before = sum(h.enqueue_seconds for h in queue_handlers)
+        counter = QueryCounter()
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(counter):
+                summary = fetch_surge_alerts(full=True, mode='local')
+            elapsed = time.perf_counter() - started
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        records = summary['created'] + summary['updated'] + summary['unchanged']
+        return {
+            'created': summary['created'],
+            'updated': summary['updated'],
+            'unchanged': summary['unchanged'],
+            'skipped': summary.get('skipped', False),
+            'pages_not_modified': summary.get('pages_not_modified', 0),
+            'bytes_avoided': summary.get('bytes_avoided', 0),
+            'records': records,
+            'wall_seconds': round(elapsed, 3),
+            'records_per_second': round(records / elapsed, 1) if elapsed else 0,
+            'queries': counter.count,
+            'query_seconds': round(counter.seconds, 3),
+            'queries_per_record': round(counter.count / records, 3) if records else 0,
+            'peak_memory_mb': round(peak / (1024 * 1024), 2),
+            'timings': summary.get('timings'),
+            'log_enqueue_seconds': round(sum(h.enqueue_seconds for h in queue_handlers) - enqueue_before, 3),
+            'reference_cache': cache_stats(),
+        }
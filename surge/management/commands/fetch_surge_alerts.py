@@ -9,12 +9,56 @@ from surge.tasks import fetch_surge_alerts
 class Command(BaseCommand):
     help = 'Fetch surge alerts from the IFRC API and store them in the database'
 
+    def add_arguments(self, parser):
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument('--full', action='store_true', help='Force a full sync of the whole history')
+        mode.add_argument('--delta', action='store_true', help='Force a delta sync from the stored cursor')
+        parser.add_argument('--execution', choices=['local', 'fanout'],
+                            help='Process the pages here (local) or dispatch them to Celery workers (fanout). '
+                                 'Defaults to IFRC_EXECUTION_MODE')
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Starting to fetch surge alerts...'))
-        
+
+        full = None
+        if options['full']:
+            full = True
+        elif options['delta']:
+            full = False
+
         # Call the task directly (not as a Celery task)
-        result = fetch_surge_alerts()
-        
+        result = fetch_surge_alerts(full=full, mode=options['execution'])
+
+        if result.get('skipped'):
+            self.stdout.write(self.style.WARNING(
+                f'Another surge alert fetch is already running, nothing was done '
+                f'(waited {result["lock"]["wait"]}s for the lock).'
+            ))
+            return
+
+        if 'dispatched' in result:
+            self.stdout.write(self.style.SUCCESS(
+                f'Dispatched {result["dispatched"]} page subtasks to the Celery workers '
+                f'({"full" if result["full"] else "delta"} sync). Counts are logged when the run completes.'
+            ))
+            return
+
         self.stdout.write(self.style.SUCCESS(
-            f'Successfully fetched surge alerts. Created: {result["created"]}, Updated: {result["updated"]}'
-        ))
\ No newline at end of file
+            f'Successfully fetched surge alerts ({"full" if result["full"] else "delta"} sync). '
+            f'Created: {result["created"]}, Updated: {result["updated"]}, Unchanged: {result["unchanged"]}, '
+            f'Deleted upstream: {result.get("deleted", 0)}'
+        ))
+        if result.get('pages_not_modified'):
+            self.stdout.write(
+                f'Not modified: {result["pages_not_modified"]} pages skipped, '
+                f'{result["bytes_avoided"]} bytes not downloaded'
+            )
+        self.stdout.write(f'Lock: waited {result["lock"]["wait"]}s, held {result["lock"]["hold"]}s')
+
+        timings = result['timings']
+        self.stdout.write(
+            f'Pipeline: {timings["pages"]} pages in {timings["wall"]}s, '
+            f'fetch {timings["fetch"]}s (blocked {timings["fetch_blocked"]}s), '
+            f'write {timings["process"]}s (waiting {timings["process_waiting"]}s), '
+            f'{timings["bound_by"]}-bound'
+        )
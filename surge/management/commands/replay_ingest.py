@@ -0,0 +1,176 @@
+"""
+Management command to rebuild the surge tables from the page archive.
+Feeds archived API pages (see surge/archive.py) back through the same
+processing code as fetch_surge_alerts, without any network access, and
+spreads the pages over several worker processes.
+
+Events are replayed before the surge alerts that reference them. By
+default the latest archived full sync of each resource is replayed.
+"""
+import multiprocessing
+import os
+import time
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count, Max, Sum
+from surge.archive import load_page
+from surge.models import ArchivedPage
+from surge.tasks import EventResolver, process_event_results, process_results
+from surge.telemetry import IngestRecorder
+
+RESOURCES = ['events', 'surge_alerts']
+
+
+class Command(BaseCommand):
+    help = 'Re-run the processing of archived IFRC API pages, without downloading anything'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', action='append', default=[],
+                            help='Archive batch to replay, e.g. surge_alerts/20240101-120000-000000-42. '
+                                 'Can be repeated. Defaults to the latest full sync of each resource')
+        parser.add_argument('--resource', choices=RESOURCES, help='Only replay this resource')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes (default: one per CPU)')
+        parser.add_argument('--list', action='store_true', help='List the archived batches and exit')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            return self.list_batches()
+
+        resources = [options['resource']] if options['resource'] else RESOURCES
+        batches = self.select_batches(resources, options['batch'])
+
+        if options['processes'] > 1 and connection.vendor == 'sqlite':
+            # SQLite only allows one writer at a time
+            self.stdout.write(self.style.WARNING("SQLite database, replaying in a single process"))
+            options['processes'] = 1
+
+        totals = {'created': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'pages': 0}
+        started = time.perf_counter()
+        with IngestRecorder('replay_ingest') as recorder:
+            for resource in resources:
+                if resource not in batches:
+                    continue
+                paths = list(
+                    ArchivedPage.objects.filter(resource=resource, batch__in=batches[resource])
+                    .order_by('batch', 'page').values_list('path', flat=True)
+                )
+                self.stdout.write(f"Replaying {len(paths)} pages of {resource} from {', '.join(batches[resource])}")
+                counts = replay_pages(resource, paths, options['processes'])
+                for key in totals:
+                    totals[key] += counts[key]
+                self.stdout.write(self.style.SUCCESS(
+                    f"{resource}: Created: {counts['created']}, Updated: {counts['updated']}, "
+                    f"Unchanged: {counts['unchanged']}, Failed: {counts['failed']}"
+                ))
+                for error in counts['errors']:
+                    self.stdout.write(self.style.ERROR(error))
+            recorder.finish({**totals, 'full': True, 'succeeded': totals['failed'] == 0})
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {totals['pages']} pages in {elapsed:.2f}s with {options['processes']} processes"
+        ))
+
+    def select_batches(self, resources, requested):
+        """
+        Return a dict mapping each resource to the batches to replay.
+        """
+        batches = {}
+        if requested:
+            found = ArchivedPage.objects.filter(batch__in=requested).values_list('resource', 'batch').distinct()
+            for resource, batch in found:
+                if resource in resources:
+                    batches.setdefault(resource, []).append(batch)
+            missing = set(requested) - {batch for resource_batches in batches.values() for batch in resource_batches}
+            if missing:
+                raise CommandError(f"No archived pages for batch {', '.join(sorted(missing))}")
+            return batches
+
+        for resource in resources:
+            latest = ArchivedPage.objects.filter(resource=resource, full=True).order_by('-fetched_at').first()
+            if latest:
+                batches[resource] = [latest.batch]
+        if not batches:
+            raise CommandError("No archived full sync found. Run fetch_surge_alerts --full with IFRC_ARCHIVE_PAGES on first")
+        return batches
+
+    def list_batches(self):
+        batches = (
+            ArchivedPage.objects.values('resource', 'batch', 'full')
+            .annotate(pages=Count('id'), records=Sum('records'), compressed=Sum('compressed_size'), fetched=Max('fetched_at'))
+            .order_by('-fetched')
+        )
+        for batch in batches:
+            self.stdout.write(
+                f"{batch['batch']}  {'full' if batch['full'] else 'delta'}  {batch['pages']} pages, "
+                f"{batch['records']} records, {batch['compressed']} bytes, fetched {batch['fetched']:%Y-%m-%d %H:%M}"
+            )
+
+
+def replay_pages(resource, paths, processes):
+    """
+    Replay archived pages of a resource, in worker processes when
+    processes > 1.
+
+    Returns:
+        Dict with the summed created/updated/unchanged/failed counts, the
+        number of pages replayed and the errors raised by failed pages
+    """
+    counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'pages': 0, 'errors': []}
+    tasks = [(resource, path) for path in paths]
+    if not tasks:
+        return counts
+
+    if processes <= 1:
+        outcomes = map(replay_page, tasks)
+        pool = None
+    else:
+        # Children must open their own database connections
+        connections.close_all()
+        pool = multiprocessing.Pool(min(processes, len(tasks)), initializer=django.setup)
+        outcomes = pool.imap_unordered(replay_page, tasks, chunksize=max(len(tasks) // (processes * 4), 1))
+
+    try:
+        for outcome in outcomes:
+            for key in ('created', 'updated', 'unchanged', 'failed'):
+                counts[key] += outcome[key]
+            counts['pages'] += 1
+            if outcome['error']:
+                counts['errors'].append(outcome['error'])
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return counts
+
+
+def replay_page(task):
+    """
+    Process one archived page. Runs in a worker process.
+
+    Args:
+        task: (resource, path) tuple
+
+    Returns:
+        Dict with the page's created/updated/unchanged/failed counts and the
+        error message if the page could not be processed
+    """
+    resource, path = task
+    outcome = {'created': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'error': None}
+    try:
+        results = load_page(path).get('results', [])
+        if resource == 'surge_alerts':
+            process_results(results, EventResolver(fetch=False))
+        else:
+            process_event_results(results)
+    except Exception as e:
+        outcome['error'] = f"{path}: {type(e).__name__}: {e}"
+        return outcome
+
+    outcome['created'] = len([r for r in results if r.get('_created', False)])
+    outcome['updated'] = len([r for r in results if r.get('_updated', False)])
+    outcome['unchanged'] = len([r for r in results if r.get('_unchanged', False)])
+    outcome['failed'] = len(results) - outcome['created'] - outcome['updated'] - outcome['unchanged']
+    return outcome
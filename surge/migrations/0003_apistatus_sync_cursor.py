@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surge', '0002_apistatus'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apistatus',
+            name='cursor_timestamp',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='apistatus',
+            name='last_full_sync',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
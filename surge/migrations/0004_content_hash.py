@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surge', '0003_apistatus_sync_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DisasterType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('api_id', models.IntegerField(unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('summary', models.TextField(blank=True, null=True)),
+                ('translation_module_original_language', models.CharField(blank=True, max_length=10, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='molnixtag',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='surgealert',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('api_id', models.IntegerField(unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('summary', models.TextField(blank=True, null=True)),
+                ('ifrc_severity_level', models.IntegerField(blank=True, null=True)),
+                ('ifrc_severity_level_display', models.CharField(blank=True, max_length=100, null=True)),
+                ('glide', models.CharField(blank=True, max_length=100, null=True)),
+                ('disaster_start_date', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('active_deployments', models.IntegerField(default=0)),
+                ('translation_module_original_language', models.CharField(blank=True, max_length=10, null=True)),
+                ('content_hash', models.CharField(blank=True, editable=False, max_length=64, null=True)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('countries', models.ManyToManyField(blank=True, to='surge.country')),
+                ('dtype', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='surge.disastertype')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='surgealert',
+            name='event',
+            field=models.ForeignKey(blank=True, db_column='event', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='surge_alerts', to='surge.event'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:42
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surge', '0004_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(db_index=True, max_length=100)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed'), ('skipped', 'Skipped'), ('dispatched', 'Dispatched')], default='running', max_length=20)),
+                ('full', models.BooleanField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.FloatField(blank=True, help_text='Seconds', null=True)),
+                ('pages', models.IntegerField(default=0)),
+                ('requests', models.IntegerField(default=0)),
+                ('bytes_downloaded', models.BigIntegerField(default=0)),
+                ('latency_p50', models.FloatField(blank=True, help_text='Seconds', null=True)),
+                ('latency_p95', models.FloatField(blank=True, help_text='Seconds', null=True)),
+                ('latency_p99', models.FloatField(blank=True, help_text='Seconds', null=True)),
+                ('created', models.IntegerField(default=0)),
+                ('updated', models.IntegerField(default=0)),
+                ('unchanged', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('query_count', models.IntegerField(default=0)),
+                ('query_time', models.FloatField(default=0, help_text='Seconds')),
+                ('peak_rss', models.BigIntegerField(blank=True, help_text='Bytes', null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
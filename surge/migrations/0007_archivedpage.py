@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surge', '0006_soft_delete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(db_index=True, max_length=50)),
+                ('batch', models.CharField(db_index=True, help_text='Archive directory of the sync the page belongs to', max_length=100)),
+                ('page', models.IntegerField()),
+                ('url', models.URLField(max_length=1000)),
+                ('path', models.CharField(help_text='Path relative to IFRC_ARCHIVE_DIR', max_length=255)),
+                ('full', models.BooleanField(default=False)),
+                ('records', models.IntegerField(default=0)),
+                ('size', models.IntegerField(default=0, help_text='Bytes before compression')),
+                ('compressed_size', models.IntegerField(default=0, help_text='Bytes')),
+                ('fetched_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('run', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_pages', to='surge.ingestrun')),
+            ],
+            options={
+                'ordering': ['resource', '-fetched_at', 'page'],
+                'unique_together': {('batch', 'page')},
+            },
+        ),
+    ]
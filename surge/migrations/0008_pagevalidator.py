@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:42
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surge', '0007_archivedpage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageValidator',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(db_index=True, max_length=50)),
+                ('url', models.URLField(max_length=1000, unique=True)),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('last_modified', models.CharField(blank=True, max_length=100)),
+                ('count', models.IntegerField(blank=True, null=True)),
+                ('next_url', models.URLField(blank=True, max_length=1000, null=True)),
+                ('record_ids', models.JSONField(default=list)),
+                ('size', models.IntegerField(default=0, help_text='Bytes of the last full response')),
+                ('checked_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingestrun',
+            name='bytes_avoided',
+            field=models.BigIntegerField(default=0, help_text='Bytes'),
+        ),
+        migrations.AddField(
+            model_name='ingestrun',
+            name='pages_not_modified',
+            field=models.IntegerField(default=0),
+        ),
+    ]
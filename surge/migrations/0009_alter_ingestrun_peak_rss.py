@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surge', '0008_pagevalidator'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingestrun',
+            name='peak_rss',
+            field=models.BigIntegerField(blank=True, help_text='Bytes the RSS grew by during the run', null=True),
+        ),
+    ]
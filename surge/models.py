@@ -11,6 +11,9 @@ class ApiStatus(models.Model):
     """
     name = models.CharField(max_length=100, unique=True)
     last_run = models.DateTimeField(default=timezone.now)
+    # High-water mark of the last successful run, used by delta syncs
+    cursor_timestamp = models.DateTimeField(blank=True, null=True)
+    last_full_sync = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         verbose_name_plural = "API Statuses"
@@ -36,6 +39,7 @@ class Country(models.Model):
     society_name = models.CharField(max_length=255, blank=True, null=True)
     name = models.CharField(max_length=255)
     translation_module_original_language = models.CharField(max_length=10, blank=True, null=True)
+    content_hash = models.CharField(max_length=64, blank=True, null=True, editable=False)
 
     class Meta:
         verbose_name_plural = "Countries"
@@ -55,6 +59,7 @@ class MolnixTag(models.Model):
     color = models.CharField(max_length=50, blank=True, null=True)
     tag_type = models.CharField(max_length=50, blank=True, null=True)
     groups = models.JSONField(default=list)
+    content_hash = models.CharField(max_length=64, blank=True, null=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -85,6 +90,9 @@ class SurgeAlert(models.Model):
     message = models.TextField(blank=True, null=True)
     operation = models.TextField(blank=True, null=True)
     translation_module_original_language = models.CharField(max_length=10, blank=True, null=True)
+    content_hash = models.CharField(max_length=64, blank=True, null=True, editable=False)
+    # Set when a complete full sync no longer returned the record (soft delete)
+    deleted_at = models.DateTimeField(blank=True, null=True, db_index=True)
     last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -120,7 +128,99 @@ class Event(models.Model):
     created_at = models.DateTimeField()
     active_deployments = models.IntegerField(default=0)
     translation_module_original_language = models.CharField(max_length=10, blank=True, null=True)
+    content_hash = models.CharField(max_length=64, blank=True, null=True, editable=False)
+    # Set when a complete full sync no longer returned the record (soft delete)
+    deleted_at = models.DateTimeField(blank=True, null=True, db_index=True)
     last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Event {self.api_id}: {self.name}"
+
+
+class IngestRun(models.Model):
+    """
+    Model to store the telemetry of one run of an ingestion task.
+    """
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+        ('dispatched', 'Dispatched'),
+    ]
+
+    task = models.CharField(max_length=100, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    full = models.BooleanField(blank=True, null=True)
+    started_at = models.DateTimeField(default=timezone.now, db_index=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    duration = models.FloatField(blank=True, null=True, help_text="Seconds")
+    pages = models.IntegerField(default=0)
+    requests = models.IntegerField(default=0)
+    bytes_downloaded = models.BigIntegerField(default=0)
+    latency_p50 = models.FloatField(blank=True, null=True, help_text="Seconds")
+    latency_p95 = models.FloatField(blank=True, null=True, help_text="Seconds")
+    latency_p99 = models.FloatField(blank=True, null=True, help_text="Seconds")
+    created = models.IntegerField(default=0)
+    updated = models.IntegerField(default=0)
+    unchanged = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    query_count = models.IntegerField(default=0)
+    query_time = models.FloatField(default=0, help_text="Seconds")
+    peak_rss = models.BigIntegerField(blank=True, null=True, help_text="Bytes the RSS grew by during the run")
+    pages_not_modified = models.IntegerField(default=0)
+    bytes_avoided = models.BigIntegerField(default=0, help_text="Bytes")
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.task} - {self.started_at} ({self.status})"
+
+
+class ArchivedPage(models.Model):
+    """
+    Model to index the raw API pages kept in the page archive (surge/archive.py).
+    """
+    resource = models.CharField(max_length=50, db_index=True)
+    batch = models.CharField(max_length=100, db_index=True, help_text="Archive directory of the sync the page belongs to")
+    run = models.ForeignKey(IngestRun, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_pages')
+    page = models.IntegerField()
+    url = models.URLField(max_length=1000)
+    path = models.CharField(max_length=255, help_text="Path relative to IFRC_ARCHIVE_DIR")
+    full = models.BooleanField(default=False)
+    records = models.IntegerField(default=0)
+    size = models.IntegerField(default=0, help_text="Bytes before compression")
+    compressed_size = models.IntegerField(default=0, help_text="Bytes")
+    fetched_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['resource', '-fetched_at', 'page']
+        unique_together = ('batch', 'page')
+
+    def __str__(self):
+        return f"{self.batch} page {self.page}"
+
+
+class PageValidator(models.Model):
+    """
+    Model to store the HTTP validators of an API page, for conditional
+    requests (surge/conditional.py).
+
+    Besides the ETag and Last-Modified headers, the parts of the page needed
+    when the API answers 304 Not Modified are kept: the record count, the
+    next link and the IDs of the page's records.
+    """
+    resource = models.CharField(max_length=50, db_index=True)
+    url = models.URLField(max_length=1000, unique=True)
+    etag = models.CharField(max_length=255, blank=True)
+    last_modified = models.CharField(max_length=100, blank=True)
+    count = models.IntegerField(blank=True, null=True)
+    next_url = models.URLField(max_length=1000, blank=True, null=True)
+    record_ids = models.JSONField(default=list)
+    size = models.IntegerField(default=0, help_text="Bytes of the last full response")
+    checked_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.url
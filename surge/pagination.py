@@ -0,0 +1,132 @@
+"""
+Page fetching for the paginated IFRC API endpoints.
+"""
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlparse, parse_qsl, urlunparse
+from django.conf import settings
+from .client import get_client
+
+logger = logging.getLogger(__name__)
+
+
+def iter_pages(url, mode=None, page_size=None, concurrency=None, validators=None):
+    """
+    Yield the pages of a paginated IFRC API endpoint in order.
+
+    Args:
+        url: The endpoint URL
+        mode: 'sequential' to follow the 'next' links one page at a time, or
+            'parallel' to download all pages with a bounded worker pool.
+            Defaults to settings.IFRC_FETCH_MODE
+        page_size: Number of records per page, defaults to settings.IFRC_PAGE_SIZE
+        concurrency: Number of parallel downloads, defaults to settings.IFRC_FETCH_CONCURRENCY
+        validators: PageValidators of the resource, to send conditional
+            requests. Pages the API answers with 304 are yielded as the
+            stand-in returned by PageValidators.not_modified()
+
+    Yields:
+        (page_number, page_url, data) tuples, page numbers starting at 1
+    """
+    mode = mode or settings.IFRC_FETCH_MODE
+    page_size = page_size or settings.IFRC_PAGE_SIZE
+    concurrency = concurrency or settings.IFRC_FETCH_CONCURRENCY
+
+    if mode == 'parallel':
+        return fetch_pages_parallel(url, page_size, concurrency, validators)
+    if mode != 'sequential':
+        logger.warning("Unknown fetch mode '%s', falling back to sequential", mode)
+    return fetch_pages_sequential(url, page_size, validators)
+
+
+def fetch_pages_sequential(url, page_size, validators=None):
+    """
+    Walk the 'next' links of an endpoint, one page at a time.
+    """
+    next_page = set_query_params(url, limit=page_size)
+    page_number = 0
+
+    while next_page:
+        page_number += 1
+        data = get_page(next_page, validators)
+        yield page_number, next_page, data
+        next_page = data.get('next')
+
+
+def fetch_pages_parallel(url, page_size, concurrency, validators=None):
+    """
+    Read the record count from the first page, work out the URLs of all
+    remaining pages and download them concurrently.
+
+    At most `concurrency` downloads are in flight at any time. Pages are
+    yielded in page order regardless of the order in which they complete.
+    """
+    first_url = set_query_params(url, limit=page_size, offset=0)
+    data = get_page(first_url, validators)
+    yield 1, first_url, data
+
+    urls = iter(page_urls(url, data.get('count') or 0, page_size)[1:])
+    if not data.get('next'):
+        return
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ifrc-page')
+    pending = deque()
+    try:
+        for page_url in urls:
+            pending.append((page_url, executor.submit(get_page, page_url, validators)))
+            if len(pending) >= concurrency:
+                break
+
+        page_number = 1
+        while pending:
+            page_url, future = pending.popleft()
+            page_data = future.result()
+
+            next_url = next(urls, None)
+            if next_url:
+                pending.append((next_url, executor.submit(get_page, next_url, validators)))
+
+            page_number += 1
+            yield page_number, page_url, page_data
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def page_urls(url, count, page_size):
+    """
+    Return the offset/limit URLs of every page needed to cover `count` records.
+    """
+    return [
+        set_query_params(url, limit=page_size, offset=offset)
+        for offset in range(0, max(count, 1), page_size)
+    ]
+
+
+def get_page(url, validators=None):
+    """
+    Download a single page and return the decoded JSON body.
+
+    With validators, the request is sent with the page's stored validators
+    and a 304 answer returns the stand-in page data instead.
+    """
+    logger.debug("Sending GET request to: %s", url)
+    response = get_client().get(url, headers=validators.headers(url) if validators else None)
+    logger.debug("Received response with status code: %s", response.status_code)
+    if response.status_code == 304 and validators:
+        return validators.not_modified(url)
+    response.raise_for_status()
+    data = response.json()
+    if validators:
+        validators.received(url, response, data)
+    return data
+
+
+def set_query_params(url, **params):
+    """
+    Return the URL with the given query parameters added or replaced.
+    """
+    parts = urlparse(url)
+    query = dict(parse_qsl(parts.query))
+    query.update({key: str(value) for key, value in params.items()})
+    return urlunparse(parts._replace(query=urlencode(query)))
@@ -0,0 +1,144 @@
+"""
+Producer/consumer pipeline between page downloads and database writes.
+
+A producer thread downloads and decodes the pages of an endpoint while the
+calling thread writes the previous ones, with a bounded queue in between so
+the producer cannot run more than a few pages ahead of the database.
+"""
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Marker put on the queue by the producer after the last page
+_DONE = object()
+
+
+class _Failure:
+    """
+    Carries an exception raised by the producer over to the consumer.
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+
+class PagePipeline:
+    """
+    Iterates over a page iterator, fetching pages in a background thread.
+
+    Usage:
+        pipeline = PagePipeline(iter_pages(url))
+        for page_number, page_url, data in pipeline:
+            ...  # write the page
+        logger.info(pipeline.timings())
+
+    Only the producer thread touches the page iterator and only the calling
+    thread runs the loop body, so database work stays on the calling thread.
+    Errors raised while fetching are re-raised in the calling thread.
+    """
+
+    def __init__(self, pages, depth=None):
+        self.pages = pages
+        self.depth = depth or settings.IFRC_PIPELINE_DEPTH
+        self.queue = queue.Queue(maxsize=self.depth)
+        self.stopped = threading.Event()
+
+        self.page_count = 0
+        self.fetch_seconds = 0.0
+        self.fetch_blocked_seconds = 0.0
+        self.process_seconds = 0.0
+        self.process_waiting_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    def __iter__(self):
+        started = time.monotonic()
+        producer = threading.Thread(target=self.produce, name='ifrc-pipeline', daemon=True)
+        producer.start()
+        try:
+            while True:
+                waiting = time.monotonic()
+                item = self.queue.get()
+                self.process_waiting_seconds += time.monotonic() - waiting
+
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+
+                processing = time.monotonic()
+                yield item
+                self.process_seconds += time.monotonic() - processing
+                self.page_count += 1
+        finally:
+            self.stopped.set()
+            self.drain()
+            producer.join()
+            self.wall_seconds = time.monotonic() - started
+
+    def produce(self):
+        """
+        Pull pages from the page iterator and queue them, blocking while the
+        queue is full.
+        """
+        pages = iter(self.pages)
+        try:
+            while not self.stopped.is_set():
+                fetching = time.monotonic()
+                try:
+                    item = next(pages)
+                except StopIteration:
+                    self.put(_DONE)
+                    return
+                self.fetch_seconds += time.monotonic() - fetching
+                self.put(item)
+        except Exception as e:
+            self.put(_Failure(e))
+        finally:
+            close = getattr(pages, 'close', None)
+            if close:
+                close()
+
+    def put(self, item):
+        """
+        Queue an item, giving up once the consumer has stopped.
+        """
+        blocked = time.monotonic()
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.fetch_blocked_seconds += time.monotonic() - blocked
+
+    def drain(self):
+        """
+        Empty the queue so a producer blocked on a full queue can exit.
+        """
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def timings(self):
+        """
+        Return the time spent in each stage of the pipeline, in seconds.
+
+        The run was network-bound when the writer spent its time waiting for
+        pages, and database-bound when the downloader spent its time waiting
+        for room in the queue.
+        """
+        return {
+            'pages': self.page_count,
+            'wall': round(self.wall_seconds, 3),
+            'fetch': round(self.fetch_seconds, 3),
+            'fetch_blocked': round(self.fetch_blocked_seconds, 3),
+            'process': round(self.process_seconds, 3),
+            'process_waiting': round(self.process_waiting_seconds, 3),
+            'bound_by': 'network' if self.process_waiting_seconds >= self.fetch_blocked_seconds else 'database',
+        }
@@ -0,0 +1,18 @@
+"""
+Signals sent by the surge app.
+
+alerts_ingested is sent by the sync tasks once surge alerts were written,
+with the API IDs of the alerts created and updated, and initial=True when
+the run is the first sync of the alerts, which creates the whole history:
+
+    @receiver(alerts_ingested)
+    def on_alerts_ingested(sender, created, updated, initial, **kwargs):
+        ...
+
+It is sent once per run of fetch_surge_alerts in local mode, and once per
+page subtask in fan-out mode, after the pages were committed. Receivers run
+in the worker that wrote the alerts, so they should do set-based work.
+"""
+from django.dispatch import Signal
+
+alerts_ingested = Signal()
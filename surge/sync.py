@@ -0,0 +1,207 @@
+"""
+Incremental (delta) sync support for the IFRC API fetch tasks.
+
+Each resource keeps a high-water mark on its ApiStatus row: the newest
+cursor timestamp seen by the last successful run. Delta runs only request
+records newer than that mark minus an overlap window, and a full
+reconciliation sync is run whenever the last one is older than
+settings.IFRC_FULL_SYNC_INTERVAL.
+
+The IFRC API has no modification timestamp to filter on, so the cursor is
+the creation time: delta runs pick up new records only, and edits to
+existing ones (an alert closing or being stood down, a changed closing
+date or message) arrive with the next full sync. IFRC_FULL_SYNC_INTERVAL
+therefore bounds how stale existing records can get.
+
+A complete full sync also soft-deletes the rows that were not returned by
+the API any more (see reconcile_deletions).
+"""
+import json
+import logging
+from array import array
+from datetime import timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import ApiStatus
+from .pagination import set_query_params
+
+logger = logging.getLogger(__name__)
+
+
+def plan_sync(name, url, full=None):
+    """
+    Decide between a full and a delta sync for a resource.
+
+    Args:
+        name: The ApiStatus name of the resource, e.g. 'surge_alerts'
+        url: The endpoint URL
+        full: Force a full (True) or delta (False) sync. When None, a delta
+            sync is run unless a full one is due
+
+    Returns:
+        (url, full) tuple, the URL carrying the cursor filter for delta syncs
+    """
+    status = ApiStatus.objects.filter(name=name).first()
+    cursor_timestamp = status.cursor_timestamp if status else None
+
+    if full is None:
+        full = (
+            not settings.IFRC_DELTA_SYNC
+            or cursor_timestamp is None
+            or status.last_full_sync is None
+            or timezone.now() - status.last_full_sync >= settings.IFRC_FULL_SYNC_INTERVAL
+        )
+    elif not full and cursor_timestamp is None:
+        logger.info("No cursor stored for %s, running a full sync instead", name)
+        full = True
+
+    if full:
+        logger.info("Running full sync for %s", name)
+        return url, True
+
+    since = cursor_timestamp - settings.IFRC_DELTA_OVERLAP
+    cursor_filter = settings.IFRC_SYNC_CURSORS[name]['filter']
+    logger.info("Running delta sync for %s from %s (cursor: %s)", name, since.isoformat(), cursor_timestamp.isoformat())
+    return set_query_params(url, **{cursor_filter: since.isoformat()}), False
+
+
+class CursorTracker:
+    """
+    Tracks the newest cursor timestamp seen across the pages of a run.
+    """
+
+    def __init__(self, name):
+        self.field = settings.IFRC_SYNC_CURSORS[name]['field']
+        self.timestamp = None
+
+    def observe(self, results):
+        for item in results:
+            try:
+                timestamp = parse_datetime(item.get(self.field) or '')
+            except (TypeError, ValueError):
+                timestamp = None
+            if timestamp is None:
+                continue
+            self.advance(timestamp)
+
+    def advance(self, timestamp):
+        """
+        Move the tracked timestamp forward if timestamp is newer.
+        """
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+        if self.timestamp is None or timestamp > self.timestamp:
+            self.timestamp = timestamp
+
+
+def finish_sync(name, tracker, full, succeeded):
+    """
+    Record the run on the resource's ApiStatus row.
+
+    The cursor is only moved forward, and only after a run that went through
+    every page, so a failed run is retried from the same point next time.
+    """
+    now = timezone.now()
+    api_status, created = ApiStatus.objects.get_or_create(name=name, defaults={'last_run': now})
+    api_status.last_run = now
+
+    if succeeded:
+        if tracker.timestamp and (api_status.cursor_timestamp is None or tracker.timestamp > api_status.cursor_timestamp):
+            api_status.cursor_timestamp = tracker.timestamp
+        if full:
+            api_status.last_full_sync = now
+    else:
+        logger.warning("Sync for %s did not complete, keeping the previous cursor", name)
+
+    api_status.save()
+    return api_status
+
+
+class SeenIds:
+    """
+    Collects the API IDs returned by the pages of a full sync.
+
+    IDs are kept in a flat array of machine integers (8 bytes each) rather
+    than a set of Python ints, so even a sync of every record ever published
+    holds well under a megabyte.
+    """
+
+    def __init__(self, ids=()):
+        self.ids = array('q', ids)
+        self.expected = None
+
+    def observe(self, results, count=None):
+        """
+        Add the IDs of a page of results.
+
+        Args:
+            results: The page's records
+            count: The total record count reported by the API, if known
+        """
+        self.ids.extend(item['id'] for item in results if item and isinstance(item.get('id'), int))
+        if count is not None and self.expected is None:
+            self.expected = count
+
+    def extend(self, ids):
+        self.ids.extend(ids)
+
+    def unique(self):
+        """
+        Return the distinct IDs as a sorted array.
+        """
+        return array('q', sorted(set(self.ids)))
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def id_set_sql(ids):
+    """
+    Return a RawSQL subquery selecting the given IDs, passed to the database
+    as a single parameter so the query size does not depend on the number
+    of IDs.
+    """
+    if connection.vendor == 'postgresql':
+        return RawSQL('SELECT unnest(%s::bigint[])', [list(ids)])
+    if connection.vendor == 'sqlite':
+        return RawSQL('SELECT value FROM json_each(%s)', [json.dumps(list(ids))])
+    return list(ids)
+
+
+def reconcile_deletions(name, model, seen):
+    """
+    Soft-delete the rows of a model that a full sync did not see, and
+    restore soft-deleted rows that it saw again.
+
+    Only call it after a full sync that went through every page. As a
+    second guard, nothing is marked deleted unless the sync saw at least as
+    many distinct IDs as the API reported records, so a run that was cut
+    short or lost records to pagination shifts leaves the table alone.
+
+    Args:
+        name: The resource name, for logging
+        model: The model class, which must have api_id and deleted_at fields
+        seen: The SeenIds collected during the sync
+
+    Returns:
+        (deleted, restored) counts, or None if the reconciliation was skipped
+    """
+    ids = seen.unique()
+    if not ids:
+        logger.warning("Full sync of %s saw no records, skipping deletion reconciliation", name)
+        return None
+    if seen.expected is None or len(ids) < seen.expected:
+        logger.warning("Full sync of %s saw %s of %s records, skipping deletion reconciliation", name, len(ids), seen.expected)
+        return None
+
+    id_set = id_set_sql(ids)
+    with transaction.atomic():
+        restored = model.objects.filter(deleted_at__isnull=False, api_id__in=id_set).update(deleted_at=None)
+        deleted = model.objects.filter(Q(deleted_at__isnull=True) & ~Q(api_id__in=id_set)).update(deleted_at=timezone.now())
+
+    logger.info("Reconciled deletions of %s against %s records: %s marked deleted, %s restored", name, len(ids), deleted, restored)
+    return deleted, restored
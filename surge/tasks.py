@@ -1,122 +1,808 @@
 """
 Celery tasks for the surge app.
 """
+import hashlib
+import json
 import logging
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
-from celery import shared_task
-from .models import Country, MolnixTag, SurgeAlert, ApiStatus, DisasterType, Event
+from celery import shared_task, chain, chord
+from .models import ApiStatus, Country, MolnixTag, SurgeAlert, DisasterType, Event
+from .client import get_client
+from .pagination import iter_pages, get_page, page_urls, set_query_params
+from .pipeline import PagePipeline
+from .locks import SyncLock
+from .telemetry import IngestRecorder
+from .log import DebugSampler
+from .relations import reconcile_m2m
+from .cache import country_cache, disaster_type_cache, molnix_tag_cache, event_cache, invalidate, cache_stats, shared_cache
+from .archive import PageArchive, new_batch
+from .conditional import PageValidators
+from .signals import alerts_ingested
+from .sync import plan_sync, CursorTracker, finish_sync, SeenIds, reconcile_deletions
 
 logger = logging.getLogger(__name__)
+# Per-record debug lines are only logged for a sample of the records
+sample_debug = DebugSampler(logger)
+
+# Fields overwritten when a bulk upsert hits an existing row
+COUNTRY_UPDATE_FIELDS = [
+    'iso', 'iso3', 'record_type', 'record_type_display', 'region', 'independent', 'is_deprecated', 'fdrs',
+    'average_household_size', 'society_name', 'name', 'translation_module_original_language',
+]
+MOLNIX_TAG_UPDATE_FIELDS = ['molnix_id', 'name', 'description', 'color', 'tag_type', 'groups']
+DISASTER_TYPE_UPDATE_FIELDS = ['name', 'summary', 'translation_module_original_language']
+EVENT_UPDATE_FIELDS = [
+    'name', 'summary', 'dtype', 'ifrc_severity_level', 'ifrc_severity_level_display', 'glide',
+    'disaster_start_date', 'created_at', 'active_deployments', 'content_hash', 'deleted_at', 'last_updated',
+]
+ALERT_UPDATE_FIELDS = [
+    'country', 'event', 'deployment_needed', 'is_private', 'created_at', 'opens', 'closes', 'start', 'end',
+    'atype', 'atype_display', 'category', 'category_display', 'molnix_id', 'molnix_status',
+    'molnix_status_display', 'message', 'operation', 'translation_module_original_language', 'content_hash',
+    'deleted_at', 'last_updated',
+]
 
 
 @shared_task
-def fetch_surge_alerts():
+def fetch_surge_alerts(full=None, mode=None):
     """
     Fetch surge alerts from the IFRC API and store them in the database.
     Handles pagination and checks for new and updated records.
     First fetches events to ensure they exist in the database.
+
+    Args:
+        full: True to force a full sync, False to force a delta sync.
+            By default a delta sync is run unless a full one is due.
+        mode: 'local' to process every page in this task, or 'fanout' to
+            dispatch the pages to Celery subtasks. Defaults to
+            settings.IFRC_EXECUTION_MODE
+    """
+    with IngestRecorder('fetch_surge_alerts') as recorder:
+        lock = SyncLock('fetch_surge_alerts')
+        if not lock.acquire():
+            return recorder.finish(skipped_run(full, lock))
+
+        if (mode or settings.IFRC_EXECUTION_MODE) == 'fanout':
+            return recorder.finish(dispatch_fanout(['events', 'surge_alerts'], full, lock, recorder.run))
+
+        try:
+            with lock.heartbeat():
+                result = sync_surge_alerts(full, recorder.run)
+        finally:
+            lock.release()
+        result['lock'] = lock.timings()
+        return recorder.finish(result)
+
+
+def sync_surge_alerts(full=None, run=None):
+    """
+    Fetch and write every page of surge alerts in this process.
+    Called by fetch_surge_alerts while it holds the task lock.
+
+    Args:
+        full: See fetch_surge_alerts
+        run: The IngestRun of the calling task, recorded with the archived pages
     """
     # First fetch events to ensure they exist in the database
     logger.info("Fetching events before surge alerts")
-    fetch_events()
+    fetch_events(full=full, mode='local')
 
     logger.info("Starting surge alert data fetch")
-    logger.debug(f"Using API URL: {settings.IFRC_API_URL}")
-
-    url = settings.IFRC_API_URL
-    next_page = url
+    logger.debug("Using API URL: %s", settings.IFRC_API_URL)
+
+    url, full = plan_sync('surge_alerts', settings.IFRC_API_URL, full)
+    tracker = CursorTracker('surge_alerts')
+    seen = SeenIds()
+    archive = PageArchive('surge_alerts', full, run)
+    validators = PageValidators('surge_alerts')
+    pipeline = PagePipeline(archive.wrap(iter_pages(url, validators=validators)))
+    resolver = EventResolver()
+    ingested = IngestedAlerts()
+    succeeded = False
     total_created = 0
     total_updated = 0
+    total_unchanged = 0
+    total_failed = 0
     page_count = 0
 
-    while next_page:
-        page_count += 1
-        logger.info(f"Fetching data from page {page_count}: {next_page}")
-        try:
-            logger.debug(f"Sending GET request to: {next_page}")
-            response = requests.get(next_page)
-            response.raise_for_status()
-
-            logger.debug(f"Received response with status code: {response.status_code}")
-            data = response.json()
+    try:
+        for page_count, page_url, data in pipeline:
+            if data.get('_not_modified'):
+                # Same page as on the last run, its records are already written
+                if full:
+                    seen.extend(data['_ids'])
+                    seen.observe([], data.get('count'))
+                total_unchanged += len(data['_ids'])
+                logger.info("page resource=%s page=%d records=%d not_modified=1 url=%s",
+                            'surge_alerts', page_count, len(data['_ids']), page_url)
+                continue
 
             # Process the results
             results = data.get('results', [])
-            logger.info(f"Retrieved {len(results)} records from page {page_count}")
 
             if not results:
                 logger.warning("No results found in the API response")
 
-            process_results(results)
+            process_results(results, resolver)
+            ingested.observe(results)
+            tracker.observe(results)
+            if full:
+                seen.observe(results, data.get('count'))
 
             # Update counters
             new_created = len([r for r in results if r.get('_created', False)])
             new_updated = len([r for r in results if r.get('_updated', False)])
+            new_unchanged = len([r for r in results if r.get('_unchanged', False)])
             total_created += new_created
             total_updated += new_updated
+            total_unchanged += new_unchanged
+            new_failed = len(results) - new_created - new_updated - new_unchanged
+            total_failed += new_failed
+            if not new_failed:
+                validators.processed(page_url)
+
+            logger.info("page resource=%s page=%d records=%d created=%d updated=%d unchanged=%d url=%s",
+                        'surge_alerts', page_count, len(results), new_created, new_updated, new_unchanged, page_url)
+
+        succeeded = True
+    except requests.RequestException as e:
+        logger.exception("Error fetching data from API: %s", e)
+    except ValueError as e:
+        logger.exception("Error parsing JSON response: %s", e)
+    except Exception as e:
+        logger.exception("Unexpected error processing data: %s", e)
+    archive.save()
+    validators.save()
+    ingested.send()
+
+    logger.info("run resource=surge_alerts full=%s succeeded=%s pages=%d created=%d updated=%d unchanged=%d failed=%d "
+                "timings=%s http=%s conditional=%s cache=%s", full, succeeded, page_count, total_created, total_updated,
+                total_unchanged, total_failed, pipeline.timings(), get_client().stats.snapshot(), validators.stats(),
+                cache_stats())
+
+    # Soft-delete the records that are gone upstream, only after a complete full sync
+    deleted = reconcile_full_sync('surge_alerts', seen) if full and succeeded else 0
+
+    # Update the API status and the sync cursor
+    api_status = finish_sync('surge_alerts', tracker, full, succeeded)
+    logger.debug("Updated API status: %s", api_status)
+
+    return {
+        'created': total_created,
+        'updated': total_updated,
+        'unchanged': total_unchanged,
+        'failed': total_failed,
+        'deleted': deleted,
+        'full': full,
+        'succeeded': succeeded,
+        'pages': page_count,
+        **validators.stats(),
+        'timings': pipeline.timings(),
+    }
+
+
+class IngestedAlerts:
+    """
+    Collects the API IDs of the alerts a sync created and updated, and
+    announces them with the alerts_ingested signal.
+
+    A run is initial while surge alerts never completed a sync: the cursor
+    is only stored once one did, so this also holds for every page subtask
+    of a first fan-out run.
+    """
+
+    def __init__(self):
+        self.created = []
+        self.updated = []
+        self.initial = not ApiStatus.objects.filter(name='surge_alerts', cursor_timestamp__isnull=False).exists()
+
+    def observe(self, results):
+        for item in results:
+            if item.get('_created'):
+                self.created.append(item['id'])
+            elif item.get('_updated'):
+                self.updated.append(item['id'])
+
+    def send(self):
+        if not self.created and not self.updated:
+            return
+        # A failing receiver must not fail the sync, the alerts are written
+        for receiver, response in alerts_ingested.send_robust(sender=SurgeAlert, created=self.created,
+                                                              updated=self.updated, initial=self.initial):
+            if isinstance(response, Exception):
+                logger.error("alerts_ingested receiver %s failed: %s", receiver, response, exc_info=response)
+        self.created, self.updated = [], []
+
+
+def skipped_run(full, lock):
+    """
+    Result returned by a sync task that found another run holding its lock.
+    """
+    return {'created': 0, 'updated': 0, 'unchanged': 0, 'full': full, 'skipped': True, 'lock': lock.timings()}
+
+
+def dispatch_fanout(names, full=None, lock=None, run=None):
+    """
+    Split the sync of each resource into Celery subtasks, one per batch of
+    settings.IFRC_FANOUT_PAGES_PER_TASK pages.
+
+    The page set of every resource is worked out up front from its record
+    count. Each resource becomes a chord of page subtasks whose callback
+    aggregates the counts and updates the ApiStatus row, and the chords are
+    chained so events are written before the alerts that reference them.
+
+    The task lock is handed over to the subtasks with a lease covering every
+    page of the run (see settings.IFRC_FANOUT_LOCK_LEASE_PER_PAGE), so it
+    cannot expire while subtasks wait in the queue. The page subtasks and
+    chord callbacks renew it, and the callback of the last chord releases
+    it. It is released here if there is nothing to dispatch or the dispatch
+    fails.
+
+    Args:
+        names: Resource names in the order they should be synced
+        full: True to force a full sync, False to force a delta sync
+        lock: The SyncLock held by the calling task
+        run: The IngestRun of the calling task, recorded with the archived pages
+
+    Returns:
+        Summary dict; the counts are only known once the chords complete
+    """
+    page_size = settings.IFRC_PAGE_SIZE
+    per_task = settings.IFRC_FANOUT_PAGES_PER_TASK
+    summary = {'created': 0, 'updated': 0, 'unchanged': 0, 'full': full, 'dispatched': 0}
+    chords = []
+
+    try:
+        for name in names:
+            url, resource_full = plan_sync(name, resource_url(name), full)
+            try:
+                count = get_page(set_query_params(url, limit=1)).get('count') or 0
+            except (requests.RequestException, ValueError) as e:
+                logger.exception("Error discovering the pages of %s: %s", name, e)
+                finish_sync(name, CursorTracker(name), resource_full, False)
+                continue
+
+            urls = page_urls(url, count, page_size)
+            batches = [urls[i:i + per_task] for i in range(0, len(urls), per_task)]
+            logger.info("Dispatching %s subtasks for %s pages of %s (%s records)", len(batches), len(urls), name, count)
+
+            archive = [new_batch(name, run.pk if run else None), run.pk if run else None]
+            chords.append((name, resource_full, count, len(urls), batches, archive))
+            summary['full'] = resource_full
+            summary['dispatched'] += len(batches)
+
+        if not chords:
+            if lock:
+                lock.release()
+            return summary
+
+        pages = sum(page_count for _, _, _, page_count, _, _ in chords)
+        lease = settings.IFRC_SYNC_LOCK_LEASE + pages * settings.IFRC_FANOUT_LOCK_LEASE_PER_PAGE
+        handover = lock.handover(lease) if lock else None
+        result = chain(*[
+            chord(
+                [
+                    sync_pages.si(name, batch, lock=handover, full=resource_full, archive=archive,
+                                  first_page=j * per_task + 1)
+                    for j, batch in enumerate(batches)
+                ],
+                finish_fanout_sync.s(name, resource_full, page_count, lock=handover,
+                                     release=i == len(chords) - 1, count=count),
+            )
+            for i, (name, resource_full, count, page_count, batches, archive) in enumerate(chords)
+        ]).apply_async()
+    except Exception:
+        # The chords never took ownership of the lock
+        if lock:
+            lock.release()
+        raise
+    summary['task_id'] = result.id
+    return summary
 
-            logger.info(f"Page {page_count} processing complete. Created: {new_created}, Updated: {new_updated}")
 
-            # Check for next page
-            next_page = data.get('next')
-            if next_page:
-                logger.debug(f"Next page URL: {next_page}")
+@shared_task
+def sync_pages(name, urls, lock=None, full=False, archive=None, first_page=1):
+    """
+    Fetch and write a batch of pages of a resource. Subtask of a fan-out run.
+
+    Args:
+        name: The resource name
+        urls: The page URLs to sync
+        lock: The handed over task lock, renewed with its lease for every page
+        full: Whether the run is a full sync
+        archive: (batch, run_id) pair the pages are archived under
+        first_page: The page number of the first URL
+
+    Returns:
+        Dict with the created/updated/unchanged counts, the number of pages
+        written, the URLs of the pages that failed, the newest cursor
+        timestamp seen, the conditional request counters and,
+        for full syncs, the IDs seen
+    """
+    tracker = CursorTracker(name)
+    seen = SeenIds()
+    resolver = EventResolver() if name == 'surge_alerts' else None
+    ingested = IngestedAlerts()
+    task_lock = SyncLock.from_handover(lock) if lock else None
+    page_archive = PageArchive(name, full, run=archive[1], batch=archive[0]) if archive else None
+    validators = PageValidators(name, urls)
+    outcome = {'created': 0, 'updated': 0, 'unchanged': 0, 'pages': 0, 'failed': [], 'cursor': None, 'seen': []}
+
+    for page_number, page_url in enumerate(urls, start=first_page):
+        if task_lock:
+            task_lock.extend()
+        try:
+            data = get_page(page_url, validators)
+            if data.get('_not_modified'):
+                # Same page as on the last run, its records are already written
+                if full:
+                    seen.extend(data['_ids'])
+                outcome['unchanged'] += len(data['_ids'])
+                outcome['pages'] += 1
+                continue
+            if page_archive:
+                page_archive.add(page_number, page_url, data)
+            results = data.get('results', [])
+            if name == 'surge_alerts':
+                process_results(results, resolver)
+                ingested.observe(results)
             else:
-                logger.debug("No more pages to fetch")
-
-        except requests.RequestException as e:
-            logger.error(f"Error fetching data from API: {e}")
-            logger.exception("Full exception details:")
-            break
-        except ValueError as e:
-            logger.error(f"Error parsing JSON response: {e}")
-            logger.exception("Full exception details:")
-            break
+                process_event_results(results)
         except Exception as e:
-            logger.error(f"Unexpected error processing data: {e}")
-            logger.exception("Full exception details:")
-            break
+            logger.exception("Error syncing page %s of %s: %s", page_url, name, e)
+            outcome['failed'].append(page_url)
+            continue
 
-    logger.info(f"Completed surge alert data fetch. Total pages: {page_count}, Created: {total_created}, Updated: {total_updated}")
+        tracker.observe(results)
+        if full:
+            seen.observe(results)
+        created = len([r for r in results if r.get('_created', False)])
+        updated = len([r for r in results if r.get('_updated', False)])
+        unchanged = len([r for r in results if r.get('_unchanged', False)])
+        if created + updated + unchanged == len(results):
+            validators.processed(page_url)
+        outcome['created'] += created
+        outcome['updated'] += updated
+        outcome['unchanged'] += unchanged
+        outcome['pages'] += 1
+
+    if page_archive:
+        page_archive.save()
+    validators.save()
+    ingested.send()
+    outcome.update(validators.stats())
+    if tracker.timestamp:
+        outcome['cursor'] = tracker.timestamp.isoformat()
+    outcome['seen'] = seen.ids.tolist()
+    logger.info("Synced %s/%s pages of %s. Created: %s, Updated: %s, Unchanged: %s", outcome['pages'], len(urls), name, outcome['created'], outcome['updated'], outcome['unchanged'])
+    return outcome
 
-    # Update the API status
-    api_status, created = ApiStatus.objects.update_or_create(
-        name='surge_alerts',
-        defaults={'last_run': timezone.now()}
-    )
-    logger.info(f"Updated API status: {api_status}")
 
-    return {'created': total_created, 'updated': total_updated}
+@shared_task
+def finish_fanout_sync(outcomes, name, full, page_count, lock=None, release=True, count=None):
+    """
+    Aggregate the results of the page subtasks of a fan-out run and record
+    the run on the ApiStatus row. Callback of the resource's chord.
 
+    The cursor only moves, and records missing upstream are only
+    soft-deleted, when every page was written. The callback renews the
+    handed over task lock for the chords still to run, or releases it if
+    its chord is the last of the run.
+    """
+    tracker = CursorTracker(name)
+    seen = SeenIds()
+    seen.expected = count
+    summary = {'created': 0, 'updated': 0, 'unchanged': 0, 'full': full, 'pages': 0, 'failed': [], 'deleted': 0,
+               'pages_not_modified': 0, 'bytes_avoided': 0}
+    for outcome in outcomes:
+        seen.extend(outcome.get('seen') or [])
+        for key in ('created', 'updated', 'unchanged', 'pages'):
+            summary[key] += outcome[key]
+        for key in ('pages_not_modified', 'bytes_avoided'):
+            summary[key] += outcome.get(key, 0)
+        summary['failed'].extend(outcome['failed'])
+        if outcome['cursor']:
+            tracker.advance(datetime.fromisoformat(outcome['cursor']))
+
+    succeeded = not summary['failed'] and summary['pages'] == page_count
+    logger.info("Completed fan-out sync of %s. Pages: %s/%s, Created: %s, Updated: %s, Unchanged: %s, Not modified: %s pages (%s bytes avoided)",
+                name, summary['pages'], page_count, summary['created'], summary['updated'], summary['unchanged'],
+                summary['pages_not_modified'], summary['bytes_avoided'])
+
+    if full and succeeded:
+        summary['deleted'] = reconcile_full_sync(name, seen)
+
+    api_status = finish_sync(name, tracker, full, succeeded)
+    logger.info("Updated API status: %s", api_status)
+
+    if lock:
+        task_lock = SyncLock.from_handover(lock)
+        if release:
+            task_lock.release()
+            summary['lock'] = task_lock.timings()
+        else:
+            task_lock.extend()
+    return summary
+
+
+def reconcile_full_sync(name, seen):
+    """
+    Soft-delete the records of a resource that a complete full sync did not
+    see, and restore the soft-deleted ones it saw again.
 
-def process_results(results):
+    Returns:
+        The number of records marked deleted
     """
-    Process the results from the API and save to the database.
+    model = {'surge_alerts': SurgeAlert, 'events': Event}[name]
+    outcome = reconcile_deletions(name, model, seen)
+    if not outcome:
+        return 0
+    if model is Event and any(outcome):
+        invalidate(Event)
+    return outcome[0]
+
+
+def resource_url(name):
+    """
+    Return the API endpoint of a synced resource.
+    """
+    return {
+        'surge_alerts': settings.IFRC_API_URL,
+        'events': settings.IFRC_EVENT_API_URL,
+    }[name]
+
+
+def process_results(results, resolver=None):
+    """
+    Process a page of surge alert results and save to the database.
+
+    Every country, event and tag referenced by the page is resolved in a few
+    bulk queries and the alerts are upserted in a single transaction. If the
+    bulk write fails, the page is processed again record by record so a bad
+    record cannot take the rest of the page down with it.
+    """
+    alerts_data = unique_by_id(results, 'surge alert')
+    if not alerts_data:
+        return
+
+    # Resolve events before opening the page transaction, fetching any
+    # unknown events from the API
+    resolver = resolver or EventResolver()
+    events = resolver.resolve(extract_event_id(item) for item in alerts_data)
+
+    try:
+        with transaction.atomic():
+            written = write_alert_page(alerts_data, events)
+    except Exception as e:
+        logger.exception("Bulk write failed for page of %s alerts, retrying record by record: %s", len(alerts_data), e)
+        process_results_individually(results, events)
+        return
+
+    # Mark if created, updated or unchanged for reporting
+    for item, status in written:
+        item['_created'] = status == 'created'
+        item['_updated'] = status == 'updated'
+        item['_unchanged'] = status == 'unchanged'
+
+
+def process_results_individually(results, events=None):
     """
-    logger.debug(f"Processing {len(results)} results")
+    Process the results one record at a time, each in its own transaction.
+    Used as the fallback when the bulk write of a page fails.
 
+    Args:
+        results: Alert payloads
+        events: Optional dict mapping event api_id to already resolved Event objects
+    """
     for i, item in enumerate(results):
-        logger.debug(f"Processing item {i+1}/{len(results)} with ID: {item.get('id')}")
+        if sample_debug():
+            logger.debug("Processing item %s/%s with ID: %s (country: %s)", i+1, len(results), item.get('id'), bool(item.get('country')))
         with transaction.atomic():
             try:
                 # Process country data if present
                 country_obj = None
                 if item.get('country'):
-                    logger.debug(f"Processing country data for item ID: {item.get('id')}")
                     country_obj = process_country(item['country'])
-                else:
-                    logger.debug(f"No country data for item ID: {item.get('id')}")
 
                 # Process surge alert
-                process_surge_alert(item, country_obj)
+                process_surge_alert(item, country_obj, events)
 
             except Exception as e:
-                logger.error(f"Error processing item {item.get('id')}: {e}")
-                logger.exception("Full exception details:")
+                logger.error("Error processing item %s: %s", item.get('id'), e, exc_info=sample_debug())
+
+
+def write_alert_page(alerts_data, events):
+    """
+    Upsert a page of surge alerts together with their countries and tags.
+    Alerts whose content hash has not changed since the last run are skipped.
+
+    Args:
+        alerts_data: Alert payloads, already de-duplicated by ID
+        events: Dict mapping event api_id to Event objects
+
+    Returns:
+        List of (alert_data, status) tuples, status being 'created',
+        'updated' or 'unchanged'
+    """
+    countries = upsert_countries([item['country'] for item in alerts_data if item.get('country')])
+    tags = upsert_molnix_tags([tag for item in alerts_data for tag in (item.get('molnix_tags') or [])])
+
+    api_ids = [item['id'] for item in alerts_data]
+    existing = {
+        api_id: (pk, stored_hash)
+        for api_id, pk, stored_hash in SurgeAlert.objects.filter(api_id__in=api_ids).values_list('api_id', 'pk', 'content_hash')
+    }
+
+    alerts = []
+    processed = []
+    for item in alerts_data:
+        try:
+            country_data = item.get('country') or {}
+            country_obj = countries.get(country_data.get('id'))
+            event_obj = events.get(extract_event_id(item))
+            tag_objs = [tags[tag['id']] for tag in (item.get('molnix_tags') or []) if tag and tag.get('id') in tags]
+            defaults = alert_defaults(item)
+            alert_hash = alert_content_hash(defaults, country_obj, event_obj, tag_objs)
+        except Exception as e:
+            logger.error("Error preparing surge alert %s: %s", item.get('id'), e, exc_info=sample_debug())
+            continue
+
+        if item['id'] in existing and existing[item['id']][1] == alert_hash:
+            processed.append((item, 'unchanged', tag_objs))
+            continue
+
+        alerts.append(SurgeAlert(
+            api_id=item['id'],
+            country=country_obj,
+            event=event_obj,
+            content_hash=alert_hash,
+            **defaults
+        ))
+        processed.append((item, 'updated' if item['id'] in existing else 'created', tag_objs))
+
+    if alerts:
+        SurgeAlert.objects.bulk_create(
+            alerts,
+            update_conflicts=True,
+            unique_fields=['api_id'],
+            update_fields=ALERT_UPDATE_FIELDS,
+        )
+    alert_pks = {api_id: pk for api_id, (pk, stored_hash) in existing.items()}
+    new_ids = [item['id'] for item, status, tag_objs in processed if status == 'created']
+    if new_ids:
+        alert_pks.update(SurgeAlert.objects.filter(api_id__in=new_ids).values_list('api_id', 'pk'))
+
+    # Sync the tag links of every changed alert that carries tags in the payload
+    reconcile_m2m(SurgeAlert.molnix_tags, {
+        alert_pks[item['id']]: {tag.pk for tag in tag_objs}
+        for item, status, tag_objs in processed if status != 'unchanged' and item.get('molnix_tags')
+    })
+
+    logger.debug("Wrote page of %s changed surge alerts (%s unchanged), %s countries and %s molnix tags", len(alerts), len(processed) - len(alerts), len(countries), len(tags))
+    return [(item, status) for item, status, tag_objs in processed]
+
+
+def upsert_countries(countries_data):
+    """
+    Create or update countries in bulk, skipping unchanged ones.
+    Returns a dict mapping country api_id to Country objects.
+    """
+    return upsert_by_hash(Country, unique_by_id(countries_data, 'country'), country_defaults, COUNTRY_UPDATE_FIELDS, country_cache)
+
+
+def upsert_molnix_tags(tags_data):
+    """
+    Create or update molnix tags in bulk, skipping unchanged ones.
+    Returns a dict mapping tag api_id to MolnixTag objects.
+    """
+    return upsert_by_hash(MolnixTag, unique_by_id(tags_data, 'molnix tag'), molnix_tag_defaults, MOLNIX_TAG_UPDATE_FIELDS, molnix_tag_cache)
+
+
+def upsert_by_hash(model, records, defaults_func, update_fields, reference_cache=None):
+    """
+    Bulk upsert records keyed by api_id, only writing rows whose content
+    hash differs from the stored one.
+
+    Args:
+        model: The model class, which must have api_id and content_hash fields
+        records: API payloads, already de-duplicated by ID
+        defaults_func: Function mapping a payload to model fields
+        update_fields: Fields overwritten when the row already exists
+        reference_cache: Optional ReferenceCache of the model, used to look
+            up the stored rows and refreshed with the written ones
+
+    Returns:
+        Dict mapping api_id to model instances
+    """
+    if not records:
+        return {}
+
+    api_ids = [data['id'] for data in records]
+    if reference_cache:
+        objs = reference_cache.get_many(api_ids, fresh=True)
+    else:
+        objs = model.objects.filter(api_id__in=api_ids).in_bulk(field_name='api_id')
+
+    changed = []
+    for data in records:
+        defaults = defaults_func(data)
+        record_hash = content_hash(defaults)
+        if data['id'] in objs and objs[data['id']].content_hash == record_hash:
+            continue
+        changed.append(model(api_id=data['id'], content_hash=record_hash, **defaults))
+    # Write in key order so concurrent writers lock shared rows in the same order
+    changed.sort(key=lambda obj: obj.api_id)
+
+    if changed:
+        model.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=['api_id'],
+            update_fields=[*update_fields, 'content_hash'],
+        )
+        # Re-read the written rows so the returned and cached instances are current
+        written = model.objects.filter(api_id__in=[obj.api_id for obj in changed]).in_bulk(field_name='api_id')
+        if reference_cache:
+            if any(api_id in objs for api_id in written):
+                invalidate(model)
+            reference_cache.set_many(written.values())
+        objs.update(written)
+
+    return objs
+
+
+def update_or_create_if_changed(model, api_id, defaults, hash_values=None, reference_cache=None):
+    """
+    Like update_or_create, but leave the row untouched when its content hash
+    matches the new values.
+
+    Args:
+        model: The model class, which must have api_id and content_hash fields
+        api_id: The API ID of the record
+        defaults: Model fields to write
+        hash_values: Values to hash instead of `defaults`, for when the
+            defaults contain model instances
+        reference_cache: Optional ReferenceCache of the model, used to look
+            up the stored row and refreshed with the written one
+
+    Returns:
+        (obj, created, changed) tuple
+    """
+    record_hash = content_hash(defaults if hash_values is None else hash_values)
+    if reference_cache:
+        obj = reference_cache.get(api_id, fresh=True)
+    else:
+        obj = model.objects.filter(api_id=api_id).first()
+    if obj is not None and obj.content_hash == record_hash:
+        return obj, False, False
+
+    obj, created = model.objects.update_or_create(
+        api_id=api_id,
+        defaults={**defaults, 'content_hash': record_hash}
+    )
+    if reference_cache:
+        if not created:
+            invalidate(model)
+        reference_cache.set_many([obj])
+    return obj, created, True
+
+
+def content_hash(values):
+    """
+    Return a stable SHA-256 hash of JSON-like values.
+    Keys are sorted so the hash does not depend on the payload's key order.
+    """
+    canonical = json.dumps(values, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def alert_content_hash(defaults, country_obj, event_obj, tag_objs):
+    """
+    Return the content hash of a surge alert.
+    Covers the alert's own fields and the API IDs of the country, event and
+    tags it is linked to, so a link that could not be resolved before is
+    written once it can be. The bulk page write and the record by record
+    fallback both pass the resolved objects, so they hash alike.
+    """
+    return content_hash({
+        **defaults,
+        'country': country_obj.api_id if country_obj else None,
+        'event': event_obj.api_id if event_obj else None,
+        'molnix_tags': sorted({tag.api_id for tag in tag_objs}),
+    })
+
+
+def unique_by_id(records, label):
+    """
+    Drop empty records and records without an ID, keeping the last
+    occurrence of each ID so a bulk upsert never touches a row twice.
+    """
+    unique = {}
+    for record in records:
+        if not record:
+            logger.warning("Empty %s data received", label)
+            continue
+        if not record.get('id'):
+            logger.warning("%s data missing ID: %s", label.capitalize(), record)
+            continue
+        unique[record['id']] = record
+    return list(unique.values())
+
+
+def extract_event_id(alert_data):
+    """
+    Return the event ID referenced by a surge alert.
+    The event field can be either a number or a complex object.
+    """
+    event = alert_data.get('event')
+    if isinstance(event, dict):
+        return event.get('id') if event else None
+    return event
+
+
+def country_defaults(country_data):
+    """
+    Map country data from the API to Country model fields.
+    """
+    return {
+        'iso': country_data.get('iso'),
+        'iso3': country_data.get('iso3'),
+        'record_type': country_data.get('record_type'),
+        'record_type_display': country_data.get('record_type_display'),
+        'region': country_data.get('region'),
+        'independent': country_data.get('independent', True),
+        'is_deprecated': country_data.get('is_deprecated', False),
+        'fdrs': country_data.get('fdrs'),
+        'average_household_size': country_data.get('average_household_size'),
+        'society_name': country_data.get('society_name'),
+        'name': country_data.get('name', 'Unknown'),
+        'translation_module_original_language': country_data.get('translation_module_original_language')
+    }
+
+
+def molnix_tag_defaults(tag_data):
+    """
+    Map molnix tag data from the API to MolnixTag model fields.
+    """
+    return {
+        'molnix_id': tag_data.get('molnix_id'),
+        'name': tag_data.get('name', 'Unknown'),
+        'description': tag_data.get('description'),
+        'color': tag_data.get('color'),
+        'tag_type': tag_data.get('tag_type'),
+        'groups': tag_data.get('groups', [])
+    }
+
+
+def alert_defaults(alert_data):
+    """
+    Map surge alert data from the API to SurgeAlert model fields.
+    Country and event are resolved separately.
+    """
+    return {
+        'deployment_needed': alert_data.get('deployment_needed', False),
+        'is_private': alert_data.get('is_private', False),
+        'created_at': parse_datetime(alert_data.get('created_at')),
+        'opens': parse_datetime(alert_data.get('opens')),
+        'closes': parse_datetime(alert_data.get('closes')),
+        'start': parse_datetime(alert_data.get('start')),
+        'end': parse_datetime(alert_data.get('end')),
+        'atype': alert_data.get('atype'),
+        'atype_display': alert_data.get('atype_display'),
+        'category': alert_data.get('category'),
+        'category_display': alert_data.get('category_display'),
+        'molnix_id': alert_data.get('molnix_id'),
+        'molnix_status': alert_data.get('molnix_status'),
+        'molnix_status_display': alert_data.get('molnix_status_display'),
+        'message': alert_data.get('message'),
+        'operation': alert_data.get('operation'),
+        'translation_module_original_language': alert_data.get('translation_module_original_language')
+    }
 
 
 def process_country(country_data):
@@ -128,73 +814,59 @@ def process_country(country_data):
         return None
 
     if not country_data.get('id'):
-        logger.warning(f"Country data missing ID: {country_data}")
+        logger.warning("Country data missing ID: %s", country_data)
         return None
 
-    logger.debug(f"Processing country with ID: {country_data['id']}, Name: {country_data.get('name', 'Unknown')}")
-
     try:
-        country, created = Country.objects.update_or_create(
-            api_id=country_data['id'],
-            defaults={
-                'iso': country_data.get('iso'),
-                'iso3': country_data.get('iso3'),
-                'record_type': country_data.get('record_type'),
-                'record_type_display': country_data.get('record_type_display'),
-                'region': country_data.get('region'),
-                'independent': country_data.get('independent', True),
-                'is_deprecated': country_data.get('is_deprecated', False),
-                'fdrs': country_data.get('fdrs'),
-                'average_household_size': country_data.get('average_household_size'),
-                'society_name': country_data.get('society_name'),
-                'name': country_data.get('name', 'Unknown'),
-                'translation_module_original_language': country_data.get('translation_module_original_language')
-            }
+        country, created, changed = update_or_create_if_changed(
+            Country, country_data['id'], country_defaults(country_data), reference_cache=country_cache
         )
 
         if created:
-            logger.info(f"Created new country: {country.name} (ID: {country.api_id})")
-        else:
-            logger.debug(f"Updated existing country: {country.name} (ID: {country.api_id})")
+            logger.info("Created new country: %s (ID: %s)", country.name, country.api_id)
+        elif changed and sample_debug():
+            logger.debug("Updated existing country: %s (ID: %s)", country.name, country.api_id)
 
         return country
     except Exception as e:
-        logger.error(f"Error processing country with ID {country_data['id']}: {e}")
-        logger.exception("Full exception details:")
+        logger.error("Error processing country with ID %s: %s", country_data['id'], e, exc_info=sample_debug())
         return None
 
 
-def process_surge_alert(alert_data, country_obj):
+def process_surge_alert(alert_data, country_obj, events=None):
     """
     Process surge alert data and save to the database.
+
+    Args:
+        alert_data: The alert payload
+        country_obj: The Country of the alert, or None
+        events: Optional dict mapping event api_id to already resolved Event
+            objects. Without it the event is resolved on demand
     """
     if not alert_data:
         logger.warning("Empty surge alert data received")
         return None
 
     if not alert_data.get('id'):
-        logger.warning(f"Surge alert data missing ID: {alert_data}")
+        logger.warning("Surge alert data missing ID: %s", alert_data)
         return None
 
-    logger.debug(f"Processing surge alert with ID: {alert_data['id']}")
+    # Decide once per record whether its debug lines are logged
+    verbose = sample_debug()
+    if verbose:
+        logger.debug("Processing surge alert with ID: %s", alert_data['id'])
 
     try:
         # Check if alert exists
         try:
             alert = SurgeAlert.objects.get(api_id=alert_data['id'])
             created = False
-            logger.debug(f"Found existing surge alert with ID: {alert_data['id']}")
         except SurgeAlert.DoesNotExist:
             alert = SurgeAlert(api_id=alert_data['id'])
             created = True
-            logger.debug(f"Creating new surge alert with ID: {alert_data['id']}")
 
         # Update alert fields
         alert.country = country_obj
-        if country_obj:
-            logger.debug(f"Associating surge alert {alert_data['id']} with country: {country_obj.name}")
-        else:
-            logger.debug(f"No country associated with surge alert {alert_data['id']}")
 
         alert.deployment_needed = alert_data.get('deployment_needed', False)
         alert.is_private = alert_data.get('is_private', False)
@@ -205,63 +877,34 @@ def process_surge_alert(alert_data, country_obj):
         if isinstance(event, dict):
             # If event is a dictionary, try to extract the id
             event_id = event.get('id') if event else None
-            logger.debug(f"Extracted event ID {event_id} from event object for surge alert {alert_data['id']}")
         else:
             # Otherwise use the value directly
             event_id = event
-            logger.debug(f"Using direct event value {event_id} for surge alert {alert_data['id']}")
 
         # Look up the Event object by ID
         if event_id:
-            try:
-                event_obj = Event.objects.get(api_id=event_id)
-                alert.event = event_obj
-                logger.debug(f"Associated surge alert {alert_data['id']} with event: {event_obj.name} (ID: {event_obj.api_id})")
-            except Event.DoesNotExist:
-                logger.warning(f"Event with ID {event_id} not found for surge alert {alert_data['id']}")
-                # Try to fetch the event from the API and create it
-                try:
-                    logger.info(f"Attempting to fetch event {event_id} from API for surge alert {alert_data['id']}")
-                    event_url = f"https://goadmin.ifrc.org/api/v2/event/{event_id}/"
-                    event_response = requests.get(event_url)
-                    event_response.raise_for_status()
-                    event_data = event_response.json()
-
-                    # Process disaster type if present
-                    dtype_obj = None
-                    if event_data.get('dtype'):
-                        dtype_obj = process_disaster_type(event_data['dtype'])
-
-                    # Process countries if present
-                    country_objs = []
-                    if event_data.get('countries'):
-                        for country_data in event_data['countries']:
-                            country_obj = process_country(country_data)
-                            if country_obj:
-                                country_objs.append(country_obj)
-
-                    # Process the event
-                    event_obj = process_event(event_data, dtype_obj, country_objs)
-                    if event_obj:
-                        alert.event = event_obj
-                        logger.info(f"Successfully created and associated event {event_obj.api_id} with surge alert {alert_data['id']}")
-                    else:
-                        logger.warning(f"Failed to create event {event_id} for surge alert {alert_data['id']}")
-                        alert.event = None
-                except Exception as e:
-                    logger.error(f"Error fetching or processing event {event_id} from API: {e}")
-                    logger.exception("Full exception details:")
-                    alert.event = None
+            if events is None:
+                events = EventResolver().resolve({event_id})
+            alert.event = events.get(event_id)
+            if not alert.event:
+                logger.warning("Event %s could not be resolved for surge alert %s", event_id, alert_data['id'])
         else:
             alert.event = None
 
+        # Skip the write entirely when nothing changed since the last run
+        tag_objs = process_molnix_tags(alert_data.get('molnix_tags'), alert_data['id'])
+        alert_hash = alert_content_hash(alert_defaults(alert_data), alert.country, alert.event, tag_objs)
+        if not created and alert.content_hash == alert_hash:
+            if verbose:
+                logger.debug("Surge alert %s is unchanged, skipping", alert_data['id'])
+            alert_data['_created'] = False
+            alert_data['_updated'] = False
+            alert_data['_unchanged'] = True
+            return alert
+
         # Parse datetime fields
         for field_name in ['created_at', 'opens', 'closes', 'start', 'end']:
-            field_value = alert_data.get(field_name)
-            if field_value:
-                logger.debug(f"Parsing datetime for field {field_name}: {field_value}")
-            parsed_value = parse_datetime(field_value)
-            setattr(alert, field_name, parsed_value)
+            setattr(alert, field_name, parse_datetime(alert_data.get(field_name)))
 
         # Set other fields
         alert.atype = alert_data.get('atype')
@@ -274,82 +917,62 @@ def process_surge_alert(alert_data, country_obj):
         alert.message = alert_data.get('message')
         alert.operation = alert_data.get('operation')
         alert.translation_module_original_language = alert_data.get('translation_module_original_language')
+        alert.content_hash = alert_hash
+        alert.deleted_at = None
 
-        logger.debug(f"Saving surge alert with ID: {alert_data['id']}")
         alert.save()
 
-        # Process molnix tags
+        # Only add and remove the tag links that differ from the stored ones
         if alert_data.get('molnix_tags'):
-            logger.debug(f"Processing {len(alert_data['molnix_tags'])} molnix tags for surge alert {alert_data['id']}")
-            process_molnix_tags(alert, alert_data['molnix_tags'])
-        else:
-            logger.debug(f"No molnix tags for surge alert {alert_data['id']}")
+            reconcile_m2m(SurgeAlert.molnix_tags, {alert.pk: {tag.pk for tag in tag_objs}})
 
         # Mark if created or updated for reporting
         alert_data['_created'] = created
         alert_data['_updated'] = not created
+        alert_data['_unchanged'] = False
 
-        if created:
-            logger.info(f"Created new surge alert: {alert.api_id}, Type: {alert.atype_display}, Category: {alert.category_display}")
-        else:
-            logger.info(f"Updated surge alert: {alert.api_id}, Type: {alert.atype_display}, Category: {alert.category_display}")
+        if verbose:
+            logger.debug("%s surge alert: %s, Country: %s, Event: %s, Type: %s, Category: %s",
+                         'Created' if created else 'Updated', alert.api_id, alert.country_id, alert.event_id,
+                         alert.atype_display, alert.category_display)
 
         return alert
     except Exception as e:
-        logger.error(f"Error processing surge alert with ID {alert_data.get('id')}: {e}")
-        logger.exception("Full exception details:")
+        logger.error("Error processing surge alert with ID %s: %s", alert_data.get('id'), e, exc_info=sample_debug())
         return None
 
 
-def process_molnix_tags(alert, tags_data):
+def process_molnix_tags(tags_data, alert_id):
     """
-    Process molnix tags data and associate with the surge alert.
+    Create or update the molnix tags of a surge alert.
+    Returns the MolnixTag objects that could be written.
     """
     if not tags_data:
-        logger.debug(f"No tags data provided for alert ID: {alert.api_id}")
-        return
-
-    logger.debug(f"Processing {len(tags_data)} molnix tags for alert ID: {alert.api_id}")
-
-    # Clear existing tags
-    logger.debug(f"Clearing existing tags for alert ID: {alert.api_id}")
-    alert.molnix_tags.clear()
+        return []
 
+    tags = []
     for i, tag_data in enumerate(tags_data):
         if not tag_data:
-            logger.warning(f"Empty tag data at index {i} for alert ID: {alert.api_id}")
+            logger.warning("Empty tag data at index %s for alert ID: %s", i, alert_id)
             continue
 
         if not tag_data.get('id'):
-            logger.warning(f"Tag data missing ID at index {i} for alert ID: {alert.api_id}: {tag_data}")
+            logger.warning("Tag data missing ID at index %s for alert ID: %s: %s", i, alert_id, tag_data)
             continue
 
-        logger.debug(f"Processing tag {i+1}/{len(tags_data)} with ID: {tag_data['id']} for alert ID: {alert.api_id}")
-
         try:
-            tag, created = MolnixTag.objects.update_or_create(
-                api_id=tag_data['id'],
-                defaults={
-                    'molnix_id': tag_data.get('molnix_id'),
-                    'name': tag_data.get('name', 'Unknown'),
-                    'description': tag_data.get('description'),
-                    'color': tag_data.get('color'),
-                    'tag_type': tag_data.get('tag_type'),
-                    'groups': tag_data.get('groups', [])
-                }
+            tag, created, changed = update_or_create_if_changed(
+                MolnixTag, tag_data['id'], molnix_tag_defaults(tag_data), reference_cache=molnix_tag_cache
             )
 
             if created:
-                logger.info(f"Created new molnix tag: {tag.name} (ID: {tag.api_id})")
-            else:
-                logger.debug(f"Updated existing molnix tag: {tag.name} (ID: {tag.api_id})")
+                logger.info("Created new molnix tag: %s (ID: %s)", tag.name, tag.api_id)
 
-            # Add tag to alert
-            logger.debug(f"Adding tag {tag.name} to alert ID: {alert.api_id}")
-            alert.molnix_tags.add(tag)
+            tags.append(tag)
         except Exception as e:
-            logger.error(f"Error processing molnix tag with ID {tag_data.get('id')} for alert ID {alert.api_id}: {e}")
-            logger.exception("Full exception details:")
+            logger.error("Error processing molnix tag with ID %s for alert ID %s: %s", tag_data.get('id'), alert_id, e, exc_info=sample_debug())
+
+    return tags
 
 
 def parse_datetime(dt_str):
@@ -357,132 +980,434 @@ def parse_datetime(dt_str):
     Parse datetime string from API to Python datetime object.
     """
     if not dt_str:
-        logger.debug("Empty datetime string received")
         return None
 
     try:
-        logger.debug(f"Parsing datetime string: {dt_str}")
         return datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
     except (ValueError, TypeError) as e:
-        logger.warning(f"Could not parse datetime: {dt_str}, Error: {e}")
+        logger.warning("Could not parse datetime: %s, Error: %s", dt_str, e)
         return None
     except Exception as e:
-        logger.error(f"Unexpected error parsing datetime {dt_str}: {e}")
-        logger.exception("Full exception details:")
+        logger.error("Unexpected error parsing datetime %s: %s", dt_str, e, exc_info=sample_debug())
         return None
 
 
 @shared_task
-def fetch_events():
+def fetch_events(full=None, mode=None):
     """
     Fetch events from the IFRC API and store them in the database.
     Handles pagination and checks for new and updated records.
+
+    Args:
+        full: True to force a full sync, False to force a delta sync.
+            By default a delta sync is run unless a full one is due.
+        mode: 'local' or 'fanout', see fetch_surge_alerts
     """
-    logger.info("Starting event data fetch")
+    with IngestRecorder('fetch_events') as recorder:
+        lock = SyncLock('fetch_events')
+        if not lock.acquire():
+            return recorder.finish(skipped_run(full, lock))
+
+        if (mode or settings.IFRC_EXECUTION_MODE) == 'fanout':
+            return recorder.finish(dispatch_fanout(['events'], full, lock, recorder.run))
+
+        try:
+            with lock.heartbeat():
+                result = sync_events(full, recorder.run)
+        finally:
+            lock.release()
+        result['lock'] = lock.timings()
+        return recorder.finish(result)
 
-    url = "https://goadmin.ifrc.org/api/v2/event/"
-    logger.debug(f"Using API URL: {url}")
 
-    next_page = url
+def sync_events(full=None, run=None):
+    """
+    Fetch and write every page of events in this process.
+    Called by fetch_events while it holds the task lock.
+
+    Args:
+        full: See fetch_events
+        run: The IngestRun of the calling task, recorded with the archived pages
+    """
+    logger.info("Starting event data fetch")
+    logger.debug("Using API URL: %s", settings.IFRC_EVENT_API_URL)
+
+    url, full = plan_sync('events', settings.IFRC_EVENT_API_URL, full)
+    tracker = CursorTracker('events')
+    seen = SeenIds()
+    archive = PageArchive('events', full, run)
+    validators = PageValidators('events')
+    pipeline = PagePipeline(archive.wrap(iter_pages(url, validators=validators)))
+    succeeded = False
     total_created = 0
     total_updated = 0
+    total_unchanged = 0
+    total_failed = 0
     page_count = 0
 
-    while next_page:
-        page_count += 1
-        logger.info(f"Fetching data from page {page_count}: {next_page}")
-        try:
-            logger.debug(f"Sending GET request to: {next_page}")
-            response = requests.get(next_page)
-            response.raise_for_status()
-
-            logger.debug(f"Received response with status code: {response.status_code}")
-            data = response.json()
+    try:
+        for page_count, page_url, data in pipeline:
+            if data.get('_not_modified'):
+                # Same page as on the last run, its records are already written
+                if full:
+                    seen.extend(data['_ids'])
+                    seen.observe([], data.get('count'))
+                total_unchanged += len(data['_ids'])
+                logger.info("page resource=%s page=%d records=%d not_modified=1 url=%s",
+                            'events', page_count, len(data['_ids']), page_url)
+                continue
 
             # Process the results
             results = data.get('results', [])
-            logger.info(f"Retrieved {len(results)} records from page {page_count}")
 
             if not results:
                 logger.warning("No results found in the API response")
 
             process_event_results(results)
+            tracker.observe(results)
+            if full:
+                seen.observe(results, data.get('count'))
 
             # Update counters
             new_created = len([r for r in results if r.get('_created', False)])
             new_updated = len([r for r in results if r.get('_updated', False)])
+            new_unchanged = len([r for r in results if r.get('_unchanged', False)])
             total_created += new_created
             total_updated += new_updated
+            total_unchanged += new_unchanged
+            new_failed = len(results) - new_created - new_updated - new_unchanged
+            total_failed += new_failed
+            if not new_failed:
+                validators.processed(page_url)
+
+            logger.info("page resource=%s page=%d records=%d created=%d updated=%d unchanged=%d url=%s",
+                        'events', page_count, len(results), new_created, new_updated, new_unchanged, page_url)
+
+        succeeded = True
+    except requests.RequestException as e:
+        logger.exception("Error fetching data from API: %s", e)
+    except ValueError as e:
+        logger.exception("Error parsing JSON response: %s", e)
+    except Exception as e:
+        logger.exception("Unexpected error processing data: %s", e)
+    archive.save()
+    validators.save()
+
+    logger.info("run resource=events full=%s succeeded=%s pages=%d created=%d updated=%d unchanged=%d failed=%d "
+                "timings=%s conditional=%s", full, succeeded, page_count, total_created, total_updated, total_unchanged,
+                total_failed, pipeline.timings(), validators.stats())
+
+    # Soft-delete the records that are gone upstream, only after a complete full sync
+    deleted = reconcile_full_sync('events', seen) if full and succeeded else 0
+
+    # Update the API status and the sync cursor
+    api_status = finish_sync('events', tracker, full, succeeded)
+    logger.debug("Updated API status: %s", api_status)
+
+    return {
+        'created': total_created,
+        'updated': total_updated,
+        'unchanged': total_unchanged,
+        'failed': total_failed,
+        'deleted': deleted,
+        'full': full,
+        'succeeded': succeeded,
+        'pages': page_count,
+        **validators.stats(),
+        'timings': pipeline.timings(),
+    }
 
-            logger.info(f"Page {page_count} processing complete. Created: {new_created}, Updated: {new_updated}")
 
-            # Check for next page
-            next_page = data.get('next')
-            if next_page:
-                logger.debug(f"Next page URL: {next_page}")
-            else:
-                logger.debug("No more pages to fetch")
-
-        except requests.RequestException as e:
-            logger.error(f"Error fetching data from API: {e}")
-            logger.exception("Full exception details:")
-            break
-        except ValueError as e:
-            logger.error(f"Error parsing JSON response: {e}")
-            logger.exception("Full exception details:")
-            break
-        except Exception as e:
-            logger.error(f"Unexpected error processing data: {e}")
-            logger.exception("Full exception details:")
-            break
+def process_event_results(results):
+    """
+    Process a page of event results and save to the database.
 
-    logger.info(f"Completed event data fetch. Total pages: {page_count}, Created: {total_created}, Updated: {total_updated}")
+    Disaster types, countries and events are upserted in bulk in a single
+    transaction. If the bulk write fails, the page is processed again record
+    by record.
+    """
+    events_data = unique_by_id(results, 'event')
+    if not events_data:
+        return
 
-    # Update the API status
-    api_status, created = ApiStatus.objects.update_or_create(
-        name='events',
-        defaults={'last_run': timezone.now()}
-    )
-    logger.info(f"Updated API status: {api_status}")
+    try:
+        with transaction.atomic():
+            written = write_event_page(events_data)
+    except Exception as e:
+        logger.exception("Bulk write failed for page of %s events, retrying record by record: %s", len(events_data), e)
+        process_event_results_individually(results)
+        return
 
-    return {'created': total_created, 'updated': total_updated}
+    # Mark if created, updated or unchanged for reporting
+    for item, status in written:
+        item['_created'] = status == 'created'
+        item['_updated'] = status == 'updated'
+        item['_unchanged'] = status == 'unchanged'
 
 
-def process_event_results(results):
+def process_event_results_individually(results):
     """
-    Process the event results from the API and save to the database.
+    Process the event results one record at a time, each in its own transaction.
+    Used as the fallback when the bulk write of a page fails.
     """
-    logger.debug(f"Processing {len(results)} event results")
-
     for i, item in enumerate(results):
-        logger.debug(f"Processing event item {i+1}/{len(results)} with ID: {item.get('id')}")
+        if sample_debug():
+            logger.debug("Processing event item %s/%s with ID: %s (disaster type: %s, countries: %s)",
+                         i+1, len(results), item.get('id'), bool(item.get('dtype')), len(item.get('countries') or []))
         with transaction.atomic():
             try:
                 # Process disaster type data if present
                 dtype_obj = None
                 if item.get('dtype'):
-                    logger.debug(f"Processing disaster type data for event ID: {item.get('id')}")
                     dtype_obj = process_disaster_type(item['dtype'])
-                else:
-                    logger.debug(f"No disaster type data for event ID: {item.get('id')}")
 
                 # Process countries data
                 country_objs = []
-                if item.get('countries'):
-                    logger.debug(f"Processing {len(item['countries'])} countries for event ID: {item.get('id')}")
-                    for country_data in item['countries']:
-                        country_obj = process_country(country_data)
-                        if country_obj:
-                            country_objs.append(country_obj)
-                else:
-                    logger.debug(f"No countries data for event ID: {item.get('id')}")
+                for country_data in item.get('countries') or []:
+                    country_obj = process_country(country_data)
+                    if country_obj:
+                        country_objs.append(country_obj)
 
                 # Process event
                 process_event(item, dtype_obj, country_objs)
 
             except Exception as e:
-                logger.error(f"Error processing event item {item.get('id')}: {e}")
-                logger.exception("Full exception details:")
+                logger.error("Error processing event item %s: %s", item.get('id'), e, exc_info=sample_debug())
+
+
+def write_event_page(events_data):
+    """
+    Upsert a page of events together with their disaster types and countries.
+    Events whose content hash has not changed since the last run are skipped.
+
+    Args:
+        events_data: Event payloads, already de-duplicated by ID
+
+    Returns:
+        List of (event_data, status) tuples, status being 'created',
+        'updated' or 'unchanged'
+    """
+    dtypes = upsert_disaster_types([item['dtype'] for item in events_data if item.get('dtype')])
+    countries = upsert_countries([country for item in events_data for country in (item.get('countries') or [])])
+
+    existing = {
+        api_id: (event.pk, event.content_hash)
+        for api_id, event in event_cache.get_many((item['id'] for item in events_data), fresh=True).items()
+    }
+
+    events = []
+    processed = []
+    for item in events_data:
+        try:
+            dtype_data = item.get('dtype') or {}
+            defaults = event_defaults(item, dtypes.get(dtype_data.get('id')))
+            country_objs = [
+                countries[country['id']] for country in (item.get('countries') or [])
+                if country and country.get('id') in countries
+            ]
+            event_hash = content_hash(event_hash_values(item, defaults, country_objs))
+        except Exception as e:
+            logger.error("Error preparing event %s: %s", item.get('id'), e, exc_info=sample_debug())
+            continue
+
+        if item['id'] in existing and existing[item['id']][1] == event_hash:
+            processed.append((item, 'unchanged', country_objs))
+            continue
+
+        events.append(Event(api_id=item['id'], content_hash=event_hash, **defaults))
+        processed.append((item, 'updated' if item['id'] in existing else 'created', country_objs))
+
+    if events:
+        Event.objects.bulk_create(
+            events,
+            update_conflicts=True,
+            unique_fields=['api_id'],
+            update_fields=EVENT_UPDATE_FIELDS,
+        )
+    event_pks = {api_id: pk for api_id, (pk, stored_hash) in existing.items()}
+    if events:
+        # Re-read the written events for their pks and to refresh the cache
+        written = Event.objects.filter(api_id__in=[event.api_id for event in events]).in_bulk(field_name='api_id')
+        if any(api_id in existing for api_id in written):
+            invalidate(Event)
+        event_cache.set_many(written.values())
+        event_pks.update({api_id: event.pk for api_id, event in written.items()})
+
+    # Sync the country links of every changed event that lists countries
+    reconcile_m2m(Event.countries, {
+        event_pks[item['id']]: {country.pk for country in country_objs}
+        for item, status, country_objs in processed if status != 'unchanged' and country_objs
+    })
+
+    logger.debug("Wrote page of %s changed events (%s unchanged), %s disaster types and %s countries", len(events), len(processed) - len(events), len(dtypes), len(countries))
+    return [(item, status) for item, status, country_objs in processed]
+
+
+def upsert_disaster_types(dtypes_data):
+    """
+    Create or update disaster types in bulk.
+    Returns a dict mapping disaster type api_id to DisasterType objects.
+    """
+    dtypes_data = unique_by_id(dtypes_data, 'disaster type')
+    if not dtypes_data:
+        return {}
+
+    # Disaster types have no content hash, so compare the cached fields
+    dtypes = disaster_type_cache.get_many((data['id'] for data in dtypes_data), fresh=True)
+    changed = [
+        DisasterType(api_id=data['id'], **defaults)
+        for data, defaults in ((data, disaster_type_defaults(data)) for data in dtypes_data)
+        if data['id'] not in dtypes
+        or any(getattr(dtypes[data['id']], field) != value for field, value in defaults.items())
+    ]
+    changed.sort(key=lambda dtype: dtype.api_id)
+    if changed:
+        DisasterType.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=['api_id'],
+            update_fields=DISASTER_TYPE_UPDATE_FIELDS,
+        )
+        written = DisasterType.objects.filter(api_id__in=[dtype.api_id for dtype in changed]).in_bulk(field_name='api_id')
+        if any(api_id in dtypes for api_id in written):
+            invalidate(DisasterType)
+        disaster_type_cache.set_many(written.values())
+        dtypes.update(written)
+    return dtypes
+
+
+def disaster_type_defaults(dtype_data):
+    """
+    Map disaster type data from the API to DisasterType model fields.
+    """
+    return {
+        'name': dtype_data.get('name', 'Unknown'),
+        'summary': dtype_data.get('summary', ''),
+        'translation_module_original_language': dtype_data.get('translation_module_original_language')
+    }
+
+
+def event_defaults(event_data, dtype_obj):
+    """
+    Map event data from the API to Event model fields.
+    """
+    return {
+        'name': event_data.get('name', 'Unknown'),
+        'summary': event_data.get('summary', ''),
+        'dtype': dtype_obj,
+        'ifrc_severity_level': event_data.get('ifrc_severity_level'),
+        'ifrc_severity_level_display': event_data.get('ifrc_severity_level_display'),
+        'glide': event_data.get('glide', ''),
+        'disaster_start_date': parse_datetime(event_data.get('disaster_start_date')),
+        'created_at': parse_datetime(event_data.get('created_at')) or timezone.now(),
+        'active_deployments': event_data.get('active_deployments', 0)
+    }
+
+
+def event_hash_values(event_data, defaults, country_objs):
+    """
+    Return the values the content hash of an event is computed from.
+    The raw created_at is hashed so a missing value does not change the hash
+    on every run.
+    """
+    return {
+        **defaults,
+        'dtype': defaults['dtype'].api_id if defaults['dtype'] else None,
+        'created_at': event_data.get('created_at'),
+        'countries': sorted(country.api_id for country in country_objs),
+    }
+
+
+class EventResolver:
+    """
+    Resolves the event IDs referenced by surge alerts to Event objects.
+
+    Events missing from the database are collected and fetched from the API
+    concurrently, outside of any database transaction, then upserted in bulk.
+    IDs the API answers with 404 are kept in the shared 'reference' cache
+    for settings.IFRC_EVENT_NOT_FOUND_TTL seconds so no worker requests them
+    again on every run. One resolver is meant to be shared by all pages of a run.
+    With fetch=False only the database is consulted, as when replaying the
+    page archive offline.
+    """
+
+    def __init__(self, concurrency=None, fetch=True):
+        self.concurrency = concurrency or settings.IFRC_FETCH_CONCURRENCY
+        self.fetch = fetch
+        self.events = {}
+
+    def resolve(self, event_ids):
+        """
+        Return a dict mapping each resolvable event ID to its Event object.
+        """
+        event_ids = set(event_ids) - {None}
+        wanted = event_ids - set(self.events)
+        if wanted:
+            self.events.update(event_cache.get_many(wanted, fresh=True))
+
+        if self.fetch:
+            missing = wanted - set(self.events) - self.known_not_found(wanted - set(self.events))
+            if missing:
+                self.fetch_missing(missing)
+
+        return {event_id: self.events[event_id] for event_id in event_ids if event_id in self.events}
+
+    def known_not_found(self, event_ids):
+        """
+        Return the IDs that recently came back as 404 from the API.
+        """
+        if not event_ids:
+            return set()
+        keys = {not_found_cache_key(event_id): event_id for event_id in event_ids}
+        found = shared_cache(lambda shared: shared.get_many(list(keys)), {})
+        return {keys[key] for key in found}
+
+    def fetch_missing(self, event_ids):
+        """
+        Fetch events from the API concurrently and upsert them in bulk.
+        """
+        event_ids = sorted(event_ids)
+        logger.info("Fetching %s unknown events from the API", len(event_ids))
+
+        payloads = []
+        not_found = []
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(event_ids)), thread_name_prefix='ifrc-event') as executor:
+            for event_id, (status, data) in zip(event_ids, executor.map(fetch_event_payload, event_ids)):
+                if status == 'ok':
+                    payloads.append(data)
+                elif status == 'not_found':
+                    not_found.append(event_id)
+
+        if not_found:
+            logger.warning("Events not found in the API: %s", not_found)
+            shared_cache(lambda shared: shared.set_many({not_found_cache_key(event_id): True for event_id in not_found},
+                                                        timeout=settings.IFRC_EVENT_NOT_FOUND_TTL))
+
+        if payloads:
+            process_event_results(payloads)
+            self.events.update(event_cache.get_many((data['id'] for data in payloads if data.get('id')), fresh=True))
+
+
+def fetch_event_payload(event_id):
+    """
+    Fetch a single event from the IFRC API.
+
+    Returns:
+        (status, data) tuple, status being 'ok', 'not_found' or 'error'
+    """
+    try:
+        response = get_client().get(f"{settings.IFRC_EVENT_API_URL}{event_id}/")
+        if response.status_code == 404:
+            return 'not_found', None
+        response.raise_for_status()
+        return 'ok', response.json()
+    except Exception as e:
+        logger.exception("Error fetching event %s from API: %s", event_id, e)
+        return 'error', None
+
+
+def not_found_cache_key(event_id):
+    return f"surge:event-not-found:{event_id}"
 
 
 def process_disaster_type(dtype_data):
@@ -494,30 +1419,29 @@ def process_disaster_type(dtype_data):
         return None
 
     if not dtype_data.get('id'):
-        logger.warning(f"Disaster type data missing ID: {dtype_data}")
+        logger.warning("Disaster type data missing ID: %s", dtype_data)
         return None
 
-    logger.debug(f"Processing disaster type with ID: {dtype_data['id']}")
-
     try:
+        defaults = disaster_type_defaults(dtype_data)
+        dtype = disaster_type_cache.get(dtype_data['id'], fresh=True)
+        if dtype is not None and all(getattr(dtype, field) == value for field, value in defaults.items()):
+            return dtype
+
         dtype, created = DisasterType.objects.update_or_create(
             api_id=dtype_data['id'],
-            defaults={
-                'name': dtype_data.get('name', 'Unknown'),
-                'summary': dtype_data.get('summary', ''),
-                'translation_module_original_language': dtype_data.get('translation_module_original_language')
-            }
+            defaults=defaults
         )
+        if not created:
+            invalidate(DisasterType)
+        disaster_type_cache.set_many([dtype])
 
         if created:
-            logger.info(f"Created new disaster type: {dtype.name} (ID: {dtype.api_id})")
-        else:
-            logger.debug(f"Updated existing disaster type: {dtype.name} (ID: {dtype.api_id})")
+            logger.info("Created new disaster type: %s (ID: %s)", dtype.name, dtype.api_id)
 
         return dtype
     except Exception as e:
-        logger.error(f"Error processing disaster type with ID {dtype_data.get('id')}: {e}")
-        logger.exception("Full exception details:")
+        logger.error("Error processing disaster type with ID %s: %s", dtype_data.get('id'), e, exc_info=sample_debug())
         return None
 
 
@@ -530,45 +1454,36 @@ def process_event(event_data, dtype_obj, country_objs):
         return None
 
     if not event_data.get('id'):
-        logger.warning(f"Event data missing ID: {event_data}")
+        logger.warning("Event data missing ID: %s", event_data)
         return None
 
-    logger.debug(f"Processing event with ID: {event_data['id']}")
+    # Decide once per record whether its debug lines are logged
+    verbose = sample_debug()
 
     try:
-        event, created = Event.objects.update_or_create(
-            api_id=event_data['id'],
-            defaults={
-                'name': event_data.get('name', 'Unknown'),
-                'summary': event_data.get('summary', ''),
-                'dtype': dtype_obj,
-                'ifrc_severity_level': event_data.get('ifrc_severity_level'),
-                'ifrc_severity_level_display': event_data.get('ifrc_severity_level_display'),
-                'glide': event_data.get('glide', ''),
-                'disaster_start_date': parse_datetime(event_data.get('disaster_start_date')),
-                'created_at': parse_datetime(event_data.get('created_at')) or timezone.now(),
-                'active_deployments': event_data.get('active_deployments', 0)
-            }
-        )
-
-        # Add countries
-        if country_objs:
-            logger.debug(f"Adding {len(country_objs)} countries to event ID: {event_data['id']}")
-            event.countries.clear()
-            for country in country_objs:
-                event.countries.add(country)
+        defaults = event_defaults(event_data, dtype_obj)
+        hash_values = event_hash_values(event_data, defaults, country_objs)
+        event, created, changed = update_or_create_if_changed(Event, event_data['id'], defaults, hash_values, event_cache)
 
-        # Mark if created or updated for reporting
+        # Mark if created, updated or unchanged for reporting
         event_data['_created'] = created
-        event_data['_updated'] = not created
+        event_data['_updated'] = changed and not created
+        event_data['_unchanged'] = not changed
 
-        if created:
-            logger.info(f"Created new event: {event.name} (ID: {event.api_id})")
-        else:
-            logger.info(f"Updated event: {event.name} (ID: {event.api_id})")
+        if not changed:
+            if verbose:
+                logger.debug("Event %s is unchanged, skipping", event.api_id)
+            return event
+
+        # Sync countries, only adding and removing the links that differ
+        if country_objs:
+            reconcile_m2m(Event.countries, {event.pk: {country.pk for country in country_objs}})
+
+        if verbose:
+            logger.debug("%s event: %s (ID: %s), %s countries",
+                         'Created' if created else 'Updated', event.name, event.api_id, len(country_objs))
 
         return event
     except Exception as e:
-        logger.error(f"Error processing event with ID {event_data.get('id')}: {e}")
-        logger.exception("Full exception details:")
+        logger.error("Error processing event with ID %s: %s", event_data.get('id'), e, exc_info=sample_debug())
         return None
@@ -0,0 +1,198 @@
+"""
+Per-run telemetry for the ingestion tasks.
+
+Every run of fetch_surge_alerts, fetch_events and fetch_airports is recorded
+as an IngestRun row with its timings, HTTP and SQL counters, row counts and
+peak memory, and charted on the IngestRun admin page.
+"""
+import logging
+import os
+import threading
+import time
+from django.db import connection
+from django.utils import timezone
+from .client import get_client, percentile
+from .models import IngestRun
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """
+    Counts the SQL queries run on a connection and the time spent in them.
+    Install it with connection.execute_wrapper(counter).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class IngestRecorder:
+    """
+    Records one run of an ingestion task as an IngestRun row.
+
+    Usage:
+        with IngestRecorder('fetch_surge_alerts') as recorder:
+            result = ...
+            return recorder.finish(result)
+
+    The result dict is read for the 'created', 'updated', 'unchanged',
+    'failed', 'pages', 'pages_not_modified', 'bytes_avoided', 'full', 'skipped',
+    'dispatched' and 'succeeded' keys.
+    SQL queries are counted on the calling thread's connection, which is
+    where the ingestion tasks write. HTTP counters cover every request made
+    through the shared client during the run, including those of nested runs.
+
+    Peak memory is the growth of the process's resident set size during the
+    run: RSS is sampled by an RssSampler and the highest sample is stored
+    less the RSS the run started with.
+    """
+
+    def __init__(self, task):
+        self.task = task
+        self.run = None
+        self.result = None
+        self.queries = QueryCounter()
+        self._wrapper = None
+        self._started = None
+        self._client_start = None
+        self.rss = RssSampler()
+
+    def __enter__(self):
+        self.rss.start()
+        self._started = time.perf_counter()
+        self._client_start = get_client().stats.snapshot()
+        self.run = IngestRun.objects.create(task=self.task)
+        self._wrapper = connection.execute_wrapper(self.queries)
+        self._wrapper.__enter__()
+        return self
+
+    def finish(self, result):
+        """
+        Remember the task result for the run record and return it unchanged.
+        """
+        self.result = result
+        return result
+
+    def __exit__(self, exc_type, exc, tb):
+        self._wrapper.__exit__(exc_type, exc, tb)
+        self.rss.stop()
+        try:
+            self.save(exc)
+        except Exception as e:
+            logger.error("Could not record ingest run of %s: %s", self.task, e)
+        return False
+
+    def save(self, exc=None):
+        run = self.run
+        result = self.result or {}
+        stats = get_client().stats
+        client_end = stats.snapshot()
+        requests = client_end['requests'] - self._client_start['requests']
+        latencies = sorted(stats.recent_latencies(requests))
+
+        run.finished_at = timezone.now()
+        run.duration = time.perf_counter() - self._started
+        run.full = result.get('full')
+        run.pages = result.get('pages') or 0
+        run.requests = requests
+        run.bytes_downloaded = client_end['bytes_received'] - self._client_start['bytes_received']
+        run.latency_p50 = percentile(latencies, 50)
+        run.latency_p95 = percentile(latencies, 95)
+        run.latency_p99 = percentile(latencies, 99)
+        run.created = result.get('created', 0)
+        run.updated = result.get('updated', 0)
+        run.unchanged = result.get('unchanged', 0)
+        run.failed = result.get('failed', 0)
+        run.pages_not_modified = result.get('pages_not_modified', 0)
+        run.bytes_avoided = result.get('bytes_avoided', 0)
+        run.query_count = self.queries.count
+        run.query_time = self.queries.seconds
+        run.peak_rss = self.rss.growth()
+
+        if exc is not None:
+            run.status = 'failed'
+            run.error = f"{type(exc).__name__}: {exc}"
+        elif result.get('skipped'):
+            run.status = 'skipped'
+        elif result.get('dispatched') is not None:
+            run.status = 'dispatched'
+        elif result.get('succeeded', True):
+            run.status = 'succeeded'
+        else:
+            run.status = 'failed'
+
+        run.save()
+        logger.info("Recorded ingest run %s of %s: %s in %.2fs, %s queries, %s requests",
+                    run.pk, self.task, run.status, run.duration, run.query_count, run.requests)
+
+
+class RssSampler:
+    """
+    Samples the resident set size of the process in a background thread
+    between start() and stop(), and keeps the highest sample.
+
+    Reading /proc/self/statm costs a few microseconds, so sampling does not
+    slow the run down the way tracing every allocation would. Where there is
+    no /proc, growth() is None.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.start_rss = None
+        self.peak_rss = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.start_rss = self.peak_rss = current_rss()
+        if self.start_rss is None:
+            return
+        self._thread = threading.Thread(target=self._sample, name='rss-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        self._observe()
+
+    def growth(self):
+        """
+        Return how many bytes the peak RSS was above the RSS at start().
+        """
+        if self.start_rss is None:
+            return None
+        return max(self.peak_rss - self.start_rss, 0)
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            self._observe()
+
+    def _observe(self):
+        rss = current_rss()
+        if rss is not None and rss > self.peak_rss:
+            self.peak_rss = rss
+
+
+def current_rss():
+    """
+    Return the current resident set size of the process in bytes, or None
+    where /proc/self/statm is not available.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
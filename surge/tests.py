@@ -0,0 +1,740 @@
+"""
+Tests for the surge app.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock, skipUnless
+import requests
+from redis.exceptions import LockNotOwnedError
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from . import cache as reference_cache
+from .archive import load_page, prune_archive
+from .cache import country_cache, clear_local, invalidate, version_key
+from .client import CircuitBreaker, CircuitOpenError, HttpClient
+from .fake_api import FakeIfrcApi
+from .locks import SyncLock
+from .log import DebugSampler, QueueListenerHandler
+from .models import ApiStatus, ArchivedPage, Country, Event, IngestRun, PageValidator, SurgeAlert
+from .pagination import iter_pages
+from .pipeline import PagePipeline
+from .relations import reconcile_m2m
+from .signals import alerts_ingested
+from .sync import SeenIds, reconcile_deletions
+from .tasks import (EventResolver, fetch_surge_alerts, finish_fanout_sync, not_found_cache_key,
+                    process_results_individually, write_alert_page, write_event_page)
+from .telemetry import IngestRecorder
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves the responses queued on the server, one per request.
+    """
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        status = self.server.responses.pop(0) if self.server.responses else 200
+        body = json.dumps({'status': status}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpClientTests(SimpleTestCase):
+    """
+    Tests for the shared HTTP client against a local stand-in server.
+    """
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.server.responses = []
+        self.server.paths = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/api/v2/event/'
+        self.client = HttpClient(timeout=2, max_retries=2, backoff_factor=0, failure_threshold=3, reset_timeout=60)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retries_server_errors(self):
+        self.server.responses = [503, 502]
+        self.assertEqual(self.client.get_json(self.url), {'status': 200})
+        stats = self.client.stats.snapshot()
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['retries'], 2)
+        self.assertIsNotNone(stats['latency_p95'])
+
+    def test_does_not_retry_client_errors(self):
+        self.server.responses = [404]
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(self.server.paths), 1)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        self.server.responses = [500] * 3
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 500)
+        with self.assertRaises(CircuitOpenError):
+            self.client.get(self.url)
+        self.assertEqual(len(self.server.paths), 3)
+        self.assertEqual(self.client.stats.snapshot()['rejected'], 1)
+
+    def test_circuit_closes_after_successful_trial(self):
+        self.server.responses = [500] * 3
+        self.client.get(self.url)
+        self.client.breaker(self.url).reset_timeout = 0
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.breaker(self.url).state, CircuitBreaker.CLOSED)
+
+    def test_unexpected_error_in_trial_reopens_circuit(self):
+        self.server.responses = [500] * 3
+        self.client.get(self.url)
+        self.client.breaker(self.url).reset_timeout = 0
+        with mock.patch.object(self.client.session, 'get', side_effect=requests.TooManyRedirects):
+            with self.assertRaises(requests.TooManyRedirects):
+                self.client.get(self.url)
+        self.assertEqual(self.client.breaker(self.url).state, CircuitBreaker.OPEN)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_circuit_is_per_host(self):
+        self.server.responses = [500] * 3
+        self.client.get(self.url)
+        with self.assertRaises(CircuitOpenError):
+            self.client.get(self.url)
+        other = f'http://localhost:{self.server.server_port}/api/v2/event/'
+        self.assertEqual(self.client.get(other).status_code, 200)
+
+    def test_reuses_connections(self):
+        for _ in range(3):
+            self.client.get(self.url)
+        pool = self.client.session.get_adapter(self.url).poolmanager.connection_from_url(self.url)
+        self.assertEqual(pool.num_connections, 1)
+
+
+class IterPagesTests(SimpleTestCase):
+    """
+    Tests for the sequential and parallel page fetching modes.
+    """
+
+    def setUp(self):
+        self.api = FakeIfrcApi(alerts=420, latency=0.02)
+        self.api.start()
+        self.addCleanup(self.api.stop)
+
+    def fetch(self, mode):
+        return [
+            (number, [record['id'] for record in data['results']])
+            for number, _, data in iter_pages(self.api.alert_url, mode=mode, page_size=50, concurrency=3)
+        ]
+
+    def test_parallel_mode_matches_sequential_mode(self):
+        sequential = self.fetch('sequential')
+        self.api.peak_in_flight = 0
+
+        parallel = self.fetch('parallel')
+        self.assertEqual([number for number, _ in parallel], list(range(1, 10)))
+        self.assertEqual(parallel, sequential)
+        self.assertEqual(sum(len(ids) for _, ids in parallel), 420)
+        self.assertGreater(self.api.peak_in_flight, 1)
+        self.assertLessEqual(self.api.peak_in_flight, 3)
+
+
+class PagePipelineTests(SimpleTestCase):
+    """
+    Tests for the producer/consumer page pipeline.
+    """
+
+    def test_yields_pages_in_order(self):
+        pages = [(n, f'page-{n}', {'results': [n]}) for n in range(1, 6)]
+        pipeline = PagePipeline(iter(pages), depth=2)
+        self.assertEqual(list(pipeline), pages)
+        self.assertEqual(pipeline.timings()['pages'], 5)
+
+    def test_reraises_fetch_errors(self):
+        def pages():
+            yield 1, 'page-1', {}
+            raise ValueError('bad page')
+
+        seen = []
+        with self.assertRaises(ValueError):
+            for page in PagePipeline(pages(), depth=1):
+                seen.append(page[0])
+        self.assertEqual(seen, [1])
+
+    def test_stops_producer_when_consumer_exits(self):
+        produced = []
+
+        def pages():
+            for n in range(1, 100):
+                produced.append(n)
+                yield n, f'page-{n}', {}
+
+        for page in PagePipeline(pages(), depth=1):
+            break
+        self.assertLess(len(produced), 5)
+
+
+class CollectingHandler(logging.Handler):
+    """
+    Keeps the formatted messages and the thread that handled them.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+        self.threads.add(threading.current_thread().name)
+
+
+class LoggingTests(SimpleTestCase):
+    """
+    Tests for the queued logging handler and the debug sampler.
+    """
+
+    def setUp(self):
+        self.logger = logging.getLogger('surge.tests.logging')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+
+    def test_queue_handler_formats_on_listener_thread(self):
+        target = CollectingHandler()
+        handler = QueueListenerHandler([target])
+        self.logger.addHandler(handler)
+        try:
+            self.logger.info("page %s of %d", 'alerts', 3)
+        finally:
+            self.logger.removeHandler(handler)
+            handler.stop()
+
+        self.assertEqual(target.messages, ['page alerts of 3'])
+        self.assertNotIn(threading.current_thread().name, target.threads)
+
+    @override_settings(SURGE_LOG_SAMPLE_EVERY=10)
+    def test_sampler_lets_one_in_every_n_through(self):
+        sample = DebugSampler(self.logger)
+        self.assertEqual(sum(sample() for _ in range(100)), 10)
+
+    def test_sampler_is_off_when_debug_is_disabled(self):
+        self.logger.setLevel(logging.INFO)
+        sample = DebugSampler(self.logger, every=1)
+        self.assertFalse(any(sample() for _ in range(10)))
+        self.assertEqual(sample.count, 0)
+
+
+class ReconcileM2MTests(TestCase):
+    """
+    Tests for the set-difference sync of many-to-many links.
+    """
+
+    def setUp(self):
+        self.api = FakeIfrcApi(alerts=0, events=40)
+        self.countries = Country.objects.bulk_create([Country(api_id=i, name=f'Country {i}') for i in range(1, 6)])
+
+    def event_page(self, event_ids, country_ids):
+        events = []
+        for event_id in event_ids:
+            event = self.api.event(event_id)
+            event['dtype'] = {'id': 1, 'name': 'Flood'}
+            event['countries'] = [{'id': i, 'name': f'Country {i}'} for i in country_ids]
+            events.append(event)
+        return events
+
+    def count_queries(self, func, *args):
+        with CaptureQueriesContext(connection) as queries:
+            func(*args)
+        return len(queries)
+
+    def test_only_writes_the_difference(self):
+        event = Event.objects.create(api_id=1, name='Event 1', created_at='2020-01-01T00:00:00Z')
+        first, second, third = self.countries[:3]
+        event.countries.add(first, second)
+        kept = Event.countries.through.objects.get(event=event, country=first).pk
+
+        with self.assertNumQueries(3):
+            added, removed = reconcile_m2m(Event.countries, {event.pk: {first.pk, third.pk}})
+
+        self.assertEqual((added, removed), (1, 1))
+        self.assertEqual(set(event.countries.values_list('pk', flat=True)), {first.pk, third.pk})
+        self.assertEqual(Event.countries.through.objects.get(event=event, country=first).pk, kept)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(reconcile_m2m(Event.countries, {event.pk: {first.pk, third.pk}}), (0, 0))
+
+    def test_event_page_queries_do_not_grow_with_page_size(self):
+        # Create the disaster type and countries first so both pages only write events and links
+        write_event_page(self.event_page([100], [1, 2, 3]))
+
+        small = self.count_queries(write_event_page, self.event_page(range(1, 6), [1, 2]))
+        large = self.count_queries(write_event_page, self.event_page(range(6, 46), [1, 2]))
+        self.assertEqual(small, large)
+
+        # Changing the countries of every event rewrites only the differing links
+        small = self.count_queries(write_event_page, self.event_page(range(1, 6), [2, 3]))
+        large = self.count_queries(write_event_page, self.event_page(range(6, 46), [2, 3]))
+        self.assertEqual(small, large)
+        links = Event.countries.through.objects.exclude(event__api_id=100)
+        self.assertEqual(links.count(), 90)
+        self.assertFalse(links.filter(country__api_id=1).exists())
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'reference': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'reference-tests'},
+    },
+    REFERENCE_CACHE_VERSION_CHECK=0,
+)
+class ReferenceCacheTests(TestCase):
+    """
+    Tests for the two-tier reference data cache.
+    """
+
+    def setUp(self):
+        reference_cache._shared_down_until = 0.0
+        caches['reference'].clear()
+        clear_local()
+        self.country = Country.objects.create(api_id=1, name='Country 1')
+
+    def warm(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            country_cache.get(1)
+
+    def test_repeated_lookups_skip_the_database(self):
+        self.warm()
+        before = country_cache.stats()
+        with self.assertNumQueries(0):
+            self.assertEqual(country_cache.get(1), self.country)
+        self.assertEqual(country_cache.stats()['local_hits'], before['local_hits'] + 1)
+
+        # Another process only finds the entry in the shared tier
+        clear_local()
+        with self.assertNumQueries(0):
+            self.assertEqual(country_cache.get(1), self.country)
+        self.assertEqual(country_cache.stats()['shared_hits'], before['shared_hits'] + 1)
+
+    def test_version_bump_drops_every_copy(self):
+        self.warm()
+        Country.objects.filter(pk=self.country.pk).update(name='Renamed')
+
+        # Another process invalidated the model after changing the row
+        caches['reference'].incr(version_key(Country))
+        with self.assertNumQueries(1):
+            self.assertEqual(country_cache.get(1).name, 'Renamed')
+
+    @override_settings(REFERENCE_CACHE_VERSION_CHECK=60)
+    def test_write_path_lookups_check_the_version(self):
+        self.warm()
+        Country.objects.filter(pk=self.country.pk).update(name='Renamed')
+        caches['reference'].incr(version_key(Country))
+
+        # Read-only lookups may serve the old copy until the next version check
+        with self.assertNumQueries(0):
+            self.assertEqual(country_cache.get(1).name, 'Country 1')
+        with self.assertNumQueries(1):
+            self.assertEqual(country_cache.get(1, fresh=True).name, 'Renamed')
+
+    def test_invalidate_waits_for_commit(self):
+        self.warm()
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate(Country)
+            with self.assertNumQueries(0):
+                country_cache.get(1)
+        with self.assertNumQueries(1):
+            country_cache.get(1)
+
+    def test_rolled_back_rows_are_not_cached(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Country.objects.create(api_id=2, name='Country 2')
+                    country_cache.get(2)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        self.assertIsNone(country_cache.get(2))
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'reference': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'resolver-tests'},
+    },
+    REFERENCE_CACHE_VERSION_CHECK=0,
+)
+class EventResolverTests(TestCase):
+    """
+    Tests for resolving the events referenced by surge alerts.
+    """
+
+    def setUp(self):
+        self.api = FakeIfrcApi(alerts=0, events=30)
+        self.api.start()
+        self.addCleanup(self.api.stop)
+        self.settings = override_settings(IFRC_EVENT_API_URL=self.api.event_url, IFRC_FETCH_CONCURRENCY=4)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        reference_cache._shared_down_until = 0.0
+        caches['reference'].clear()
+        clear_local()
+
+    def test_known_events_are_looked_up_in_one_batch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            events = EventResolver().resolve(range(1, 11))
+        self.assertEqual(sorted(events), list(range(1, 11)))
+        self.assertEqual(self.api.requests, 10)
+
+        # A later run finds every event in the database with a single query
+        caches['reference'].clear()
+        clear_local()
+        with self.assertNumQueries(1):
+            events = EventResolver().resolve([*range(1, 11), None])
+        self.assertEqual(sorted(events), list(range(1, 11)))
+        self.assertEqual(self.api.requests, 10)
+
+    def test_missing_events_are_not_requested_again(self):
+        events = EventResolver().resolve([1, 998, 999])
+        self.assertEqual(list(events), [1])
+        self.assertEqual(self.api.requests, 3)
+        self.assertTrue(caches['reference'].get(not_found_cache_key(998)))
+        self.assertTrue(caches['reference'].get(not_found_cache_key(999)))
+
+        # Another worker sees the 404s in the shared cache
+        clear_local()
+        self.assertEqual(EventResolver().resolve([998, 999]), {})
+        self.assertEqual(self.api.requests, 3)
+
+
+class IngestRecorderTests(TestCase):
+    """
+    Tests for the per-run ingestion telemetry.
+    """
+
+    def test_records_counts_and_queries(self):
+        with IngestRecorder('fetch_test') as recorder:
+            Country.objects.count()
+            recorder.finish({'created': 2, 'updated': 1, 'unchanged': 5, 'full': True, 'succeeded': True})
+        run = IngestRun.objects.get(task='fetch_test')
+        self.assertEqual((run.status, run.created, run.updated, run.unchanged, run.full),
+                         ('succeeded', 2, 1, 5, True))
+        self.assertGreaterEqual(run.query_count, 1)
+        self.assertIsNotNone(run.finished_at)
+
+    def test_records_failures(self):
+        with self.assertRaises(ValueError):
+            with IngestRecorder('fetch_test'):
+                raise ValueError('bad page')
+        run = IngestRun.objects.get(task='fetch_test')
+        self.assertEqual((run.status, run.error), ('failed', 'ValueError: bad page'))
+
+    @skipUnless(os.path.exists('/proc/self/statm'), 'RSS is read from /proc')
+    def test_peak_rss_is_measured_per_run(self):
+        with IngestRecorder('fetch_test') as recorder:
+            block = b'x' * (64 * 1024 * 1024)
+            time.sleep(0.2)
+            del block
+            recorder.finish({})
+        with IngestRecorder('fetch_test') as recorder:
+            recorder.finish({})
+        first, second = IngestRun.objects.filter(task='fetch_test').order_by('pk').values_list('peak_rss', flat=True)
+        self.assertGreaterEqual(first, 60 * 1024 * 1024)
+        self.assertLess(second, 16 * 1024 * 1024)
+
+
+class StandInRedis:
+    """
+    In-memory stand-in for the Redis lock primitives used by SyncLock.
+    """
+
+    def __init__(self):
+        self.leases = {}
+
+    def lock(self, key, timeout, thread_local=True):
+        return StandInRedisLock(self, key, timeout)
+
+    def ttl(self, key):
+        token, expires = self.leases.get(key, (None, 0))
+        return expires - time.monotonic()
+
+
+class StandInRedisLock:
+    def __init__(self, redis, key, timeout):
+        self.redis = redis
+        self.key = key
+        self.timeout = timeout
+        # SyncLock creates its locks with thread_local=False
+        self.local = SimpleNamespace(token=None)
+
+    def owner(self):
+        token, expires = self.redis.leases.get(self.key, (None, 0))
+        return token if expires > time.monotonic() else None
+
+    def acquire(self, blocking=True, blocking_timeout=None):
+        if self.owner() is not None:
+            return False
+        self.local.token = uuid.uuid4().hex.encode()
+        self.redis.leases[self.key] = (self.local.token, time.monotonic() + self.timeout)
+        return True
+
+    def extend(self, additional_time, replace_ttl=False):
+        if self.owner() != self.local.token:
+            raise LockNotOwnedError("Cannot extend a lock that's no longer owned")
+        self.redis.leases[self.key] = (self.local.token, time.monotonic() + additional_time)
+        return True
+
+    def release(self):
+        if self.owner() != self.local.token:
+            raise LockNotOwnedError("Cannot release a lock that's no longer owned")
+        del self.redis.leases[self.key]
+
+
+class SyncLockTests(TestCase):
+    """
+    Tests for the sync task lock against an in-memory Redis stand-in.
+    """
+
+    def setUp(self):
+        self.redis = StandInRedis()
+        patcher = mock.patch('surge.locks.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_second_run_is_skipped_while_lock_is_held(self):
+        lock = SyncLock('fetch_surge_alerts')
+        self.assertTrue(lock.acquire())
+        self.assertFalse(SyncLock('fetch_surge_alerts').acquire())
+
+        with mock.patch('surge.tasks.get_client') as client:
+            result = fetch_surge_alerts(full=True)
+        self.assertTrue(result['skipped'])
+        client.assert_not_called()
+        self.assertEqual(IngestRun.objects.get().status, 'skipped')
+
+        lock.release()
+        self.assertTrue(SyncLock('fetch_surge_alerts').acquire())
+
+    def test_heartbeat_renews_the_lease(self):
+        lock = SyncLock('fetch_surge_alerts', lease=0.3)
+        self.assertTrue(lock.acquire())
+        with lock.heartbeat():
+            time.sleep(0.6)
+            self.assertFalse(SyncLock('fetch_surge_alerts').acquire())
+        # Without the heartbeat the lease runs out
+        time.sleep(0.4)
+        self.assertTrue(SyncLock('fetch_surge_alerts').acquire())
+
+    def test_handed_over_lock_is_renewed_and_released_by_callbacks(self):
+        lock = SyncLock('fetch_surge_alerts')
+        self.assertTrue(lock.acquire())
+        state = lock.handover(600)
+        self.assertGreater(self.redis.ttl(lock.key), 590)
+
+        # The callback of a chord followed by another keeps the lock
+        finish_fanout_sync([], 'events', False, 0, lock=state, release=False)
+        self.assertFalse(SyncLock('fetch_surge_alerts').acquire())
+
+        summary = finish_fanout_sync([], 'surge_alerts', False, 0, lock=state)
+        self.assertIsNotNone(summary['lock']['hold'])
+        self.assertTrue(SyncLock('fetch_surge_alerts').acquire())
+
+
+class IngestTests(TestCase):
+    """
+    Tests for fetch_surge_alerts against the local IFRC API stand-in.
+    """
+
+    def setUp(self):
+        self.api = FakeIfrcApi(alerts=300, events=30)
+        self.api.start()
+        self.archive_dir = tempfile.mkdtemp()
+        self.settings = override_settings(
+            IFRC_API_URL=self.api.alert_url,
+            IFRC_EVENT_API_URL=self.api.event_url,
+            IFRC_PAGE_SIZE=50,
+            IFRC_EXECUTION_MODE='local',
+            IFRC_ARCHIVE_DIR=self.archive_dir,
+        )
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.api.stop()
+        shutil.rmtree(self.archive_dir)
+
+    def test_full_sync_creates_every_record(self):
+        result = fetch_surge_alerts(full=True)
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (300, 0, 0))
+        self.assertEqual(SurgeAlert.objects.count(), 300)
+        self.assertEqual(Event.objects.count(), 30)
+        self.assertEqual(SurgeAlert.objects.filter(event__isnull=True).count(), 0)
+        self.assertEqual(SurgeAlert.objects.get(api_id=1).molnix_tags.count(), 2)
+
+    def test_second_sync_leaves_unchanged_records_alone(self):
+        fetch_surge_alerts(full=True)
+        result = fetch_surge_alerts(full=True)
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (0, 0, 300))
+
+    def test_unmodified_pages_are_not_downloaded_again(self):
+        fetch_surge_alerts(full=True)
+        self.assertEqual(PageValidator.objects.filter(resource='surge_alerts').count(), 6)
+        SurgeAlert.objects.filter(api_id=10).update(deleted_at=timezone.now())
+
+        result = fetch_surge_alerts(full=True)
+        self.assertEqual(result['pages_not_modified'], 6)
+        self.assertGreater(result['bytes_avoided'], 0)
+        self.assertEqual(self.api.not_modified, 7)
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (0, 0, 300))
+        # The stored record IDs still feed the deletion reconciliation
+        self.assertIsNone(SurgeAlert.objects.get(api_id=10).deleted_at)
+
+        # A changed page is downloaded and processed again
+        self.api.alerts = 301
+        result = fetch_surge_alerts(full=True)
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(SurgeAlert.objects.count(), 301)
+
+    def test_written_alerts_are_announced(self):
+        announced = []
+
+        def receiver(sender, created, updated, initial, **kwargs):
+            announced.append((len(created), len(updated), initial))
+
+        alerts_ingested.connect(receiver)
+        self.addCleanup(alerts_ingested.disconnect, receiver)
+        fetch_surge_alerts(full=True)
+        fetch_surge_alerts(full=True)
+        self.api.alerts = 301
+        fetch_surge_alerts(full=False)
+        self.assertEqual(announced, [(300, 0, True), (1, 0, False)])
+
+    def test_parallel_fetch_mode_writes_every_record(self):
+        with override_settings(IFRC_FETCH_MODE='parallel', IFRC_FETCH_CONCURRENCY=3):
+            result = fetch_surge_alerts(full=True)
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (300, 0, 0))
+        self.assertEqual(SurgeAlert.objects.count(), 300)
+        self.assertLessEqual(self.api.peak_in_flight, 3)
+
+    def test_delta_sync_starts_from_cursor(self):
+        fetch_surge_alerts(full=True)
+        status = ApiStatus.objects.get(name='surge_alerts')
+        self.assertEqual(status.cursor_timestamp, parse_datetime(self.api.alert(300)['created_at']))
+
+        result = fetch_surge_alerts(full=False)
+        self.assertFalse(result['full'])
+        # Only the records inside the two hour overlap window, one per minute,
+        # are requested again
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (0, 0, 121))
+
+    def test_bulk_and_fallback_writes_hash_alerts_alike(self):
+        def page():
+            alerts = [self.api.alert(api_id) for api_id in range(1, 4)]
+            # A repeated tag must not change the hash
+            alerts[0]['molnix_tags'].append(alerts[0]['molnix_tags'][0])
+            return alerts
+
+        written = write_alert_page(page(), {})
+        self.assertEqual([status for _, status in written], ['created'] * 3)
+        alerts = page()
+        process_results_individually(alerts, {})
+        self.assertTrue(all(item['_unchanged'] for item in alerts))
+
+        SurgeAlert.objects.all().delete()
+        alerts = page()
+        process_results_individually(alerts, {})
+        self.assertTrue(all(item['_created'] for item in alerts))
+        written = write_alert_page(page(), {})
+        self.assertEqual([status for _, status in written], ['unchanged'] * 3)
+        self.assertEqual(SurgeAlert.objects.get(api_id=1).molnix_tags.count(), 2)
+
+    def test_failed_fanout_dispatch_releases_lock(self):
+        with mock.patch('surge.tasks.SyncLock.release') as release, \
+                mock.patch('surge.tasks.chain') as dispatch:
+            dispatch.return_value.apply_async.side_effect = ConnectionError('Broker unavailable')
+            with self.assertRaises(ConnectionError):
+                fetch_surge_alerts(full=True, mode='fanout')
+        release.assert_called_once()
+
+    def test_fanout_lease_covers_every_dispatched_page(self):
+        redis = StandInRedis()
+        with mock.patch('surge.locks.get_redis', return_value=redis), \
+                mock.patch('surge.tasks.chain') as dispatch, \
+                override_settings(IFRC_SYNC_LOCK_LEASE=120, IFRC_FANOUT_LOCK_LEASE_PER_PAGE=10):
+            fetch_surge_alerts(full=True, mode='fanout')
+        dispatch.return_value.apply_async.assert_called_once()
+        # 1 page of events and 6 pages of alerts
+        self.assertAlmostEqual(redis.ttl('surge:lock:fetch_surge_alerts'), 190, delta=5)
+
+    def test_full_sync_soft_deletes_records_gone_upstream(self):
+        fetch_surge_alerts(full=True)
+        self.api.alerts = 250
+
+        # A delta sync cannot tell removed records from old ones
+        self.assertEqual(fetch_surge_alerts(full=False)['deleted'], 0)
+
+        result = fetch_surge_alerts(full=True)
+        self.assertEqual(result['deleted'], 50)
+        self.assertEqual(SurgeAlert.objects.filter(deleted_at__isnull=False).count(), 50)
+        self.assertIsNotNone(SurgeAlert.objects.get(api_id=251).deleted_at)
+
+        # Records that come back upstream are restored
+        self.api.alerts = 300
+        fetch_surge_alerts(full=True)
+        self.assertFalse(SurgeAlert.objects.filter(deleted_at__isnull=False).exists())
+
+    def test_pages_are_archived_and_replayed_offline(self):
+        fetch_surge_alerts(full=True)
+        pages = ArchivedPage.objects.filter(resource='surge_alerts')
+        self.assertEqual(pages.count(), 6)
+        self.assertEqual(ArchivedPage.objects.filter(resource='events').count(), 1)
+        self.assertEqual(len(load_page(pages.get(page=1).path)['results']), 50)
+
+        SurgeAlert.objects.all().delete()
+        Event.objects.all().delete()
+        requests_before = self.api.requests
+        call_command('replay_ingest', processes=1, stdout=open(os.devnull, 'w'))
+
+        self.assertEqual(self.api.requests, requests_before)
+        self.assertEqual(SurgeAlert.objects.count(), 300)
+        self.assertEqual(SurgeAlert.objects.filter(event__isnull=True).count(), 0)
+
+    def test_expired_pages_are_pruned(self):
+        fetch_surge_alerts(full=True)
+        path = ArchivedPage.objects.filter(resource='surge_alerts').first().path
+        ArchivedPage.objects.filter(resource='surge_alerts').update(fetched_at=timezone.now() - timedelta(days=90))
+
+        self.assertEqual(prune_archive(), 6)
+        self.assertFalse(os.path.exists(os.path.join(self.archive_dir, path)))
+        self.assertEqual(ArchivedPage.objects.count(), 1)
+
+    def test_incomplete_sync_deletes_nothing(self):
+        fetch_surge_alerts(full=True)
+
+        # The API reported more records than the run saw
+        seen = SeenIds(range(1, 101))
+        seen.expected = 300
+        self.assertIsNone(reconcile_deletions('surge_alerts', SurgeAlert, seen))
+        self.assertFalse(SurgeAlert.objects.filter(deleted_at__isnull=False).exists())
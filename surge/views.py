@@ -2,10 +2,12 @@
 Views for the surge app.
 """
 import json
+from django.http import Http404
 from django.shortcuts import render
 from django.views.generic import ListView, DetailView
 from django.utils import timezone
 from .models import SurgeAlert, Country, MolnixTag, Event
+from .cache import country_cache, molnix_tag_cache, event_cache
 
 
 class SurgeAlertListView(ListView):
@@ -22,23 +24,26 @@ class SurgeAlertListView(ListView):
         """
         Get the list of items for this view.
         Filter by country, status, or tag if provided in GET parameters.
+        Alerts that were removed upstream are hidden.
         """
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().filter(deleted_at__isnull=True)
 
-        # Filter by country if provided
+        # Filter by country if provided, resolving its api_id from the cache
         country_id = self.request.GET.get('country')
         if country_id:
-            queryset = queryset.filter(country__api_id=country_id)
+            country = country_cache.get(to_api_id(country_id))
+            queryset = queryset.filter(country=country) if country else queryset.none()
 
         # Filter by status if provided
         status = self.request.GET.get('status')
         if status:
             queryset = queryset.filter(molnix_status_display=status)
 
-        # Filter by tag if provided
+        # Filter by tag if provided, resolving its api_id from the cache
         tag_id = self.request.GET.get('tag')
         if tag_id:
-            queryset = queryset.filter(molnix_tags__api_id=tag_id)
+            tag = molnix_tag_cache.get(to_api_id(tag_id))
+            queryset = queryset.filter(molnix_tags=tag) if tag else queryset.none()
 
         return queryset
 
@@ -48,7 +53,7 @@ class SurgeAlertListView(ListView):
         """
         context = super().get_context_data(**kwargs)
         context['countries'] = Country.objects.all().order_by('name')
-        context['statuses'] = SurgeAlert.objects.values_list(
+        context['statuses'] = SurgeAlert.objects.filter(deleted_at__isnull=True).values_list(
             'molnix_status_display', flat=True
         ).distinct().order_by('molnix_status_display')
         context['tags'] = MolnixTag.objects.all().order_by('name')
@@ -62,6 +67,7 @@ class SurgeAlertDetailView(DetailView):
     model = SurgeAlert
     template_name = 'surge/surge_alert_detail.html'
     context_object_name = 'alert'
+    queryset = SurgeAlert.objects.filter(deleted_at__isnull=True)
 
     def get_object(self, queryset=None):
         """
@@ -72,7 +78,10 @@ class SurgeAlertDetailView(DetailView):
             queryset = self.get_queryset()
 
         api_id = self.kwargs.get('api_id')
-        return queryset.get(api_id=api_id)
+        try:
+            return queryset.get(api_id=api_id)
+        except SurgeAlert.DoesNotExist:
+            raise Http404("No surge alert found with this ID")
 
     def get_context_data(self, **kwargs):
         """
@@ -140,13 +149,16 @@ class EventDetailView(DetailView):
     def get_object(self, queryset=None):
         """
         Get the object this view is displaying.
-        Use the api_id from the URL instead of the primary key.
+        Use the api_id from the URL instead of the primary key, looked up in
+        the reference cache.
         """
-        if queryset is None:
-            queryset = self.get_queryset()
+        if queryset is not None:
+            return queryset.get(api_id=self.kwargs.get('api_id'), deleted_at__isnull=True)
 
-        api_id = self.kwargs.get('api_id')
-        return queryset.get(api_id=api_id)
+        event = event_cache.get(self.kwargs.get('api_id'))
+        if event is None or event.deleted_at:
+            raise Http404("No event found with this ID")
+        return event
 
     def get_context_data(self, **kwargs):
         """
@@ -156,6 +168,16 @@ class EventDetailView(DetailView):
         event = self.object
 
         # Get related surge alerts
-        context['surge_alerts'] = SurgeAlert.objects.filter(event=event).order_by('-created_at')
+        context['surge_alerts'] = SurgeAlert.objects.filter(event=event, deleted_at__isnull=True).order_by('-created_at')
 
         return context
+
+
+def to_api_id(value):
+    """
+    Convert an api_id taken from the query string to an int, or None.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
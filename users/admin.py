@@ -4,7 +4,10 @@ Admin configuration for the users app.
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from .models import Language, Region, UserProfile, Airport, LanguageProficiency
+from .models import Language, Region, UserProfile, Airport, LanguageProficiency, Notification
+from .airport_index import airports_changed
+from .feed import rebuild_user_feed
+from .matching import profiles_changed
 
 
 @admin.register(Language)
@@ -25,6 +28,19 @@ class AirportAdmin(admin.ModelAdmin):
     search_fields = ('name', 'city', 'iata_code')
     list_filter = ('country',)
 
+    # Rebuild the airport search indexes after every change
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        airports_changed()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        airports_changed()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        airports_changed()
+
 
 @admin.register(LanguageProficiency)
 class LanguageProficiencyAdmin(admin.ModelAdmin):
@@ -32,6 +48,28 @@ class LanguageProficiencyAdmin(admin.ModelAdmin):
     list_filter = ('language', 'proficiency')
     search_fields = ('user_profile__user__username', 'language__name')
 
+    # Languages are bit columns of the candidate matrix
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        profiles_changed()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        profiles_changed()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        profiles_changed()
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('user_profile', 'alert', 'channel', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('channel', 'status')
+    search_fields = ('user_profile__user__username', 'alert__message')
+    readonly_fields = ('created_at', 'sent_at')
+    raw_id_fields = ('user_profile', 'alert')
+
 
 class UserProfileInline(admin.StackedInline):
     model = UserProfile
@@ -49,6 +87,20 @@ class UserAdmin(BaseUserAdmin):
                          for lang_prof in obj.profile.language_proficiencies.all()])
     get_languages.short_description = 'Languages'
 
+    # The profile decides which alerts are in the user's feed
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        rebuild_user_feed(form.instance.profile)
+        profiles_changed()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        profiles_changed()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        profiles_changed()
+
 
 # Re-register UserAdmin
 admin.site.unregister(User)
@@ -0,0 +1,216 @@
+"""
+In-memory autocomplete index over the Airport table.
+
+The airport search behind the profile form's Select2 widget is called on
+every keystroke. Matching with icontains on three columns scans the whole
+table each time, so instead every process keeps a sorted array of the
+word-start suffixes of airport names and cities ("john f kennedy intl",
+"f kennedy intl", "kennedy intl", "intl") and answers prefix queries by
+binary search, with no database query at all.
+
+The index is built in one query, countries joined, the first time it is
+used. It is rebuilt when the Airport version in the shared 'reference'
+cache changes: call airports_changed() after writing airports, as
+fetch_airports and the Airport admin do.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+import unicodedata
+from django.conf import settings
+from django.db import transaction
+from surge.cache import invalidate, shared_cache, version_key
+from .models import Airport
+
+logger = logging.getLogger(__name__)
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+_indexes = []
+
+
+def normalize(text):
+    """
+    Return text lowercased, without accents and with every run of
+    punctuation or whitespace turned into a single space.
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(' ', text.casefold()).strip()
+
+
+class AirportIndex:
+    """
+    Immutable prefix index over a snapshot of the airports.
+
+    Airports are numbered in name order, so ties within a rank are broken
+    by sorting plain integers.
+
+    Args:
+        airports: Iterable of (id, iata_code, name, city, country_name) tuples
+    """
+
+    def __init__(self, airports):
+        self.airports = sorted(airports, key=lambda airport: (normalize(airport[2]), airport[1]))
+        self.by_code = {}
+        self.haystacks = []
+        starts = []
+        words = []
+        for position, (pk, iata_code, name, city, country_name) in enumerate(self.airports):
+            self.by_code[iata_code.lower()] = position
+            fields = (normalize(name), normalize(city))
+            self.haystacks.append(' | '.join((iata_code.lower(),) + fields))
+            for field in fields:
+                starts.append((field, position))
+                for match in re.finditer(' ', field):
+                    words.append((field[match.end():], position))
+        starts.sort()
+        words.sort()
+        self.codes = sorted(self.by_code)
+        self.starts = [suffix for suffix, _ in starts]
+        self.start_positions = [position for _, position in starts]
+        self.words = [suffix for suffix, _ in words]
+        self.word_positions = [position for _, position in words]
+
+    def __len__(self):
+        return len(self.airports)
+
+    def search(self, query, limit=20):
+        """
+        Return the airports matching query, best matches first.
+
+        An exact IATA code comes first, then airports whose code, name or
+        city starts with the query, then those with a word of the name or
+        city starting with it, then those containing it anywhere. Ties are
+        broken by airport name. Each rank is only looked at when the better
+        ones did not fill the limit.
+
+        Returns:
+            List of (id, iata_code, name, city, country_name) tuples
+        """
+        query = normalize(query)
+        if not query or limit <= 0:
+            return []
+        found = []
+        taken = set()
+
+        def take(positions):
+            for position in sorted(set(positions) - taken):
+                if len(found) >= limit:
+                    break
+                found.append(position)
+                taken.add(position)
+            return len(found) >= limit
+
+        if query in self.by_code and take([self.by_code[query]]):
+            return self.results(found)
+
+        prefixed = self.prefixed(self.starts, self.start_positions, query)
+        if len(query) <= 3:
+            prefixed += [self.by_code[code] for code in self.prefixed(self.codes, self.codes, query)]
+        if take(prefixed) or take(self.prefixed(self.words, self.word_positions, query)):
+            return self.results(found)
+
+        take(position for position, haystack in enumerate(self.haystacks) if query in haystack)
+        return self.results(found)
+
+    def results(self, positions):
+        return [self.airports[position] for position in positions]
+
+    @staticmethod
+    def prefixed(keys, values, prefix):
+        """
+        Return the values whose sorted keys start with prefix.
+        """
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + '\uffff', start)
+        return values[start:end]
+
+
+class RefreshingIndex:
+    """
+    Holds an index built from a table, building it on first use and
+    rebuilding it once the model's version in the shared cache changed.
+
+    Processes check the version at most every
+    settings.REFERENCE_CACHE_VERSION_CHECK seconds, like the reference data
+    caches of the surge app.
+
+    Args:
+        build: Callable returning a new index
+        model: The model whose version the index follows
+    """
+
+    def __init__(self, build, model=Airport):
+        self.build = build
+        self.model = model
+        self.index = None
+        self.built_version = None
+        self.version = None
+        self.version_checked = 0.0
+        self.lock = threading.Lock()
+        _indexes.append(self)
+
+    def get(self):
+        """
+        Return the current index, rebuilding it if the table changed.
+        """
+        version = self.current_version()
+        if self.index is None or self.built_version != version:
+            with self.lock:
+                if self.index is None or self.built_version != version:
+                    started = time.perf_counter()
+                    self.index = self.build()
+                    self.built_version = version
+                    logger.info("Built %s over %s %s in %.3fs", type(self.index).__name__, len(self.index),
+                                self.model._meta.verbose_name_plural, time.perf_counter() - started)
+        return self.index
+
+    def current_version(self):
+        now = time.monotonic()
+        if self.version is None or now - self.version_checked >= settings.REFERENCE_CACHE_VERSION_CHECK:
+            version = shared_cache(lambda c: c.get_or_set(version_key(self.model), 1, timeout=None))
+            self.version = version if version is not None else (self.version or 1)
+            self.version_checked = now
+        return self.version
+
+    def clear(self):
+        with self.lock:
+            self.index = None
+            self.built_version = None
+            self.version = None
+
+
+def build_airport_index():
+    return AirportIndex(Airport.objects.values_list('id', 'iata_code', 'name', 'city', 'country__name').order_by('id'))
+
+
+def indexes_changed(model):
+    """
+    Have every process rebuild its indexes of a model once the current
+    transaction commits.
+    """
+    invalidate(model)
+    # This process rebuilds straight away, even if the shared cache is down
+    transaction.on_commit(lambda: [index.clear() for index in _indexes if index.model is model])
+
+
+def airports_changed():
+    """
+    Have every process rebuild its airport indexes once the current
+    transaction commits. Call it after airports were written or deleted.
+    """
+    indexes_changed(Airport)
+
+
+airport_index = RefreshingIndex(build_airport_index)
+
+
+def search_airports(query, limit=20):
+    """
+    Return up to limit (id, iata_code, name, city, country_name) tuples of
+    the airports matching query, best matches first.
+    """
+    return airport_index.get().search(query, limit)
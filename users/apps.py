@@ -6,4 +6,8 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'users'
\ No newline at end of file
+    name = 'users'
+
+    def ready(self):
+        # Connect the alerts_ingested handler that writes the alert feeds
+        from . import signals  # noqa: F401
@@ -0,0 +1,143 @@
+"""
+Materialised "alerts for me" feed of every user.
+
+The feed is written when alerts are ingested (fan-out on write) rather than
+matched when it is read: on the alerts_ingested signal the created and
+updated alerts are scored against all profiles with a CandidateMatrix (see
+users/matching.py) and one AlertFeedEntry row is stored per matching user
+and alert. Reading a feed is then a single query on the
+(user_profile, -alert_created_at) index.
+
+An alert is in a user's feed when the user has one of its qualified profile
+tags and speaks at least one of its languages, as far as the alert names
+any, and did not restrict its country. Alerts created more than
+settings.ALERT_FEED_MAX_AGE ago are left out.
+
+A profile edit changes which alerts match it, so the profile views call
+rebuild_user_feed(). rebuild_alert_feeds() rebuilds every feed and is run by
+the rebuild_alert_feeds command.
+"""
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from surge.models import SurgeAlert
+from .matching import PROFILE, SOME_LANGUAGE, CandidateMatrix
+from .models import AlertFeedEntry, UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Score bits an alert must match for it to be in a feed
+FEED_REQUIRED = PROFILE | SOME_LANGUAGE
+
+# Number of alerts read, and of entries written, per query
+BATCH_SIZE = 1000
+
+
+def feed_alerts():
+    """
+    Return the alerts that belong in feeds, with what scoring them needs.
+    """
+    return (
+        SurgeAlert.objects.filter(deleted_at__isnull=True, created_at__gte=timezone.now() - settings.ALERT_FEED_MAX_AGE)
+        .select_related('country')
+        .prefetch_related('molnix_tags')
+        .order_by('pk')
+    )
+
+
+def feed_entries(matrix, alerts):
+    """
+    Yield the unsaved AlertFeedEntry rows of the profiles of a matrix for
+    some alerts.
+    """
+    for alert in alerts:
+        for slot, score in matrix.scored(alert, required=FEED_REQUIRED):
+            yield AlertFeedEntry(user_profile_id=matrix.profile_id(slot), alert_id=alert.pk, score=score,
+                                 alert_created_at=alert.created_at)
+
+
+def write_entries(entries):
+    """
+    Insert feed entries in batches of BATCH_SIZE and return their number.
+    """
+    written = 0
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            AlertFeedEntry.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        AlertFeedEntry.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def update_alert_feeds(api_ids):
+    """
+    Rebuild the feed entries of some alerts for every user.
+
+    Args:
+        api_ids: API IDs of the alerts that were created or updated
+
+    Returns:
+        The number of feed entries written
+    """
+    api_ids = list(api_ids)
+    if not api_ids:
+        return 0
+    matrix = CandidateMatrix()
+    written = 0
+    with transaction.atomic():
+        for i in range(0, len(api_ids), BATCH_SIZE):
+            batch = api_ids[i:i + BATCH_SIZE]
+            AlertFeedEntry.objects.filter(alert__api_id__in=batch).delete()
+            written += write_entries(feed_entries(matrix, feed_alerts().filter(api_id__in=batch)))
+        pruned, _ = AlertFeedEntry.objects.filter(
+            alert_created_at__lt=timezone.now() - settings.ALERT_FEED_MAX_AGE).delete()
+    logger.info("Wrote %s feed entries for %s alerts and %s profiles, pruned %s", written, len(api_ids), len(matrix), pruned)
+    return written
+
+
+def rebuild_user_feed(profile):
+    """
+    Rebuild the feed of one user profile from every feed alert.
+
+    Returns:
+        The number of feed entries written
+    """
+    matrix = CandidateMatrix(UserProfile.objects.filter(pk=profile.pk))
+    with transaction.atomic():
+        AlertFeedEntry.objects.filter(user_profile=profile).delete()
+        written = write_entries(feed_entries(matrix, feed_alerts().iterator(chunk_size=BATCH_SIZE)))
+    logger.debug("Rebuilt the alert feed of %s with %s entries", profile, written)
+    return written
+
+
+def rebuild_alert_feeds():
+    """
+    Rebuild the feeds of every user from every feed alert.
+
+    Returns:
+        The number of feed entries written
+    """
+    matrix = CandidateMatrix()
+    with transaction.atomic():
+        AlertFeedEntry.objects.all().delete()
+        written = write_entries(feed_entries(matrix, feed_alerts().iterator(chunk_size=BATCH_SIZE)))
+    logger.info("Rebuilt the alert feeds of %s profiles with %s entries", len(matrix), written)
+    return written
+
+
+def alert_feed(profile):
+    """
+    Return the feed entries of a profile, newest alert first, with their
+    alerts and countries.
+    """
+    return (
+        AlertFeedEntry.objects.filter(user_profile=profile, alert__deleted_at__isnull=True)
+        .select_related('alert', 'alert__country')
+        .order_by('-alert_created_at')
+    )
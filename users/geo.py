@@ -0,0 +1,142 @@
+"""
+In-memory nearest-airport index over the Airport coordinates.
+
+Airports are stored as points on the unit sphere, (x, y, z), in a k-d tree.
+The straight-line (chord) distance between two such points grows with the
+great-circle distance, so the nearest points in the tree are the nearest
+airports, without special cases at the poles or across the antimeridian.
+
+The tree is kept in flat lists in implicit layout: the airports of every
+subtree occupy a contiguous slice, with its root at the middle of the slice.
+Like the autocomplete index it is built once per process, in one query, and
+rebuilt after airports_changed().
+"""
+import heapq
+import math
+from .airport_index import RefreshingIndex
+from .models import Airport
+
+# Mean radius of the Earth, in km
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_point(latitude, longitude):
+    """
+    Return the (x, y, z) point on the unit sphere of a latitude and longitude
+    in degrees.
+    """
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def chord_to_km(chord):
+    """
+    Return the great-circle distance in km of a chord length on the unit sphere.
+    """
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+class NearestAirportIndex:
+    """
+    Immutable k-d tree over a snapshot of the airports with coordinates.
+
+    Args:
+        airports: Iterable of (id, iata_code, name, city, country_name,
+            latitude, longitude) tuples
+    """
+
+    def __init__(self, airports):
+        items = [(to_point(airport[5], airport[6]), airport) for airport in airports]
+        self.points = [None] * len(items)
+        self.airports = [None] * len(items)
+        self.place(items, 0, len(items), 0)
+
+    def __len__(self):
+        return len(self.airports)
+
+    def place(self, items, lo, hi, axis):
+        """
+        Lay out items[lo:hi] as the subtree splitting on axis.
+        """
+        if lo >= hi:
+            return
+        items[lo:hi] = sorted(items[lo:hi], key=lambda item: item[0][axis])
+        mid = (lo + hi) // 2
+        self.points[mid], self.airports[mid] = items[mid]
+        self.place(items, lo, mid, (axis + 1) % 3)
+        self.place(items, mid + 1, hi, (axis + 1) % 3)
+
+    def nearest(self, latitude, longitude, k=5, max_distance=None):
+        """
+        Return the k airports closest to a point, nearest first.
+
+        Args:
+            latitude: Latitude in degrees
+            longitude: Longitude in degrees
+            k: Number of airports to return
+            max_distance: Only return airports within this many km
+
+        Returns:
+            List of ((id, iata_code, name, city, country_name, latitude,
+            longitude), distance in km) tuples
+        """
+        if k <= 0 or not self.points:
+            return []
+        target = to_point(latitude, longitude)
+        limit = math.inf
+        if max_distance is not None:
+            # Squared chord length of the distance, capped at the diameter
+            limit = (2 * math.sin(min(max_distance / EARTH_RADIUS_KM, math.pi) / 2)) ** 2
+        # Max-heap of (-squared distance, slot) of the best candidates so far
+        best = []
+        points = self.points
+
+        def visit(lo, hi, axis):
+            nonlocal limit
+            if lo >= hi:
+                return
+            mid = (lo + hi) // 2
+            point = points[mid]
+            distance = ((point[0] - target[0]) ** 2 + (point[1] - target[1]) ** 2
+                        + (point[2] - target[2]) ** 2)
+            if distance <= limit:
+                heapq.heappush(best, (-distance, mid))
+                if len(best) > k:
+                    heapq.heappop(best)
+                if len(best) == k:
+                    limit = -best[0][0]
+
+            offset = target[axis] - point[axis]
+            near, far = ((lo, mid), (mid + 1, hi)) if offset < 0 else ((mid + 1, hi), (lo, mid))
+            next_axis = (axis + 1) % 3
+            visit(near[0], near[1], next_axis)
+            # The other side can only hold closer points if the splitting plane is closer
+            if offset * offset <= limit:
+                visit(far[0], far[1], next_axis)
+
+        visit(0, len(points), 0)
+        return [
+            (self.airports[slot], chord_to_km(math.sqrt(-distance)))
+            for distance, slot in sorted(best, reverse=True)
+        ]
+
+
+def build_nearest_airport_index():
+    return NearestAirportIndex(
+        Airport.objects.filter(latitude__isnull=False, longitude__isnull=False)
+        .values_list('id', 'iata_code', 'name', 'city', 'country__name', 'latitude', 'longitude')
+        .order_by('id')
+    )
+
+
+nearest_airport_index = RefreshingIndex(build_nearest_airport_index)
+
+
+def nearest_airports(latitude, longitude, k=5, max_distance=None):
+    """
+    Return the k airports closest to a latitude and longitude, nearest first,
+    as ((id, iata_code, name, city, country_name, latitude, longitude),
+    distance in km) tuples.
+    """
+    return nearest_airport_index.get().nearest(latitude, longitude, k, max_distance)
@@ -0,0 +1,18 @@
+"""
+Management command to rebuild the "alerts for me" feed of every user.
+
+The feeds are kept up to date as alerts are ingested and profiles edited,
+so this is only needed to fill them the first time, or after profiles or
+the matching rules were changed outside the app.
+"""
+from django.core.management.base import BaseCommand
+from users.feed import rebuild_alert_feeds
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the alert feeds of all users from the current alerts and profiles'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding alert feeds...')
+        written = rebuild_alert_feeds()
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt alert feeds with {written} entries'))
@@ -0,0 +1,51 @@
+"""
+Management command to send the notifications of recent surge alerts.
+
+Runs the notification pipeline of users/notifications.py in this process,
+without Celery: the notifications of the alerts created in the last
+--hours hours (or of the --alerts given) that were not sent yet are queued
+and sent in batches, and the throughput is reported in notifications per
+second. Only the channels with a backend configured are notified. With the
+file backend (NOTIFICATION_*_BACKEND set to users.notifications.FileBackend)
+it measures the pipeline without sending anything, and marks the
+notifications sent, so only use it on development databases.
+"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from surge.models import SurgeAlert
+from users.notifications import queue_notifications, send_batch
+
+
+class Command(BaseCommand):
+    help = 'Send the pending notifications of recent surge alerts and report the throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Notify about the alerts created in the last N hours')
+        parser.add_argument('--alerts', type=int, nargs='+', help='API IDs of the alerts to notify about')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Notifications per batch (default: NOTIFICATION_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        api_ids = options['alerts']
+        if not api_ids:
+            since = timezone.now() - timedelta(hours=options['hours'])
+            api_ids = list(SurgeAlert.objects.filter(created_at__gte=since, deleted_at__isnull=True)
+                           .values_list('api_id', flat=True))
+        size = options['batch_size'] or settings.NOTIFICATION_BATCH_SIZE
+
+        started = time.perf_counter()
+        pending = queue_notifications(api_ids)
+        queued = time.perf_counter() - started
+        self.stdout.write(f'Queued {len(pending)} notifications for {len(api_ids)} alerts in {queued:.2f}s')
+
+        sent = 0
+        for i in range(0, len(pending), size):
+            sent += send_batch(pending[i:i + size])['sent']
+        seconds = time.perf_counter() - started
+        rate = sent / seconds if seconds else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {sent} notifications in {seconds:.2f}s ({rate:.0f} notifications/s)'
+        ))
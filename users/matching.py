@@ -0,0 +1,274 @@
+"""
+Ranking of the registered users against a surge alert.
+
+A CandidateMatrix loads every active profile in a handful of queries and
+stores each attribute value as one bit column: a Python int whose bit i is
+set when profile i has that value (a qualified profile tag, a language at
+working proficiency, a preferred region, a restricted country, a rotation).
+Scoring an alert is then a few AND/OR operations over whole columns, which
+run over all profiles at once at C speed, with no loop over the users.
+
+The fit of a user is a 5-bit score, one bit per criterion, so sorting by
+score ranks users by the most important criterion first:
+
+    PROFILE        has one of the alert's qualified profile tags
+    ALL_LANGUAGES  speaks every language of the alert's L-* tags
+    SOME_LANGUAGE  speaks at least one of them
+    REGION         prefers the region of the alert's country
+    ROTATION       is available for the alert's rotation
+
+A criterion the alert does not specify is met by everyone. Users who
+restricted the alert's country are never candidates.
+
+Building a matrix reads every profile, so the staff views share one per
+process in candidate_matrix, rebuilt like the airport indexes once the
+UserProfile version in the shared cache changes: call profiles_changed()
+after editing profiles, as the profile views and the user admin do.
+"""
+import re
+from collections import namedtuple
+from .airport_index import RefreshingIndex, indexes_changed
+from .models import LanguageProficiency, Region, UserProfile
+
+# Score bits, most important first
+PROFILE = 16
+ALL_LANGUAGES = 8
+SOME_LANGUAGE = 4
+REGION = 2
+ROTATION = 1
+
+CRITERIA = [
+    (PROFILE, 'Profile'),
+    (ALL_LANGUAGES, 'All languages'),
+    (SOME_LANGUAGE, 'Some language'),
+    (REGION, 'Preferred region'),
+    (ROTATION, 'Rotation'),
+]
+
+# Proficiency levels that count as speaking a language
+WORKING_PROFICIENCIES = ('native', 'expert', 'intermediate')
+
+# Language codes of the L-* Molnix tags
+LANGUAGE_TAG_CODES = {
+    'ENG': 'en',
+    'SPA': 'es',
+    'FRA': 'fr',
+    'ARA': 'ar',
+    'RUS': 'ru',
+    'POR': 'pt',
+    'CHI': 'zh',
+    'ZHO': 'zh',
+}
+
+# Region codes of the IFRC region numbers of Country.region
+REGION_CODES = {0: 'AF', 1: 'AM', 2: 'AP', 3: 'EU', 4: 'MENA'}
+
+# Rotations named by Molnix tags such as "2nd Rotation"
+ROTATION_TAGS = {'1st': 'first', '2nd': 'second', '3rd': 'third', '4th': 'fourth'}
+_ROTATION = re.compile(r'\b(1st|2nd|3rd|4th)\b', re.IGNORECASE)
+
+Candidate = namedtuple('Candidate', 'profile_id user_id username full_name score')
+
+
+class AlertRequirements:
+    """
+    What a surge alert asks for, read from its Molnix tags and country.
+
+    Args:
+        alert: The SurgeAlert
+    """
+
+    def __init__(self, alert):
+        self.tag_ids = []
+        self.language_codes = []
+        self.rotation = None
+        for tag in alert.molnix_tags.all():
+            name = tag.name or ''
+            if name.upper().startswith('L-'):
+                self.language_codes.append(LANGUAGE_TAG_CODES.get(name[2:].upper(), name[2:].lower()))
+            elif _ROTATION.search(name):
+                self.rotation = ROTATION_TAGS[_ROTATION.search(name).group(1).lower()]
+            elif tag.tag_type == 'regular':
+                self.tag_ids.append(tag.id)
+        self.country_id = alert.country_id
+        self.region_code = REGION_CODES.get(alert.country.region) if alert.country_id else None
+
+
+class CandidateMatrix:
+    """
+    Bit columns of the attributes of all active user profiles.
+
+    Build it once to rank several alerts. It is a snapshot: profiles edited
+    afterwards are only seen by a new matrix.
+
+    Args:
+        profiles: Only load these profiles, as a UserProfile queryset,
+            instead of every active one
+    """
+
+    def __init__(self, profiles=None):
+        if profiles is None:
+            profiles = UserProfile.objects.all()
+        self.profiles = list(
+            profiles.filter(user__is_active=True)
+            .order_by('user__username')
+            .values_list('pk', 'user_id', 'user__username', 'user__first_name', 'user__last_name',
+                         'rotation_availability')
+        )
+        slots = {profile[0]: slot for slot, profile in enumerate(self.profiles)}
+        self.all = (1 << len(self.profiles)) - 1
+
+        def columns(pairs):
+            return bit_columns(pairs, slots, len(self.profiles))
+
+        self.tags = columns(UserProfile.qualified_profiles.through.objects.values_list('userprofile_id', 'molnixtag_id'))
+        self.regions = columns(UserProfile.preferred_regions.through.objects.values_list('userprofile_id', 'region_id'))
+        self.restrictions = columns(
+            UserProfile.restricted_countries.through.objects.values_list('userprofile_id', 'country_id'))
+        self.languages = columns(
+            LanguageProficiency.objects.filter(proficiency__in=WORKING_PROFICIENCIES)
+            .values_list('user_profile_id', 'language__code'))
+        self.rotations = columns((profile[0], profile[5]) for profile in self.profiles)
+        self.region_ids = dict(Region.objects.values_list('code', 'pk'))
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def score_bits(self, requirements):
+        """
+        Return the eligible profiles and the column of each score bit for
+        an alert's requirements, as {bit: column}.
+        """
+        everyone = self.all
+        eligible = everyone & ~self.restrictions.get(requirements.country_id, 0)
+
+        profile = everyone
+        if requirements.tag_ids:
+            profile = 0
+            for tag_id in requirements.tag_ids:
+                profile |= self.tags.get(tag_id, 0)
+
+        all_languages = some_language = everyone
+        if requirements.language_codes:
+            spoken = [self.languages.get(code, 0) for code in requirements.language_codes]
+            all_languages, some_language = everyone, 0
+            for column in spoken:
+                all_languages &= column
+                some_language |= column
+
+        region = self.regions.get(self.region_ids.get(requirements.region_code), 0)
+
+        rotation = everyone
+        if requirements.rotation:
+            rotation = self.rotations.get('any', 0) | self.rotations.get(requirements.rotation, 0)
+
+        return eligible, {
+            PROFILE: profile,
+            ALL_LANGUAGES: all_languages,
+            SOME_LANGUAGE: some_language,
+            REGION: region,
+            ROTATION: rotation,
+        }
+
+    def rank(self, alert, limit=100, min_score=1):
+        """
+        Return the candidates for an alert, best first.
+
+        Args:
+            alert: The SurgeAlert
+            limit: Maximum number of candidates, None for all
+            min_score: Leave out users scoring lower than this
+
+        Returns:
+            List of Candidate tuples. Users with the same score are ordered
+            by username.
+        """
+        candidates = []
+        for slot, score in self.scored(alert, min_score):
+            if limit is not None and len(candidates) >= limit:
+                break
+            pk, user_id, username, first_name, last_name, _ = self.profiles[slot]
+            candidates.append(Candidate(pk, user_id, username, f'{first_name} {last_name}'.strip(), score))
+        return candidates
+
+    def scored(self, alert, min_score=1, required=0):
+        """
+        Yield (profile slot, score) for the eligible profiles, best score
+        first, leaving out scores below min_score or missing any of the
+        required score bits.
+        """
+        eligible, columns = self.score_bits(AlertRequirements(alert))
+        for score in range(PROFILE * 2 - 1, max(min_score, 0) - 1, -1):
+            if score & required != required:
+                continue
+            # The users with exactly this score
+            members = eligible
+            for bit, column in columns.items():
+                members &= column if score & bit else ~column
+            for slot in set_bits(members):
+                yield slot, score
+
+    def profile_id(self, slot):
+        return self.profiles[slot][0]
+
+    def restricted(self, alert):
+        """
+        Return the number of users who restricted the alert's country.
+        """
+        return bin(self.restrictions.get(alert.country_id, 0)).count('1')
+
+
+def bit_columns(pairs, slots, size):
+    """
+    Return {value: column} for (profile id, value) pairs, where bit i of a
+    column is set if profile slot i has the value.
+    """
+    positions = {}
+    for profile_id, value in pairs:
+        slot = slots.get(profile_id)
+        if slot is not None:
+            positions.setdefault(value, []).append(slot)
+    columns = {}
+    for value, slot_list in positions.items():
+        column = bytearray((size + 7) // 8)
+        for slot in slot_list:
+            column[slot >> 3] |= 1 << (slot & 7)
+        columns[value] = int.from_bytes(column, 'little')
+    return columns
+
+
+def set_bits(column):
+    """
+    Yield the positions of the set bits of column, lowest first.
+    """
+    digits = bin(column)[:1:-1]
+    position = digits.find('1')
+    while position != -1:
+        yield position
+        position = digits.find('1', position + 1)
+
+
+def score_criteria(score):
+    """
+    Return the names of the criteria met by a score.
+    """
+    return [name for bit, name in CRITERIA if score & bit]
+
+
+candidate_matrix = RefreshingIndex(CandidateMatrix, UserProfile)
+
+
+def profiles_changed():
+    """
+    Have every process rebuild its candidate matrix once the current
+    transaction commits. Call it after profiles, their languages or their
+    users were written or deleted.
+    """
+    indexes_changed(UserProfile)
+
+
+def rank_candidates(alert, limit=100):
+    """
+    Return up to limit Candidate tuples for an alert, best first.
+    """
+    return candidate_matrix.get().rank(alert, limit)
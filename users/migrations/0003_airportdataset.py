@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_remove_userprofile_languages_userprofile_accept_sms_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AirportDataset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=1000)),
+                ('checksum', models.CharField(db_index=True, help_text='SHA-256 of the uncompressed CSV', max_length=64)),
+                ('rows', models.IntegerField(default=0)),
+                ('imported_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-imported_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surge', '0008_pagevalidator'),
+        ('users', '0004_airport_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='saved_alerts',
+            field=models.ManyToManyField(blank=True, related_name='saved_by_users', to='surge.surgealert'),
+        ),
+        migrations.CreateModel(
+            name='AlertFeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveSmallIntegerField(help_text='Match score, see users/matching.py')),
+                ('alert_created_at', models.DateTimeField(db_index=True)),
+                ('alert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='surge.surgealert')),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='users.userprofile')),
+            ],
+            options={
+                'verbose_name_plural': 'Alert Feed Entries',
+                'indexes': [models.Index(fields=['user_profile', '-alert_created_at'], name='users_alert_user_pr_54f375_idx')],
+                'unique_together': {('user_profile', 'alert')},
+            },
+        ),
+    ]
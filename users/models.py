@@ -6,7 +6,7 @@ from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from surge.models import Country, MolnixTag, SurgeAlert
-from django.core.validators import RegexValidator
+from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
 
 
 class Language(models.Model):
@@ -44,11 +44,30 @@ class Airport(models.Model):
             message='IATA code must be 3 uppercase letters',
         )
     ])
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
 
     def __str__(self):
         return f"{self.name} ({self.iata_code})"
 
 
+class AirportDataset(models.Model):
+    """
+    Model to record the airport datasets imported by fetch_airports, so an
+    unchanged dataset is not imported again.
+    """
+    source = models.CharField(max_length=1000)
+    checksum = models.CharField(max_length=64, db_index=True, help_text="SHA-256 of the uncompressed CSV")
+    rows = models.IntegerField(default=0)
+    imported_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-imported_at']
+
+    def __str__(self):
+        return f"{self.source} ({self.imported_at:%Y-%m-%d %H:%M})"
+
+
 class LanguageProficiency(models.Model):
     """
     Model to store language proficiency levels for users.
@@ -104,6 +123,61 @@ class UserProfile(models.Model):
         return f"{self.user.username}'s Profile"
 
 
+class AlertFeedEntry(models.Model):
+    """
+    Model to store the materialised "alerts for me" feed: one row per user
+    profile and surge alert matching it, written by users/feed.py when
+    alerts are ingested or a profile changes.
+    """
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='feed_entries')
+    alert = models.ForeignKey(SurgeAlert, on_delete=models.CASCADE, related_name='feed_entries')
+    score = models.PositiveSmallIntegerField(help_text="Match score, see users/matching.py")
+    # Copy of the alert's created_at, so a feed page is read from the index alone
+    alert_created_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('user_profile', 'alert')
+        indexes = [models.Index(fields=['user_profile', '-alert_created_at'])]
+        verbose_name_plural = 'Alert Feed Entries'
+
+    def __str__(self):
+        return f"{self.alert} for {self.user_profile}"
+
+
+class Notification(models.Model):
+    """
+    Model to store the notifications of new surge alerts, one per user,
+    alert and channel, so no user is notified twice of the same alert on
+    the same channel. Written and sent by users/notifications.py.
+    """
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('sms', 'SMS'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='notifications')
+    alert = models.ForeignKey(SurgeAlert, on_delete=models.CASCADE, related_name='notifications')
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ('user_profile', 'alert', 'channel')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_channel_display()} to {self.user_profile} about {self.alert}"
+
+
 # Signal to create a user profile when a new user is created
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -0,0 +1,269 @@
+"""
+Notifications of newly ingested surge alerts.
+
+At the end of an ingest run the new alerts are matched to users through the
+materialised alert feeds (see users/feed.py), without scoring anything
+again: a Notification row is inserted per feed entry and channel the user
+can be reached on, in set-based queries. The unique (user_profile, alert,
+channel) constraint drops the notifications that already exist, so a user
+is never notified twice of the same alert on the same channel. Only alerts
+still open for applications are notified, and only on the channels that
+have a backend configured.
+
+The pending notifications are then sent in batches of
+settings.NOTIFICATION_BATCH_SIZE by the send_notification_batch Celery task
+(see users/tasks.py), which is rate limited and retries a failed batch.
+A batch first claims its pending notifications by marking them sending
+in one locked update, so a retry that overlaps a batch still running finds
+nothing to send. They are marked sent once the backend accepted them, or
+put back to pending for the retry when it failed.
+
+Each channel is sent through the backend class named in
+settings.NOTIFICATION_BACKENDS, which leaves a channel out when empty:
+
+    EmailBackend    one email per notification over one connection per batch
+    HttpSmsBackend  one request per batch to settings.SMS_GATEWAY_URL
+    FileBackend     JSON lines appended to settings.NOTIFICATION_FILE_PATH,
+                    or printed to stdout when it is '-', for development
+"""
+import json
+import logging
+import sys
+import time
+import requests
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import AlertFeedEntry, Notification
+
+logger = logging.getLogger(__name__)
+
+# Number of alerts read, and of notifications inserted, per query
+QUERY_BATCH_SIZE = 1000
+
+# Who can be reached on each channel, as filters on AlertFeedEntry
+CHANNEL_RECIPIENTS = {
+    'email': {'user_profile__user__is_active': True, 'user_profile__user__email__gt': ''},
+    'sms': {'user_profile__user__is_active': True, 'user_profile__accept_sms': True,
+            'user_profile__phone_number__gt': ''},
+}
+
+
+class NotificationError(Exception):
+    """
+    Raised by a backend when a batch could not be sent.
+    """
+
+
+class NotificationBackend:
+    """
+    Base class of the notification backends.
+
+    send() sends a batch of notifications of one channel, with their
+    user_profile, user and alert loaded, and raises if the batch failed
+    so it is retried.
+    """
+
+    def send(self, notifications):
+        raise NotImplementedError
+
+
+class EmailBackend(NotificationBackend):
+    """
+    Sends emails through Django's configured EMAIL_BACKEND.
+    """
+
+    def send(self, notifications):
+        messages = []
+        for notification in notifications:
+            subject, body = render(notification)
+            messages.append(EmailMessage(subject, body, to=[notification.user_profile.user.email]))
+        with get_connection() as connection:
+            sent = connection.send_messages(messages) or 0
+        if sent < len(messages):
+            raise NotificationError(f"Only {sent} of {len(messages)} emails were sent")
+
+
+class HttpSmsBackend(NotificationBackend):
+    """
+    Posts a batch of text messages as JSON to an HTTP SMS gateway:
+    {"messages": [{"to": "+41...", "body": "..."}, ...]}
+    """
+
+    def __init__(self):
+        if not settings.SMS_GATEWAY_URL:
+            raise NotificationError("SMS_GATEWAY_URL is not set")
+        self.session = requests.Session()
+        if settings.SMS_GATEWAY_TOKEN:
+            self.session.headers['Authorization'] = f'Bearer {settings.SMS_GATEWAY_TOKEN}'
+
+    def send(self, notifications):
+        messages = [
+            {'to': notification.user_profile.phone_number, 'body': render(notification, short=True)[1]}
+            for notification in notifications
+        ]
+        try:
+            response = self.session.post(settings.SMS_GATEWAY_URL, json={'messages': messages}, timeout=(5, 30))
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise NotificationError(f"SMS gateway error: {e}") from e
+
+
+class FileBackend(NotificationBackend):
+    """
+    Writes the notifications as JSON lines to a file, or to stdout.
+    """
+
+    def send(self, notifications):
+        lines = []
+        for notification in notifications:
+            subject, body = render(notification, short=notification.channel == 'sms')
+            lines.append(json.dumps({
+                'channel': notification.channel,
+                'to': recipient(notification),
+                'alert': notification.alert.api_id,
+                'subject': subject,
+                'body': body,
+            }) + '\n')
+        if settings.NOTIFICATION_FILE_PATH == '-':
+            sys.stdout.writelines(lines)
+            sys.stdout.flush()
+            return
+        with open(settings.NOTIFICATION_FILE_PATH, 'a', encoding='utf-8') as f:
+            f.writelines(lines)
+
+
+def enabled_channels():
+    """
+    Return the channels that have a backend configured.
+    """
+    return [channel for channel in CHANNEL_RECIPIENTS if settings.NOTIFICATION_BACKENDS.get(channel)]
+
+
+def get_backend(channel):
+    """
+    Return an instance of the backend configured for a channel.
+    """
+    return import_string(settings.NOTIFICATION_BACKENDS[channel])()
+
+
+def recipient(notification):
+    if notification.channel == 'sms':
+        return notification.user_profile.phone_number
+    return notification.user_profile.user.email
+
+
+def render(notification, short=False):
+    """
+    Return the subject and body of a notification. Short bodies fit in a
+    text message.
+    """
+    alert = notification.alert
+    country = alert.country.name if alert.country else 'no country'
+    subject = f"New surge alert: {alert.message or alert.api_id} ({country})"
+    if short:
+        return subject, subject[:160]
+    lines = [
+        f"A new surge alert matches your profile: {alert.message or alert.api_id}",
+        f"Country: {country}",
+    ]
+    if alert.operation:
+        lines.append(f"Operation: {alert.operation}")
+    if alert.closes:
+        lines.append(f"Applications close: {alert.closes:%Y-%m-%d}")
+    lines.append(f"Alert ID: {alert.api_id}")
+    return subject, '\n'.join(lines)
+
+
+def queue_notifications(api_ids):
+    """
+    Insert the notifications of some new alerts for every user whose feed
+    holds them, on every enabled channel they can be reached on, skipping
+    the alerts closed for applications and the notifications that already
+    exist.
+
+    Args:
+        api_ids: API IDs of the newly created alerts
+
+    Returns:
+        The IDs of the pending notifications of these alerts
+    """
+    api_ids = list(api_ids)
+    is_open = Q(alert__closes__isnull=True) | Q(alert__closes__gt=timezone.now())
+    for i in range(0, len(api_ids), QUERY_BATCH_SIZE):
+        batch = api_ids[i:i + QUERY_BATCH_SIZE]
+        for channel in enabled_channels():
+            matches = AlertFeedEntry.objects.filter(is_open, alert__api_id__in=batch, alert__deleted_at__isnull=True,
+                                                    **CHANNEL_RECIPIENTS[channel]).values_list('user_profile_id',
+                                                                                              'alert_id')
+            Notification.objects.bulk_create(
+                [Notification(user_profile_id=profile_id, alert_id=alert_id, channel=channel)
+                 for profile_id, alert_id in matches],
+                batch_size=QUERY_BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+    pending = []
+    for i in range(0, len(api_ids), QUERY_BATCH_SIZE):
+        pending.extend(Notification.objects.filter(alert__api_id__in=api_ids[i:i + QUERY_BATCH_SIZE], status='pending')
+                       .order_by('pk').values_list('pk', flat=True))
+    return pending
+
+
+def send_batch(ids):
+    """
+    Claim the notifications with these IDs that are still pending and send
+    them.
+
+    Returns:
+        Dict with the number of notifications sent, the seconds it took and
+        the resulting rate
+
+    Raises:
+        The backend's exception if a channel failed. The notifications of
+        that channel go back to pending, with the attempt and the error
+        recorded.
+    """
+    started = time.perf_counter()
+    with transaction.atomic():
+        claimed = list(Notification.objects.select_for_update().filter(pk__in=ids, status='pending')
+                       .order_by('pk').values_list('pk', flat=True))
+        Notification.objects.filter(pk__in=claimed).update(status='sending')
+    notifications = list(
+        Notification.objects.filter(pk__in=claimed)
+        .select_related('user_profile__user', 'alert__country')
+        .order_by('pk')
+    )
+    by_channel = {}
+    for notification in notifications:
+        by_channel.setdefault(notification.channel, []).append(notification)
+
+    sent = set()
+    for channel, batch in by_channel.items():
+        try:
+            get_backend(channel).send(batch)
+        except Exception as e:
+            Notification.objects.filter(pk__in=[n.pk for n in batch]).update(
+                attempts=F('attempts') + 1, error=str(e)[:1000])
+            # Hand this channel and the ones not tried yet back to the retry
+            Notification.objects.filter(pk__in=set(claimed) - sent).update(status='pending')
+            raise
+        Notification.objects.filter(pk__in=[n.pk for n in batch]).update(
+            status='sent', sent_at=timezone.now(), attempts=F('attempts') + 1, error='')
+        sent.update(n.pk for n in batch)
+
+    seconds = time.perf_counter() - started
+    rate = len(sent) / seconds if seconds else 0.0
+    logger.info("Sent %s notifications in %.3fs (%.0f/s)", len(sent), seconds, rate)
+    return {'sent': len(sent), 'seconds': seconds, 'rate': rate}
+
+
+def mark_failed(ids, error):
+    """
+    Give up on the notifications with these IDs that are still pending.
+    """
+    failed = Notification.objects.filter(pk__in=ids, status='pending').update(status='failed', error=str(error)[:1000])
+    logger.error("Gave up on %s notifications: %s", failed, error)
+    return failed
@@ -0,0 +1,31 @@
+"""
+Signal handlers for the users app.
+
+Ingested surge alerts are fanned out to the alert feeds of the users they
+match as soon as they are written (see users/feed.py), and the users are
+then notified of the new ones (see users/notifications.py).
+"""
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import receiver
+from surge.signals import alerts_ingested
+from .feed import update_alert_feeds
+from .tasks import send_alert_notifications
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(alerts_ingested)
+def feed_ingested_alerts(sender, created=(), updated=(), initial=False, **kwargs):
+    """
+    Write the feed entries of the alerts a sync created or updated, then
+    queue the notifications of the created ones, unless the first sync
+    created them along with the rest of the history.
+    """
+    update_alert_feeds(list(created) + list(updated))
+    if created and initial:
+        logger.info("Not notifying users of the %s alerts created by the initial sync", len(created))
+    elif created and settings.NOTIFICATIONS_ENABLED:
+        api_ids = list(created)
+        transaction.on_commit(lambda: send_alert_notifications.delay(api_ids))
@@ -0,0 +1,53 @@
+"""
+Celery tasks for the users app.
+"""
+import logging
+from celery import shared_task
+from django.conf import settings
+from .notifications import mark_failed, queue_notifications, send_batch
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def send_alert_notifications(api_ids):
+    """
+    Notify the matching users of newly created alerts. Queues the
+    notifications that were not sent yet and dispatches them to
+    send_notification_batch in batches of settings.NOTIFICATION_BATCH_SIZE.
+
+    Args:
+        api_ids: API IDs of the newly created alerts
+
+    Returns:
+        Dict with the number of notifications and batches dispatched
+    """
+    pending = queue_notifications(api_ids)
+    size = settings.NOTIFICATION_BATCH_SIZE
+    batches = [pending[i:i + size] for i in range(0, len(pending), size)]
+    for batch in batches:
+        send_notification_batch.delay(batch)
+    logger.info("Dispatched %s notifications for %s new alerts in %s batches", len(pending), len(api_ids), len(batches))
+    return {'notifications': len(pending), 'batches': len(batches)}
+
+
+@shared_task(bind=True, rate_limit=settings.NOTIFICATION_RATE_LIMIT, max_retries=settings.NOTIFICATION_MAX_RETRIES)
+def send_notification_batch(self, ids):
+    """
+    Send a batch of notifications. Throttled to
+    settings.NOTIFICATION_RATE_LIMIT batches per worker, and retried with an
+    exponential backoff when a backend fails; the notifications sent before
+    the failure are not sent again.
+
+    Returns:
+        Dict with the number of notifications sent, the seconds it took and
+        the notifications per second
+    """
+    try:
+        return send_batch(ids)
+    except Exception as e:
+        if self.request.retries >= self.max_retries:
+            mark_failed(ids, e)
+            raise
+        logger.warning("Notification batch of %s failed, retrying: %s", len(ids), e)
+        raise self.retry(exc=e, countdown=settings.NOTIFICATION_RETRY_DELAY * 2 ** self.request.retries)
@@ -0,0 +1,592 @@
+import csv
+import json
+import gzip
+import io
+import math
+import os
+import random
+import shutil
+import tempfile
+from unittest import mock
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from surge import cache as reference_cache
+from django.utils import timezone
+from surge.models import Country, MolnixTag, SurgeAlert
+from surge.signals import alerts_ingested
+from .airport_index import AirportIndex, airport_index, airports_changed, search_airports
+from .feed import alert_feed, rebuild_alert_feeds, rebuild_user_feed
+from .notifications import NotificationError, queue_notifications, send_batch
+from .tasks import send_notification_batch
+from .geo import NearestAirportIndex, chord_to_km, nearest_airports, to_point
+from .matching import (ALL_LANGUAGES, PROFILE, REGION, ROTATION, SOME_LANGUAGE, CandidateMatrix, candidate_matrix,
+                       profiles_changed)
+from .management.commands.fetch_airports import fetch_airports, import_airports
+from .models import AlertFeedEntry, Airport, Notification, AirportDataset, Language, LanguageProficiency, Region, UserProfile
+
+
+def airport_lines(rows):
+    return '\n'.join(['code,name,city,country'] + [','.join(row) for row in rows]) + '\n'
+
+
+def airport_csv(rows):
+    """
+    Return a CSV reader over airport rows given as (code, name, city, country) tuples.
+    """
+    return csv.DictReader(io.StringIO(airport_lines(rows)))
+
+
+class AirportImportTests(TestCase):
+    """
+    Tests for the bulk airport import of fetch_airports.
+    """
+
+    def setUp(self):
+        self.us = Country.objects.create(api_id=1, name='United States of America', iso='US', iso3='USA')
+        self.kenya = Country.objects.create(api_id=2, name='Kenya', iso='KE', iso3='KEN')
+
+    def test_import_creates_and_updates_airports(self):
+        result = import_airports(airport_csv([
+            ('DCA', 'Ronald Reagan Washington National Airport', 'Washington', 'US'),
+            ('NBO', 'Jomo Kenyatta International Airport', 'Nairobi', 'KEN'),
+            ('XX1', 'Invalid code', 'Nowhere', 'US'),
+            ('ABC', 'No country', 'Nowhere', ''),
+        ]))
+        self.assertEqual(result, {'created': 2, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'ignored': 2})
+        self.assertEqual(Airport.objects.get(iata_code='NBO').country, self.kenya)
+
+        result = import_airports(airport_csv([
+            ('DCA', 'Reagan National', 'Arlington', 'US'),
+            ('NBO', 'Jomo Kenyatta International Airport', 'Nairobi', 'KEN'),
+        ]))
+        self.assertEqual(result, {'created': 0, 'updated': 1, 'deleted': 0, 'unchanged': 1, 'ignored': 0})
+        self.assertEqual(Airport.objects.get(iata_code='DCA').city, 'Arlington')
+
+    def test_airports_missing_from_the_dataset_are_deleted(self):
+        import_airports(airport_csv([('DCA', 'Reagan', 'Washington', 'US'), ('NBO', 'Jomo Kenyatta', 'Nairobi', 'KE')]))
+        result = import_airports(airport_csv([('NBO', 'Jomo Kenyatta', 'Nairobi', 'KE')]))
+        self.assertEqual(result['deleted'], 1)
+        self.assertFalse(Airport.objects.filter(iata_code='DCA').exists())
+
+        # A file without a single valid row deletes nothing
+        result = import_airports(airport_csv([('12', 'Broken', '', '')]))
+        self.assertEqual(result['deleted'], 0)
+        self.assertTrue(Airport.objects.filter(iata_code='NBO').exists())
+
+    def test_unchanged_dataset_is_skipped(self):
+        rows = [('DCA', 'Reagan', 'Washington', 'US'), ('NBO', 'Jomo Kenyatta', 'Nairobi', 'KE')]
+        with tempfile.TemporaryDirectory() as directory:
+            plain = os.path.join(directory, 'airports.csv')
+            compressed = os.path.join(directory, 'airports.csv.gz')
+            with open(plain, 'w') as f:
+                f.write(airport_lines(rows))
+            with gzip.open(compressed, 'wt') as f:
+                f.write(airport_lines(rows))
+
+            result = fetch_airports(source=compressed)
+            self.assertEqual(result['created'], 2)
+            self.assertEqual(AirportDataset.objects.get().rows, 2)
+
+            # The same data uncompressed has the same checksum
+            self.assertTrue(fetch_airports(source=plain).get('skipped'))
+            self.assertEqual(fetch_airports(source=plain, force=True)['unchanged'], 2)
+
+            with open(plain, 'w') as f:
+                f.write(airport_lines(rows[:1]))
+            result = fetch_airports(source=plain)
+            self.assertEqual((result['deleted'], result['unchanged']), (1, 1))
+            self.assertEqual(AirportDataset.objects.count(), 3)
+
+    def test_coordinates_are_imported(self):
+        rows = csv.DictReader(io.StringIO(
+            'code,name,latitude,longitude,country,city\n'
+            'NBO,Jomo Kenyatta,-1.3192,36.9278,KE,Nairobi\n'
+            'MBA,Moi,abc,39.5942,KE,Mombasa\n'
+        ))
+        self.assertEqual(import_airports(rows)['created'], 2)
+        nairobi = Airport.objects.get(iata_code='NBO')
+        self.assertEqual((nairobi.latitude, nairobi.longitude), (-1.3192, 36.9278))
+        self.assertIsNone(Airport.objects.get(iata_code='MBA').longitude)
+
+        # A moved airport counts as changed
+        rows = csv.DictReader(io.StringIO('code,name,latitude,longitude,country,city\n'
+                                          'NBO,Jomo Kenyatta,-1.32,36.93,KE,Nairobi\n'))
+        self.assertEqual(import_airports(rows)['updated'], 1)
+        self.assertEqual(Airport.objects.get(iata_code='NBO').latitude, -1.32)
+
+    def test_unknown_country_is_created_once(self):
+        import_airports(airport_csv([
+            ('GVA', 'Geneva Airport', 'Geneva', 'CH'),
+            ('ZRH', 'Zurich Airport', 'Zurich', 'CH'),
+        ]))
+        switzerland = Country.objects.get(iso='CH')
+        self.assertEqual(switzerland.name, 'Switzerland')
+        self.assertLess(switzerland.api_id, 0)
+        self.assertEqual(Airport.objects.filter(country=switzerland).count(), 2)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        rows = [(f"A{chr(65 + i // 26)}{chr(65 + i % 26)}", f'Airport {i}', 'City', 'US') for i in range(500)]
+        with CaptureQueriesContext(connection) as queries:
+            result = import_airports(airport_csv(rows))
+        self.assertEqual(result['created'], 500)
+        self.assertLess(len(queries), 10)
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'reference': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'airport-tests'},
+    },
+    REFERENCE_CACHE_VERSION_CHECK=0,
+)
+class AirportIndexTests(TestCase):
+    """
+    Tests for the in-memory airport autocomplete index.
+    """
+
+    def setUp(self):
+        reference_cache._shared_down_until = 0.0
+        caches['reference'].clear()
+        airport_index.clear()
+        self.us = Country.objects.create(api_id=1, name='United States of America', iso='US', iso3='USA')
+        for iata_code, name, city in [
+            ('JFK', 'John F Kennedy International Airport', 'New York'),
+            ('LGA', 'LaGuardia Airport', 'New York'),
+            ('JFN', 'Northeast Ohio Regional Airport', 'Ashtabula'),
+            ('SJC', 'Norman Y. Mineta San José International Airport', 'San Jose'),
+            ('KSM', 'St Mary\'s Airport', 'Saint Mary\'s'),
+        ]:
+            Airport.objects.create(iata_code=iata_code, name=name, city=city, country=self.us)
+
+    def codes(self, query, limit=20):
+        return [airport[1] for airport in search_airports(query, limit)]
+
+    def test_exact_code_then_prefix_then_substring(self):
+        self.assertEqual(self.codes('jfk'), ['JFK'])
+        self.assertEqual(self.codes('JF'), ['JFK', 'JFN'])
+        self.assertEqual(self.codes('new york'), ['JFK', 'LGA'])
+        # Equal ranks are ordered by name
+        self.assertEqual(self.codes('nor'), ['SJC', 'JFN'])
+        # Name prefix, then word prefix, then substring
+        self.assertEqual(self.codes('la'), ['LGA', 'JFN'])
+        self.assertEqual(self.codes('yo'), ['JFK', 'LGA'])
+        self.assertEqual(self.codes('ennedy'), ['JFK'])
+        # Accents and punctuation are ignored
+        self.assertEqual(self.codes('san jose intl'), [])
+        self.assertEqual(self.codes('José'), ['SJC'])
+        self.assertEqual(self.codes("st mary's"), ['KSM'])
+
+    def test_search_runs_no_queries_once_built(self):
+        search_airports('new')
+        with self.assertNumQueries(0):
+            self.assertEqual(len(search_airports('airport', limit=3)), 3)
+
+    def test_index_is_rebuilt_after_changes(self):
+        self.assertEqual(self.codes('dca'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Airport.objects.create(iata_code='DCA', name='Ronald Reagan Washington National Airport',
+                                   city='Arlington', country=self.us)
+            airports_changed()
+        self.assertEqual(self.codes('dca'), ['DCA'])
+
+    def test_view_returns_ranked_results(self):
+        user = User.objects.create_user('traveller', password='secret')
+        self.client.force_login(user)
+        response = self.client.get(reverse('users:search_airports'), {'q': 'new y'})
+        self.assertEqual(
+            [result['text'] for result in response.json()['results']],
+            ['John F Kennedy International Airport (JFK) - New York, United States of America',
+             'LaGuardia Airport (LGA) - New York, United States of America'],
+        )
+
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'reference': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'airport-tests'},
+    },
+    REFERENCE_CACHE_VERSION_CHECK=0,
+)
+class NearestAirportTests(TestCase):
+    """
+    Tests for the nearest-airport spatial index.
+    """
+
+    def setUp(self):
+        reference_cache._shared_down_until = 0.0
+        caches['reference'].clear()
+        airport_index.clear()
+        self.country = Country.objects.create(api_id=1, name='Fiji', iso='FJ', iso3='FJI')
+        for iata_code, name, latitude, longitude in [
+            ('NAN', 'Nadi International Airport', -17.7554, 177.4434),
+            ('SUV', 'Nausori International Airport', -18.0433, 178.5592),
+            ('TVU', 'Matei Airport', -16.6906, -179.8770),
+            ('GVA', 'Geneva Airport', 46.2381, 6.1089),
+            ('XXX', 'No coordinates', None, None),
+        ]:
+            Airport.objects.create(iata_code=iata_code, name=name, city='', country=self.country,
+                                   latitude=latitude, longitude=longitude)
+
+    def test_nearest_across_the_antimeridian(self):
+        results = nearest_airports(-16.8, -179.9, k=3)
+        self.assertEqual([airport[1] for airport, distance in results], ['TVU', 'SUV', 'NAN'])
+        self.assertLess(results[0][1], 15)
+        self.assertAlmostEqual(nearest_airports(46.2, 6.1, k=1)[0][1], 4.3, delta=0.2)
+        self.assertEqual(len(nearest_airports(-16.8, -179.9, k=10, max_distance=300)), 2)
+
+    def test_matches_a_linear_scan(self):
+        rng = random.Random(4)
+        airports = [(i, f'A{i}', '', '', '', rng.uniform(-90, 90), rng.uniform(-180, 180)) for i in range(2000)]
+        index = NearestAirportIndex(airports)
+        for _ in range(50):
+            latitude, longitude = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            target = to_point(latitude, longitude)
+            expected = sorted(airports, key=lambda airport: math.dist(target, to_point(airport[5], airport[6])))[:5]
+            results = index.nearest(latitude, longitude, k=5)
+            self.assertEqual([airport for airport, distance in results], expected)
+            self.assertAlmostEqual(
+                results[0][1], chord_to_km(math.dist(target, to_point(expected[0][5], expected[0][6]))))
+
+    def test_view(self):
+        user = User.objects.create_user('traveller', password='secret')
+        self.client.force_login(user)
+        url = reverse('users:nearest_airports')
+        self.assertEqual(self.client.get(url, {'lat': 'north', 'lon': 6}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'lat': 95, 'lon': 6}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'lat': 46.2, 'lon': 6.1, 'max_km': -10}).status_code, 400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Airport.objects.filter(iata_code='GVA').update(latitude=None, longitude=None)
+            airports_changed()
+        results = self.client.get(url, {'lat': 46.2, 'lon': 6.1, 'k': 1}).json()['results']
+        self.assertEqual(len(results), 1)
+        self.assertNotEqual(results[0]['iata_code'], 'GVA')
+        self.assertGreater(results[0]['distance_km'], 15000)
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'reference': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'candidate-tests'},
+    },
+    REFERENCE_CACHE_VERSION_CHECK=0,
+)
+class CandidateMatchingTests(TestCase):
+    """
+    Tests for the ranking of users against a surge alert.
+    """
+
+    def setUp(self):
+        self.kenya = Country.objects.create(api_id=2, name='Kenya', iso='KE', iso3='KEN', region=0)
+        self.africa = Region.objects.create(name='Africa', code='AF')
+        self.english = Language.objects.create(name='English', code='en')
+        self.french = Language.objects.create(name='French', code='fr')
+        self.logistics = MolnixTag.objects.create(api_id=1, molnix_id=1, name='Logistics Coordinator', tag_type='regular')
+        self.health = MolnixTag.objects.create(api_id=2, molnix_id=2, name='Health Coordinator', tag_type='regular')
+        tags = [
+            self.logistics,
+            MolnixTag.objects.create(api_id=3, molnix_id=3, name='L-ENG', tag_type='language'),
+            MolnixTag.objects.create(api_id=4, molnix_id=4, name='L-FRA', tag_type='language'),
+            MolnixTag.objects.create(api_id=5, molnix_id=5, name='2nd Rotation', tag_type='regular'),
+        ]
+        self.alert = SurgeAlert.objects.create(api_id=100, country=self.kenya, created_at=timezone.now())
+        self.alert.molnix_tags.set(tags)
+        reference_cache._shared_down_until = 0.0
+        caches['reference'].clear()
+        candidate_matrix.clear()
+
+    def profile(self, username, tags=(), languages=(), regions=(), restricted=(), rotation='any'):
+        profile = User.objects.create_user(username).profile
+        profile.rotation_availability = rotation
+        profile.save()
+        profile.qualified_profiles.set(tags)
+        profile.preferred_regions.set(regions)
+        profile.restricted_countries.set(restricted)
+        for language, proficiency in languages:
+            LanguageProficiency.objects.create(user_profile=profile, language=language, proficiency=proficiency)
+        return profile
+
+    def test_ranking(self):
+        self.profile('bilingual', [self.logistics], [(self.english, 'native'), (self.french, 'expert')],
+                     [self.africa], rotation='second')
+        self.profile('anglophone', [self.logistics], [(self.english, 'native'), (self.french, 'beginner')],
+                     [self.africa], rotation='first')
+        self.profile('medic', [self.health], [(self.english, 'native'), (self.french, 'native')], [self.africa])
+        self.profile('restricted', [self.logistics], [(self.english, 'native'), (self.french, 'native')],
+                     restricted=[self.kenya])
+        User.objects.create_user('inactive', is_active=False)
+
+        with self.assertNumQueries(7):
+            matrix = CandidateMatrix()
+            candidates = matrix.rank(self.alert)
+        self.assertEqual([(candidate.username, candidate.score) for candidate in candidates], [
+            ('bilingual', PROFILE | ALL_LANGUAGES | SOME_LANGUAGE | REGION | ROTATION),
+            ('anglophone', PROFILE | SOME_LANGUAGE | REGION),
+            ('medic', ALL_LANGUAGES | SOME_LANGUAGE | REGION | ROTATION),
+        ])
+        self.assertEqual(matrix.restricted(self.alert), 1)
+
+    def test_unspecified_criteria_are_met_by_everyone(self):
+        self.profile('anyone')
+        alert = SurgeAlert.objects.create(api_id=101, created_at=timezone.now())
+        self.assertEqual(CandidateMatrix().rank(alert)[0].score, PROFILE | ALL_LANGUAGES | SOME_LANGUAGE | ROTATION)
+
+    def test_many_profiles_use_few_queries(self):
+        users = User.objects.bulk_create([User(username=f'user{i:04d}') for i in range(300)])
+        profiles = [UserProfile(user=user) for user in users]
+        UserProfile.objects.bulk_create(profiles)
+        UserProfile.qualified_profiles.through.objects.bulk_create([
+            UserProfile.qualified_profiles.through(userprofile_id=profile.pk, molnixtag_id=self.logistics.pk)
+            for profile in profiles[::3]
+        ])
+        with self.assertNumQueries(7):
+            candidates = CandidateMatrix().rank(self.alert, limit=None)
+        self.assertEqual(len(candidates), 300)
+        self.assertEqual({candidate.username for candidate in candidates[:100]},
+                         {profile.user.username for profile in profiles[::3]})
+
+    def test_view_and_admin_action(self):
+        self.profile('bilingual', [self.logistics], [(self.english, 'native')])
+        staff = User.objects.create_user('manager', is_staff=True, is_superuser=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('users:alert_candidates', args=[self.alert.pk]))
+        self.assertContains(response, 'bilingual')
+
+        response = self.client.post(reverse('admin:surge_surgealert_changelist'),
+                                    {'action': 'rank_candidates', '_selected_action': [self.alert.pk]})
+        self.assertRedirects(response, reverse('users:alert_candidates', args=[self.alert.pk]))
+
+    def test_view_reuses_the_matrix_until_profiles_change(self):
+        self.profile('bilingual', [self.logistics], [(self.english, 'native')])
+        staff = User.objects.create_user('manager', is_staff=True)
+        self.client.force_login(staff)
+        url = reverse('users:alert_candidates', args=[self.alert.pk])
+        self.assertContains(self.client.get(url), 'bilingual')
+
+        self.profile('newcomer', [self.logistics], [(self.english, 'native')])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertNotContains(self.client.get(url), 'newcomer')
+        self.assertFalse([query for query in queries if 'users_languageproficiency' in query['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profiles_changed()
+        self.assertContains(self.client.get(url), 'newcomer')
+
+    def test_admin_action_prefetches_alert_tags(self):
+        self.profile('bilingual', [self.logistics], [(self.english, 'native')])
+        staff = User.objects.create_user('manager', is_staff=True, is_superuser=True)
+        self.client.force_login(staff)
+        alerts = [self.alert]
+        for api_id in (101, 102):
+            alert = SurgeAlert.objects.create(api_id=api_id, country=self.kenya, created_at=timezone.now())
+            alert.molnix_tags.set([self.logistics])
+            alerts.append(alert)
+        url = reverse('admin:surge_surgealert_changelist')
+        self.client.post(url, {'action': 'rank_candidates', '_selected_action': [alerts[0].pk, alerts[1].pk]})
+
+        counts = []
+        for selected in (alerts[:2], alerts):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, {'action': 'rank_candidates',
+                                                  '_selected_action': [alert.pk for alert in selected]}, follow=True)
+            counts.append(len(queries))
+        self.assertContains(response, 'Alert 102: best candidates bilingual')
+        self.assertEqual(counts[0], counts[1])
+
+
+class AlertFeedTests(TestCase):
+    """
+    Tests for the materialised alert feeds.
+    """
+
+    def setUp(self):
+        self.kenya = Country.objects.create(api_id=2, name='Kenya', iso='KE', iso3='KEN', region=0)
+        self.english = Language.objects.create(name='English', code='en')
+        self.logistics = MolnixTag.objects.create(api_id=1, molnix_id=1, name='Logistics Coordinator', tag_type='regular')
+        self.health = MolnixTag.objects.create(api_id=2, molnix_id=2, name='Health Coordinator', tag_type='regular')
+        self.english_tag = MolnixTag.objects.create(api_id=3, molnix_id=3, name='L-ENG', tag_type='language')
+
+        self.logistician = User.objects.create_user('logistician').profile
+        self.logistician.qualified_profiles.set([self.logistics])
+        LanguageProficiency.objects.create(user_profile=self.logistician, language=self.english, proficiency='native')
+        self.restricted = User.objects.create_user('restricted').profile
+        self.restricted.qualified_profiles.set([self.logistics])
+        self.restricted.restricted_countries.set([self.kenya])
+        self.medic = User.objects.create_user('medic').profile
+        self.medic.qualified_profiles.set([self.health])
+
+    def alert(self, api_id, tags, days_ago=1):
+        alert = SurgeAlert.objects.create(api_id=api_id, country=self.kenya,
+                                          created_at=timezone.now() - timedelta(days=days_ago))
+        alert.molnix_tags.set(tags)
+        return alert
+
+    def feed(self, profile):
+        return [entry.alert.api_id for entry in alert_feed(profile)]
+
+    def test_ingested_alerts_are_fanned_out(self):
+        self.alert(100, [self.logistics, self.english_tag], days_ago=2)
+        self.alert(101, [self.logistics], days_ago=1)
+        self.alert(102, [self.health, self.english_tag])
+        self.alert(103, [self.logistics], days_ago=365)
+        alerts_ingested.send(sender=SurgeAlert, created=[100, 101, 102, 103], updated=[])
+
+        self.assertEqual(self.feed(self.logistician), [101, 100])
+        self.assertEqual(self.feed(self.restricted), [])
+        # Speaks none of the alert's languages
+        self.assertEqual(self.feed(self.medic), [])
+
+        # An updated alert is matched again
+        SurgeAlert.objects.get(api_id=101).molnix_tags.set([self.health])
+        alerts_ingested.send(sender=SurgeAlert, created=[], updated=[101])
+        self.assertEqual(self.feed(self.logistician), [100])
+        self.assertEqual(self.feed(self.medic), [101])
+
+    def test_reading_a_feed_is_one_query(self):
+        for api_id in range(100, 130):
+            self.alert(api_id, [self.logistics])
+        rebuild_alert_feeds()
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.feed(self.logistician)), 30)
+
+    def test_profile_changes_rebuild_the_feed(self):
+        self.alert(100, [self.health])
+        rebuild_alert_feeds()
+        self.assertEqual(self.feed(self.logistician), [])
+
+        self.logistician.qualified_profiles.add(self.health)
+        rebuild_user_feed(self.logistician)
+        self.assertEqual(self.feed(self.logistician), [100])
+        self.assertEqual(AlertFeedEntry.objects.count(), 2)
+
+    def test_view(self):
+        self.alert(100, [self.logistics])
+        rebuild_alert_feeds()
+        self.client.force_login(self.logistician.user)
+        response = self.client.get(reverse('users:alert_feed'))
+        self.assertEqual([row['entry'].alert.api_id for row in response.context['entries']], [100])
+
+
+class FailingBackend:
+    def send(self, notifications):
+        raise NotificationError("gateway down")
+
+
+class OverlappingBackend:
+    """
+    Sends the batch again from inside send, as a retry overlapping the
+    running batch would.
+    """
+    resent = []
+
+    def send(self, notifications):
+        OverlappingBackend.resent.append(send_batch([n.pk for n in notifications])['sent'])
+
+
+class NotificationTests(TestCase):
+    """
+    Tests for the notifications of new alerts.
+    """
+
+    def setUp(self):
+        self.logistics = MolnixTag.objects.create(api_id=1, molnix_id=1, name='Logistics Coordinator', tag_type='regular')
+        self.by_email = User.objects.create_user('by_email', email='a@example.org').profile
+        self.by_both = User.objects.create_user('by_both', email='b@example.org').profile
+        self.by_both.phone_number = '+41000000000'
+        self.by_both.accept_sms = True
+        self.by_both.save()
+        self.unreachable = User.objects.create_user('unreachable').profile
+        for profile in (self.by_email, self.by_both, self.unreachable):
+            profile.qualified_profiles.set([self.logistics])
+        self.alert = SurgeAlert.objects.create(api_id=100, message='Logistics', created_at=timezone.now())
+        self.alert.molnix_tags.set([self.logistics])
+        rebuild_alert_feeds()
+        self.path = os.path.join(tempfile.mkdtemp(), 'notifications.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.path))
+        self.settings = override_settings(NOTIFICATION_FILE_PATH=self.path, NOTIFICATIONS_ENABLED=True)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        backends = self.settings_backends()
+        backends.enable()
+        self.addCleanup(backends.disable)
+
+    def test_notifications_are_sent_once(self):
+        pending = queue_notifications([100])
+        self.assertEqual(
+            sorted(Notification.objects.values_list('user_profile__user__username', 'channel')),
+            [('by_both', 'email'), ('by_both', 'sms'), ('by_email', 'email')],
+        )
+        # Queuing again adds nothing
+        self.assertEqual(queue_notifications([100]), pending)
+
+        self.assertEqual(send_batch(pending)['sent'], 3)
+        self.assertEqual(send_batch(pending)['sent'], 0)
+        self.assertEqual(queue_notifications([100]), [])
+        with open(self.path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(sorted(line['to'] for line in lines), ['+41000000000', 'a@example.org', 'b@example.org'])
+
+    def test_only_open_alerts_are_notified(self):
+        now = timezone.now()
+        SurgeAlert.objects.filter(api_id=100).update(closes=now - timedelta(days=1))
+        self.assertEqual(queue_notifications([100]), [])
+        SurgeAlert.objects.filter(api_id=100).update(closes=now + timedelta(days=1))
+        self.assertEqual(len(queue_notifications([100])), 3)
+
+    def test_channels_without_a_backend_are_skipped(self):
+        with self.settings_backends(sms=''):
+            pending = queue_notifications([100])
+        self.assertEqual(set(Notification.objects.filter(pk__in=pending).values_list('channel', flat=True)),
+                         {'email'})
+
+    def test_failed_batches_are_retried_then_given_up(self):
+        pending = queue_notifications([100])
+        with self.settings_backends(sms='users.tests.FailingBackend'):
+            result = send_notification_batch.apply(args=[pending])
+        self.assertTrue(result.failed())
+        self.assertEqual(
+            dict(Notification.objects.values_list('channel', 'status')), {'email': 'sent', 'sms': 'failed'})
+        sms = Notification.objects.get(channel='sms')
+        self.assertEqual(sms.attempts, 4)
+        self.assertEqual(sms.error, 'gateway down')
+
+    def test_overlapping_batches_do_not_resend(self):
+        pending = queue_notifications([100])
+        OverlappingBackend.resent = []
+        with self.settings_backends(sms='users.tests.OverlappingBackend'):
+            self.assertEqual(send_batch(pending)['sent'], 3)
+        self.assertEqual(OverlappingBackend.resent, [0])
+        self.assertEqual(set(Notification.objects.values_list('status', flat=True)), {'sent'})
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_new_alerts_are_notified_after_ingest(self):
+        alert = SurgeAlert.objects.create(api_id=101, created_at=timezone.now())
+        alert.molnix_tags.set([self.logistics])
+        with mock.patch('users.signals.send_alert_notifications.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                alerts_ingested.send(sender=SurgeAlert, created=[101], updated=[100])
+        delay.assert_called_once_with([101])
+
+    def test_initial_sync_is_not_notified(self):
+        with mock.patch('users.signals.send_alert_notifications.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                alerts_ingested.send(sender=SurgeAlert, created=[100], updated=[], initial=True)
+        delay.assert_not_called()
+
+    @override_settings(NOTIFICATIONS_ENABLED=False)
+    def test_notifications_are_off_unless_enabled(self):
+        with mock.patch('users.signals.send_alert_notifications.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                alerts_ingested.send(sender=SurgeAlert, created=[100], updated=[])
+        delay.assert_not_called()
+
+    def settings_backends(self, **backends):
+        return override_settings(NOTIFICATION_BACKENDS={
+            'email': 'users.notifications.FileBackend', 'sms': 'users.notifications.FileBackend', **backends})
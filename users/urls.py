@@ -6,7 +6,10 @@ app_name = 'users'
 urlpatterns = [
     path('profile/', views.profile_view, name='profile'),
     path('profile/update/', views.profile_update, name='profile_update'),
+    path('feed/', views.alert_feed, name='alert_feed'),
     path('airports/search/', views.search_airports, name='search_airports'),
+    path('airports/nearest/', views.nearest_airports, name='nearest_airports'),
+    path('alerts/<int:alert_id>/candidates/', views.alert_candidates, name='alert_candidates'),
     path('alerts/save/<int:alert_id>/', views.save_alert, name='save_alert'),
     path('alerts/remove/<int:alert_id>/', views.remove_alert, name='remove_alert'),
 ]
@@ -1,12 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
+from django.core.paginator import Paginator
 from django.db import transaction
 from django.http import JsonResponse
 from django.urls import reverse
 from .forms import UserForm, UserProfileForm, LanguageProficiencyFormSet
-from .models import UserProfile, Airport
-from django.db.models import Q
+from .models import UserProfile
+from .airport_index import search_airports as find_airports
+from .geo import nearest_airports as find_nearest_airports
+from .matching import candidate_matrix, profiles_changed, score_criteria
+from .feed import alert_feed as feed_entries, rebuild_user_feed
 from surge.models import SurgeAlert
 
 @login_required
@@ -42,6 +47,9 @@ def profile_update(request):
             user_form.save()
             profile_form.save()
             language_formset.save()
+            # The profile decides which alerts are in the user's feed
+            transaction.on_commit(lambda: rebuild_user_feed(user_profile))
+            profiles_changed()
 
             messages.success(request, 'Your profile was successfully updated!')
             return redirect('users:profile')
@@ -58,33 +66,107 @@ def profile_update(request):
         'language_formset': language_formset,
     })
 
+@login_required
+def alert_feed(request):
+    """
+    View for displaying the surge alerts matching the user's profile.
+    The feed is written when alerts are ingested (see users/feed.py), so
+    a page is read with a single indexed query.
+    """
+    paginator = Paginator(feed_entries(request.user.profile), 20)
+    page = paginator.get_page(request.GET.get('page'))
+
+    return render(request, 'users/alert_feed.html', {
+        'page_obj': page,
+        'entries': [{'entry': entry, 'criteria': score_criteria(entry.score)} for entry in page.object_list],
+    })
+
 @login_required
 def search_airports(request):
     """
     View for searching airports based on a query string.
-    Returns JSON response with matching airports.
+    Returns JSON response with matching airports, answered from the
+    in-memory airport index (see users/airport_index.py).
     """
     query = request.GET.get('q', '')
     if not query or len(query) < 2:
         return JsonResponse({'results': []})
 
-    # Search for airports matching the query in name, city, or IATA code
-    airports = Airport.objects.filter(
-        Q(name__icontains=query) | 
-        Q(city__icontains=query) | 
-        Q(iata_code__icontains=query.upper())
-    )[:20]  # Limit to 20 results for performance
+    # Exact IATA code first, then prefix matches, then substring matches
+    results = [
+        {
+            'id': pk,
+            'text': f"{name} ({iata_code}) - {city}, {country_name}"
+        }
+        for pk, iata_code, name, city, country_name in find_airports(query, limit=20)
+    ]
+
+    return JsonResponse({'results': results})
+
+@login_required
+def nearest_airports(request):
+    """
+    View for finding the airports closest to a location.
+    Takes 'lat' and 'lon' in degrees, and optionally 'k' (1 to 20, default 5)
+    and 'max_km'. Returns a JSON response with the airports nearest first,
+    answered from the in-memory spatial index (see users/geo.py).
+    """
+    try:
+        latitude = float(request.GET['lat'])
+        longitude = float(request.GET['lon'])
+        k = int(request.GET.get('k', 5))
+        max_distance = float(request.GET['max_km']) if request.GET.get('max_km') else None
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'lat and lon are required, k and max_km must be numbers'}, status=400)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return JsonResponse({'error': 'lat must be within [-90, 90] and lon within [-180, 180]'}, status=400)
+    if max_distance is not None and not max_distance >= 0:
+        return JsonResponse({'error': 'max_km must not be negative'}, status=400)
 
     results = [
         {
-            'id': airport.id,
-            'text': f"{airport.name} ({airport.iata_code}) - {airport.city}, {airport.country.name}"
+            'id': pk,
+            'iata_code': iata_code,
+            'text': f"{name} ({iata_code}) - {city}, {country_name}",
+            'latitude': airport_latitude,
+            'longitude': airport_longitude,
+            'distance_km': round(distance, 1),
         }
-        for airport in airports
+        for (pk, iata_code, name, city, country_name, airport_latitude, airport_longitude), distance
+        in find_nearest_airports(latitude, longitude, k=min(max(k, 1), 20), max_distance=max_distance)
     ]
 
     return JsonResponse({'results': results})
 
+
+@staff_member_required
+def alert_candidates(request, alert_id):
+    """
+    View for ranking the registered users against a surge alert.
+    Takes an optional 'limit' (default 100, at most 1000) and scores all
+    active profiles at once against the shared CandidateMatrix (see
+    users/matching.py).
+    """
+    alert = get_object_or_404(SurgeAlert.objects.select_related('country').prefetch_related('molnix_tags'), id=alert_id)
+    try:
+        limit = min(max(int(request.GET.get('limit', 100)), 1), 1000)
+    except ValueError:
+        limit = 100
+
+    matrix = candidate_matrix.get()
+    candidates = [
+        {'candidate': candidate, 'criteria': score_criteria(candidate.score)}
+        for candidate in matrix.rank(alert, limit=limit)
+    ]
+
+    return render(request, 'users/alert_candidates.html', {
+        'alert': alert,
+        'candidates': candidates,
+        'profiles': len(matrix),
+        'restricted': matrix.restricted(alert),
+        'limit': limit,
+    })
+
 @login_required
 def save_alert(request, alert_id):
     """